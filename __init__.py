@@ -11,10 +11,11 @@ bl_info = {
 import os
 import sys
 import bpy
-from .properties import RAGProperties
+from .properties import RAGProperties, RAGHistoryEntry
 from .panels import RAG_PT_Main, RAG_PT_Settings
 from bpy.props import PointerProperty
-import subprocess
+from . import installer
+from . import config
 
 # add the 'lib' folder to the Python path
 libs_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "lib")
@@ -24,101 +25,10 @@ if libs_path not in sys.path:
 _dependencies_ready = False
 _import_error = ""
 def install_dependencies():
-    """Install required packages to lib folder"""
-    
-    addon_dir = os.path.dirname(os.path.realpath(__file__))
-    lib_path = os.path.join(addon_dir, "lib")
-    
-    print(f"Installing to: {lib_path}")
-    
-    os.makedirs(lib_path, exist_ok=True)
-
-    python_exe = sys.executable
-    print(f"Using Python: {python_exe}")
-    
-    try:
-        # Step 1: Install PyTorch 2.8.0 specifically (CPU version)
-        print("Installing PyTorch 2.8.0 (CPU)...")
-        subprocess.check_call([
-            python_exe, "-m", "pip", "install",
-            "torch==2.8.0", "torchvision==0.23.0", "torchaudio==2.8.0",
-            "-t", lib_path,
-            "--no-cache-dir",
-            "--upgrade"
-        ])
-        
-        # Step 2: Install sentence-transformers and its dependencies WITHOUT torch
-        print("Installing sentence-transformers dependencies (excluding torch)...")
-        subprocess.check_call([
-            python_exe, "-m", "pip", "install",
-            "transformers", "huggingface-hub", "safetensors", 
-            "tqdm", "scikit-learn", "scipy", "requests",
-            "tokenizers", "filelock", "numpy", "packaging",
-            "pyyaml", "regex", "pillow", "einops",
-            "-t", lib_path,
-            "--no-cache-dir",
-            "--upgrade"
-        ])
-        
-        # Step 3: Install sentence-transformers with --no-deps to prevent torch reinstall
-        print("Installing sentence-transformers (no dependencies)...")
-        subprocess.check_call([
-            python_exe, "-m", "pip", "install",
-            "sentence-transformers",
-            "-t", lib_path,
-            "--no-cache-dir",
-            "--no-deps",
-            "--upgrade"
-        ])
-        
-        # Step 4: Install qdrant-client dependencies first
-        print("Installing qdrant-client dependencies...")
-        subprocess.check_call([
-            python_exe, "-m", "pip", "install",
-            "grpcio", "grpcio-tools", "httpx", "portalocker",
-            "-t", lib_path,
-            "--no-cache-dir",
-            "--upgrade"
-        ])
-        
-        # Step 5: Install qdrant-client with --no-deps
-        print("Installing qdrant-client (no dependencies)...")
-        subprocess.check_call([
-            python_exe, "-m", "pip", "install",
-            "qdrant-client",
-            "-t", lib_path,
-            "--no-cache-dir",
-            "--no-deps",
-            "--upgrade"
-        ])
-        
-        # Step 6: Install datapizza-ai WITHOUT --no-deps but with --no-dependencies for torch
-        print("Installing datapizza-ai...")
-        subprocess.check_call([
-            python_exe, "-m", "pip", "install",
-            "datapizza-ai", "datapizza-ai-clients-mistral", "datapizza-ai-clients-anthropic", 
-            "datapizza-ai-clients-google", "datapizza-ai-clients-openai", "datapizza-ai-clients-openai-like",
-            "-t", lib_path,
-            "--no-cache-dir",
-            "--upgrade"
-        ])
-        
-        # Step 7: Verify torch version hasn't changed
-        print("\nVerifying PyTorch installation...")
-        lib_path_escaped = lib_path.replace('\\', '\\\\')
-        result = subprocess.check_output([
-            python_exe, "-c", 
-            f"import sys; sys.path.insert(0, '{lib_path_escaped}'); import torch; print(f'PyTorch version: {{torch.__version__}}')"
-        ])
-        print(result.decode())
-        print("Installation complete!")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Failed to install dependencies: {e}")
-        return False
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        return False
+    """Install the unsatisfied requirements to the lib folder, from the wheelhouse when present"""
+    print(f"Installing to: {installer.LIB_DIR}")
+    print(f"Using Python: {sys.executable}")
+    return installer.install(installer.LIB_DIR, installer.WHEELHOUSE_DIR)
 
 def check_dependencies():
     """Check if dependencies are available"""
@@ -146,30 +56,74 @@ def check_dependencies():
 # Check dependencies but don't fail if missing
 check_dependencies()
 # Install operator - must be defined before checking dependencies
+def _redraw_ui():
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+
+def _watch_installer():
+    """Timer that keeps the panel progress fresh while pip runs in the background"""
+    _redraw_ui()
+    if installer.progress.running:
+        return 0.5
+    if installer.progress.success:
+        # imports have to happen on the main thread
+        check_dependencies()
+    return None
+
+def _start_installer_job(target, *args):
+    if not installer.run_in_background(target, *args):
+        return False
+    if not bpy.app.timers.is_registered(_watch_installer):
+        bpy.app.timers.register(_watch_installer, first_interval=0.5)
+    return True
+
 class RAG_OT_InstallDependencies(bpy.types.Operator):
     bl_idname = "rag.install_dependencies"
     bl_label = "Install Dependencies"
-    bl_description = "Install required Python packages"
+    bl_description = "Install missing Python packages, offline from the wheelhouse folder when it holds wheels"
     
     def execute(self, context):
-        self.report({'INFO'}, "Installing dependencies... This may take a few minutes.")
-        print("Starting dependency installation...")
-        
-        if install_dependencies():
-            # Recheck dependencies
-            if check_dependencies():
-                self.report({'INFO'}, "Dependencies installed successfully! Please restart Blender.")
-            else:
-                self.report({'WARNING'}, "Packages installed but imports failed. Please restart Blender.")
-            return {'FINISHED'}
-        else:
-            self.report({'ERROR'}, "Failed to install dependencies. Check console for details.")
+        if not _start_installer_job(install_dependencies):
+            self.report({'WARNING'}, "An installation is already running")
             return {'CANCELLED'}
+        self.report({'INFO'}, "Installing dependencies in the background, progress is shown in the panel.")
+        return {'FINISHED'}
+
+class RAG_OT_BuildWheelhouse(bpy.types.Operator):
+    bl_idname = "rag.build_wheelhouse"
+    bl_label = "Build Wheelhouse"
+    bl_description = "Download every required wheel into the wheelhouse folder for offline installs"
+
+    def execute(self, context):
+        if not _start_installer_job(installer.build_wheelhouse, installer.WHEELHOUSE_DIR):
+            self.report({'WARNING'}, "An installation is already running")
+            return {'CANCELLED'}
+        self.report({'INFO'}, f"Downloading wheels to {installer.WHEELHOUSE_DIR}")
+        return {'FINISHED'}
+
+def _idle_watch():
+    """Timer that lets the rag manager release its models after the idle ttl"""
+    rag_module = sys.modules.get(f"{__name__}.rag")
+    scene = bpy.context.scene
+    props = getattr(scene, "rag_props", None) if scene else None
+    # nothing to release before the first query imported the manager
+    if rag_module is not None and rag_module._rag_instance is not None and props is not None:
+        try:
+            rag_module._rag_instance.release_if_idle(
+                props.idle_unload_minutes, props.idle_unload_store, props.memory_budget_mb
+            )
+        except Exception as e:
+            print(f"Idle check failed: {e}")
+    return config.IDLE_CHECK_SECONDS
 
 def get_classes():
     """Return classes to register based on dependency availability"""
     base_classes = [
         RAG_OT_InstallDependencies,
+        RAG_OT_BuildWheelhouse,
+        RAGHistoryEntry,
         RAGProperties,
         RAG_PT_Main,
         RAG_PT_Settings,
@@ -177,8 +131,8 @@ def get_classes():
     
     if _dependencies_ready:
         try:
-            from .operators import RAG_OT_Generate, RAG_OT_Clear
-            return tuple(base_classes + [RAG_OT_Generate, RAG_OT_Clear])
+            from .operators import RAG_OT_Generate, RAG_OT_Clear, RAG_OT_SyncDataset
+            return tuple(base_classes + [RAG_OT_Generate, RAG_OT_Clear, RAG_OT_SyncDataset])
         except ImportError as e:
             print(f"Warning: Could not import operators - {e}")
             return tuple(base_classes)
@@ -198,6 +152,7 @@ def register():
     bpy.types.Scene.rag_props = PointerProperty(type=RAGProperties)
     
     if _dependencies_ready:
+        bpy.app.timers.register(_idle_watch, first_interval=config.IDLE_CHECK_SECONDS, persistent=True)
         print("Blender500: Ready to use!")
     else:
         print("Blender500: Dependencies missing - use 'Install Dependencies' button")
@@ -206,13 +161,25 @@ def unregister():
     global classes
     
     if _dependencies_ready:
+        speculative = sys.modules.get(f"{__name__}.speculative")
+        if speculative is not None:
+            speculative.cancel_pending()
         try:
             from .rag import get_rag_manager
             rag = get_rag_manager()
             rag.unload()
         except Exception as e:
             print(f"Error during unload: {e}")
+        try:
+            from .llm import invalidate_llm_pool
+            invalidate_llm_pool()
+        except Exception as e:
+            print(f"Error closing LLM clients: {e}")
     
+    for timer in (_watch_installer, _idle_watch):
+        if bpy.app.timers.is_registered(timer):
+            bpy.app.timers.unregister(timer)
+
     del bpy.types.Scene.rag_props
     
     for cls in reversed(classes):
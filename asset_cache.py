@@ -0,0 +1,195 @@
+import ast
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import bpy
+
+from . import config
+
+def normalize_code(code: str) -> str:
+    # the ast dump ignores comments, blank lines and formatting
+    try:
+        return ast.dump(ast.parse(code))
+    except SyntaxError:
+        return "\n".join(line.strip() for line in code.splitlines() if line.strip())
+
+def code_key(code: str) -> str:
+    return hashlib.sha256(normalize_code(code).encode('utf-8')).hexdigest()
+
+class AssetCache:
+    """Content-addressed cache of generated objects, one library .blend per script.
+
+    Entries are tracked in index.json with size and last use, and evicted
+    least-recently-used first once the entry or byte limits are exceeded.
+    """
+
+    def __init__(self, cache_dir, max_entries: int, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.index_path = cache_dir / "index.json"
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+
+    def _load_index(self) -> Dict[str, dict]:
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Asset cache index unreadable, starting empty: {e}")
+            return {}
+
+    def _save_index(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _entry_path(self, key: str):
+        return self.cache_dir / f"{key}.blend"
+
+    def lookup(self, code: str) -> Optional[str]:
+        key = code_key(code)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or not self._entry_path(key).exists():
+                self.misses += 1
+                return None
+            return key
+
+    def load(self, key: str) -> Tuple[bool, Optional[str]]:
+        """Append the cached objects into the scene instead of running the script"""
+        with self._lock:
+            entry = self._index.get(key)
+        if entry is None:
+            return False, "Not cached"
+
+        start = time.perf_counter()
+        try:
+            names = set(entry['objects'])
+            with bpy.data.libraries.load(str(self._entry_path(key)), link=False) as (data_from, data_to):
+                requested = [name for name in data_from.objects if name in names]
+                data_to.objects = requested
+
+            for original_name, obj in zip(requested, data_to.objects):
+                if obj is None:
+                    continue
+                collection_name = entry['collections'].get(original_name)
+                collection = bpy.data.collections.get(collection_name) if collection_name else None
+                if collection is None:
+                    if collection_name and collection_name != bpy.context.scene.collection.name:
+                        collection = bpy.data.collections.new(collection_name)
+                        bpy.context.scene.collection.children.link(collection)
+                    else:
+                        collection = bpy.context.scene.collection
+                collection.objects.link(obj)
+        except Exception as e:
+            # a broken library would fail again on every lookup, the script is rebuilt instead
+            with self._lock:
+                self.misses += 1
+                self._index.pop(key, None)
+                try:
+                    self._entry_path(key).unlink()
+                except FileNotFoundError:
+                    pass
+                self._save_index()
+            return False, f"Loading cached asset failed: {e}"
+
+        load_seconds = time.perf_counter() - start
+        with self._lock:
+            entry['last_used'] = time.time()
+            entry['hits'] = entry.get('hits', 0) + 1
+            self.hits += 1
+            self.seconds_saved += max(0.0, entry['build_seconds'] - load_seconds)
+            self._save_index()
+        return True, None
+
+    def store(self, code: str, objects: List, build_seconds: float) -> Optional[str]:
+        """Write the objects created by a script to the cache library"""
+        if not objects:
+            return None
+
+        key = code_key(code)
+        path = self._entry_path(key)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # meshes, materials and other dependencies are written along with the objects
+            bpy.data.libraries.write(str(path), set(objects), fake_user=True)
+        except Exception as e:
+            print(f"Asset cache store failed: {e}")
+            return None
+
+        collections = {}
+        for obj in objects:
+            owners = obj.users_collection
+            collections[obj.name] = owners[0].name if owners else None
+
+        with self._lock:
+            self._index[key] = {
+                'objects': [obj.name for obj in objects],
+                'collections': collections,
+                'size': path.stat().st_size,
+                'build_seconds': build_seconds,
+                'last_used': time.time(),
+                'hits': 0,
+            }
+            self._evict()
+            self._save_index()
+        return key
+
+    def _evict(self):
+        # least recently used first, until both limits hold
+        total = sum(entry['size'] for entry in self._index.values())
+        by_age = sorted(self._index.items(), key=lambda item: item[1]['last_used'])
+        for key, entry in by_age:
+            if len(self._index) <= self.max_entries and total <= self.max_bytes:
+                break
+            try:
+                self._entry_path(key).unlink()
+            except FileNotFoundError:
+                pass
+            total -= entry['size']
+            del self._index[key]
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index.keys()):
+                try:
+                    self._entry_path(key).unlink()
+                except FileNotFoundError:
+                    pass
+            self._index = {}
+            self._save_index()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": sum(entry['size'] for entry in self._index.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "seconds_saved": self.seconds_saved,
+            }
+
+_asset_cache = None
+def get_asset_cache() -> AssetCache:
+    global _asset_cache
+    if _asset_cache is None:
+        _asset_cache = AssetCache(
+            cache_dir=config.ASSET_CACHE_DIR,
+            max_entries=config.ASSET_CACHE_MAX_ENTRIES,
+            max_bytes=config.ASSET_CACHE_MAX_BYTES
+        )
+    return _asset_cache
@@ -0,0 +1,204 @@
+import threading
+import time
+from typing import List, Optional
+
+from .rag import get_rag_manager
+
+# run from Blender's Python console once the add-on is enabled, e.g.
+#   from BlenderRAG import benchmarks; benchmarks.bench_query_batch()
+
+DEFAULT_PROMPTS = [
+    "a wooden bench",
+    "a red fridge",
+    "a modern armchair with wooden legs",
+    "a tall street lamp",
+    "a small potted cactus",
+    "a glass coffee table",
+    "a stone fountain with three tiers",
+    "a double bed with pillows",
+]
+
+def _ms(seconds: float) -> float:
+    return seconds * 1000
+
+def bench_query_batch(prompts: Optional[List[str]] = None, k: int = 5, repeats: int = 5) -> dict:
+    """Per-query cost of query_batch against looping over query"""
+    rag = get_rag_manager()
+    prompts = prompts or DEFAULT_PROMPTS
+
+    # warm up model and collection outside the timings
+    _, error = rag.query(prompts[0], k=k, use_lexical=False)
+    if error:
+        print(f"Benchmark aborted: {error}")
+        return {}
+
+    loop_seconds = 0.0
+    batch_seconds = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for prompt in prompts:
+            rag.query(prompt, k=k, use_lexical=False)
+        loop_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        rag.query_batch(prompts, k=k)
+        batch_seconds += time.perf_counter() - start
+
+    n_queries = len(prompts) * repeats
+    stats = {
+        "prompts": len(prompts),
+        "loop_ms_per_query": _ms(loop_seconds) / n_queries,
+        "batch_ms_per_query": _ms(batch_seconds) / n_queries,
+    }
+    stats["speedup"] = stats["loop_ms_per_query"] / stats["batch_ms_per_query"] if batch_seconds else 0.0
+    print(
+        f"query loop: {stats['loop_ms_per_query']:.2f} ms/query | "
+        f"query_batch: {stats['batch_ms_per_query']:.2f} ms/query | "
+        f"speedup x{stats['speedup']:.1f}"
+    )
+    return stats
+
+def stress_concurrent_queries(prompts: Optional[List[str]] = None, k: int = 5, rounds: int = 20, syncs: int = 3) -> dict:
+    """Hammer query() from the worker pool while dataset syncs take the write lock.
+
+    Every concurrent result must match the single-threaded result for the same prompt.
+    """
+    rag = get_rag_manager()
+    prompts = prompts or DEFAULT_PROMPTS
+
+    expected = {}
+    for prompt in prompts:
+        results, error = rag.query(prompt, k=k)
+        if error:
+            print(f"Stress test aborted: {error}")
+            return {}
+        expected[prompt] = [result.metadata['id'] for result in results]
+
+    def run_syncs():
+        for _ in range(syncs):
+            rag.sync_dataset()
+
+    writer = threading.Thread(target=run_syncs, name="rag-stress-sync")
+    start = time.perf_counter()
+    writer.start()
+    futures = [(prompt, rag.submit_query(prompt, k=k)) for _ in range(rounds) for prompt in prompts]
+
+    errors = 0
+    mismatches = 0
+    for prompt, future in futures:
+        results, error = future.result()
+        if error:
+            errors += 1
+        elif [result.metadata['id'] for result in results] != expected[prompt]:
+            mismatches += 1
+    writer.join()
+    elapsed = time.perf_counter() - start
+
+    stats = {
+        "queries": len(futures),
+        "errors": errors,
+        "mismatches": mismatches,
+        "queries_per_second": len(futures) / elapsed if elapsed else 0.0,
+    }
+    status = "OK" if not errors and not mismatches else "FAILED"
+    print(
+        f"stress test {status}: {stats['queries']} queries, {errors} errors, "
+        f"{mismatches} mismatches, {stats['queries_per_second']:.1f} q/s with {syncs} concurrent syncs"
+    )
+    return stats
+
+def stress_llm_scheduler(batch: int = 12, interactive: int = 3, failure_rate: float = 0.1) -> dict:
+    """Batch and interactive generations against the throttling mock provider.
+
+    Interactive requests are submitted after the batch and should still finish
+    ahead of most of it; no request may fail while retries are left.
+    """
+    from types import SimpleNamespace
+    from .llm import LLM, get_scheduler
+    from .mock_provider import MockClient
+    from .scheduler import BATCH, INTERACTIVE
+
+    llm = LLM(SimpleNamespace(llm_provider='MOCK', model='mock', api_key=''))
+    llm.client = MockClient(failure_rate=failure_rate, seed=0)
+
+    finished = []
+    failures = []
+    lock = threading.Lock()
+
+    def run(priority, label):
+        start = time.perf_counter()
+        _, error = llm.generate(prompt=f"a wooden bench {label}", context=[], priority=priority)
+        with lock:
+            (failures if error else finished).append((priority, time.perf_counter() - start))
+
+    threads = [threading.Thread(target=run, args=(BATCH, f"batch {i}")) for i in range(batch)]
+    threads += [threading.Thread(target=run, args=(INTERACTIVE, f"interactive {i}")) for i in range(interactive)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+
+    order = [priority for priority, _ in finished]
+    interactive_ranks = [rank for rank, priority in enumerate(order) if priority == INTERACTIVE]
+    stats = {
+        "requests": batch + interactive,
+        "failures": len(failures),
+        "provider_throttled": llm.client.throttled,
+        "interactive_mean_rank": sum(interactive_ranks) / len(interactive_ranks) if interactive_ranks else 0.0,
+        "scheduler": get_scheduler().stats().get('MOCK', {}),
+    }
+    print(
+        f"scheduler stress: {stats['requests']} requests, {stats['failures']} failed, "
+        f"{stats['provider_throttled']} throttled by the provider, "
+        f"interactive mean finish rank {stats['interactive_mean_rank']:.1f} of {len(order)}"
+    )
+    return stats
+
+def bench_cold_start(prompt: str = DEFAULT_PROMPTS[0], repeats: int = 3) -> dict:
+    """Time to first query from a fresh manager, qdrant storage against the vector snapshot.
+
+    The embedder is loaded once and shared so only the store open is compared.
+    The first repeat of each path is the cold one, later ones see the OS page cache.
+    """
+    from . import config
+    from .rag import RAGManager
+
+    shared = get_rag_manager()
+    embedder = shared._get_embedder()
+    if not config.VECTOR_SNAPSHOT_PATH.exists():
+        _, error = shared.export_snapshot()
+        if error:
+            print(f"Benchmark aborted: {error}")
+            return {}
+    # local qdrant takes a lock on its folder, one client at a time
+    shared.unload()
+
+    use_snapshot = config.USE_VECTOR_SNAPSHOT
+    stats = {}
+    try:
+        for label, enabled in (("qdrant", False), ("snapshot", True)):
+            config.USE_VECTOR_SNAPSHOT = enabled
+            timings = []
+            for _ in range(repeats):
+                rag = RAGManager()
+                rag.embedder = embedder
+                start = time.perf_counter()
+                _, error = rag.query(prompt, use_lexical=False)
+                timings.append(_ms(time.perf_counter() - start))
+                rag.unload()
+                if error:
+                    print(f"Benchmark aborted: {error}")
+                    return {}
+            stats[f"{label}_cold_ms"] = timings[0]
+            stats[f"{label}_warm_ms"] = sorted(timings[1:])[len(timings[1:]) // 2] if len(timings) > 1 else timings[0]
+    finally:
+        config.USE_VECTOR_SNAPSHOT = use_snapshot
+
+    stats["speedup"] = stats["qdrant_cold_ms"] / stats["snapshot_cold_ms"] if stats["snapshot_cold_ms"] else 0.0
+    print(
+        f"time to first query: qdrant {stats['qdrant_cold_ms']:.1f} ms cold / {stats['qdrant_warm_ms']:.1f} ms warm | "
+        f"snapshot {stats['snapshot_cold_ms']:.1f} ms cold / {stats['snapshot_warm_ms']:.1f} ms warm | "
+        f"speedup x{stats['speedup']:.1f}"
+    )
+    return stats
@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# Rebuilds the reference GLBs under docs/meshes with glTF-Transform (the tool that
+# produced them): dedup + weld vertices, quantized Draco compression, and decimated LODs.
+#   python build_meshes.py --lods 0.5 0.2
+# Requires node and @gltf-transform/cli (used through npx unless --gltf-transform is given).
+
+ADDON_DIR = Path(__file__).resolve().parent
+MESHES_DIR = ADDON_DIR / "docs" / "meshes"
+BASE_NAME = re.compile(r"^\d+\.glb$")
+
+def read_glb_json(path):
+    # only the json chunk is needed for accessor counts, draco payloads stay untouched
+    with open(path, 'rb') as f:
+        magic, _, _ = struct.unpack('<III', f.read(12))
+        if magic != 0x46546C67:
+            raise ValueError(f"Not a GLB file: {path}")
+        chunk_length, _ = struct.unpack('<II', f.read(8))
+        return json.loads(f.read(chunk_length))
+
+def count_triangles(path):
+    gltf = read_glb_json(path)
+    accessors = gltf.get('accessors', [])
+    triangles = 0
+    for mesh in gltf.get('meshes', []):
+        for primitive in mesh.get('primitives', []):
+            if primitive.get('mode', 4) != 4:
+                continue
+            if 'indices' in primitive:
+                triangles += accessors[primitive['indices']]['count'] // 3
+            else:
+                triangles += accessors[primitive['attributes']['POSITION']]['count'] // 3
+    return triangles
+
+class GltfTransform:
+    def __init__(self, executable, position_bits, normal_bits, simplify_error):
+        self.command = executable.split() if executable else ["npx", "--yes", "@gltf-transform/cli"]
+        self.position_bits = position_bits
+        self.normal_bits = normal_bits
+        self.simplify_error = simplify_error
+
+    def run(self, *args):
+        subprocess.run(self.command + [str(arg) for arg in args], check=True, capture_output=True)
+
+    def build(self, src, dst, ratio=None):
+        """dedup -> weld -> optional simplify -> draco with quantized attributes"""
+        with tempfile.TemporaryDirectory(prefix="blenderrag_mesh_") as tmp:
+            tmp = Path(tmp)
+            self.run("dedup", src, tmp / "dedup.glb")
+            self.run("weld", tmp / "dedup.glb", tmp / "weld.glb")
+            current = tmp / "weld.glb"
+            if ratio is not None:
+                self.run("simplify", current, tmp / "simplify.glb", "--ratio", ratio, "--error", self.simplify_error)
+                current = tmp / "simplify.glb"
+            self.run(
+                "draco", current, tmp / "out.glb",
+                "--quantize-position", self.position_bits,
+                "--quantize-normal", self.normal_bits,
+            )
+            shutil.move(str(tmp / "out.glb"), str(dst))
+
+def process_asset(tool, path, lod_ratios):
+    relative = path.relative_to(MESHES_DIR).as_posix()
+    entry = {
+        "bytes_before": path.stat().st_size,
+        "triangles_before": count_triangles(path),
+        "lods": [],
+    }
+
+    # only replace the base mesh when the rebuild is actually smaller
+    rebuilt = path.with_name(path.stem + ".tmp.glb")
+    tool.build(path, rebuilt)
+    if rebuilt.stat().st_size < entry["bytes_before"]:
+        os.replace(rebuilt, path)
+    else:
+        rebuilt.unlink()
+    entry["bytes_after"] = path.stat().st_size
+    entry["triangles_after"] = count_triangles(path)
+
+    for level, ratio in enumerate(lod_ratios, start=1):
+        lod_path = path.with_name(f"{path.stem}_lod{level}.glb")
+        tool.build(path, lod_path, ratio=ratio)
+        entry["lods"].append({
+            "file": lod_path.relative_to(MESHES_DIR).as_posix(),
+            "ratio": ratio,
+            "bytes": lod_path.stat().st_size,
+            "triangles": count_triangles(lod_path),
+        })
+    return relative, entry
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize docs/meshes GLBs and build LODs")
+    parser.add_argument("--lods", type=float, nargs="*", default=[0.5, 0.2], help="simplify ratios, one LOD each")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--gltf-transform", default=None, help="gltf-transform command, defaults to npx")
+    parser.add_argument("--position-bits", type=int, default=14)
+    parser.add_argument("--normal-bits", type=int, default=10)
+    parser.add_argument("--simplify-error", type=float, default=0.001)
+    parser.add_argument("--only", default=None, help="process only paths containing this text")
+    args = parser.parse_args()
+
+    tool = GltfTransform(args.gltf_transform, args.position_bits, args.normal_bits, args.simplify_error)
+    assets = sorted(p for p in MESHES_DIR.rglob("*.glb") if BASE_NAME.match(p.name))
+    if args.only:
+        assets = [p for p in assets if args.only in p.as_posix()]
+
+    manifest_path = MESHES_DIR / "manifest.json"
+    manifest = {}
+    if manifest_path.exists():
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+
+    start = time.perf_counter()
+    failures = 0
+    # each job spends its time in a node subprocess, so threads spread the work over all cores
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(process_asset, tool, path, args.lods): path for path in assets}
+        for done, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                relative, entry = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"[{done}/{len(assets)}] FAILED {path}: {e}")
+                continue
+            previous = manifest.get(relative)
+            if previous:
+                # keep the original numbers when an already optimized tree is rebuilt
+                entry["bytes_before"] = previous["bytes_before"]
+                entry["triangles_before"] = previous["triangles_before"]
+            manifest[relative] = entry
+            print(f"[{done}/{len(assets)}] {relative}: {entry['bytes_before']} -> {entry['bytes_after']} bytes")
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    entries = [manifest[k] for k in manifest]
+    bytes_before = sum(e["bytes_before"] for e in entries)
+    bytes_after = sum(e["bytes_after"] for e in entries)
+    triangles_before = sum(e["triangles_before"] for e in entries)
+    triangles_after = sum(e["triangles_after"] for e in entries)
+    print(f"\nProcessed {len(assets)} assets in {time.perf_counter() - start:.1f}s ({failures} failed)")
+    print(f"Bytes:     {bytes_before} -> {bytes_after} ({bytes_after / max(bytes_before, 1):.1%})")
+    print(f"Triangles: {triangles_before} -> {triangles_after}")
+    for level in range(1, len(args.lods) + 1):
+        lods = [e["lods"][level - 1] for e in entries if len(e["lods"]) >= level]
+        print(
+            f"LOD{level}:      {sum(l['bytes'] for l in lods)} bytes, "
+            f"{sum(l['triangles'] for l in lods)} triangles"
+        )
+    print(f"Manifest written to {manifest_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import json
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, Optional
+
+# zstd is optional, fall back to plain zlib when it is not installed
+try:
+    import zstandard
+    ZSTD_OK = True
+except ImportError:
+    zstandard = None
+    ZSTD_OK = False
+
+MAGIC = b"BRCODE01"
+# footer: dict offset, dict length, index offset, index length, magic
+FOOTER = struct.Struct("<QQQQ8s")
+DICT_SIZE = 32 * 1024
+COMPRESSION_LEVEL = 19
+
+class CodeStore:
+    """Single-file store of Blender scripts keyed by object id.
+
+    Layout: magic | compressed scripts | zstd dictionary | json offset index | footer.
+    Only the footer and the index are read on open, scripts are decompressed on demand.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+        self._index = None
+        self._codec = None
+        self._decompressor = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build(path, codes: Dict[str, str]):
+        """Write all scripts into a new store file, replacing any existing one"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        samples = [code.encode("utf-8") for code in codes.values()]
+        codec = "zlib"
+        dict_data = b""
+        compressor = None
+
+        if ZSTD_OK:
+            codec = "zstd"
+            try:
+                # scripts share a lot of boilerplate, a trained dictionary pays off
+                trained = zstandard.train_dictionary(DICT_SIZE, samples)
+                dict_data = trained.as_bytes()
+                compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=trained)
+            except Exception as e:
+                print(f"Code store: dictionary training skipped ({e})")
+                compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        entries = {}
+        raw_bytes = 0
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            for obj_id, data in zip(codes.keys(), samples):
+                raw_bytes += len(data)
+                if compressor is not None:
+                    blob = compressor.compress(data)
+                else:
+                    blob = zlib.compress(data, 9)
+                entries[obj_id] = [f.tell(), len(blob)]
+                f.write(blob)
+
+            dict_offset = f.tell()
+            f.write(dict_data)
+
+            index_offset = f.tell()
+            index_data = json.dumps({"codec": codec, "entries": entries}).encode("utf-8")
+            f.write(index_data)
+            f.write(FOOTER.pack(dict_offset, len(dict_data), index_offset, len(index_data), MAGIC))
+            total_bytes = f.tell()
+
+        tmp_path.replace(path)
+        print(f"Code store written: {len(entries)} scripts, {raw_bytes} -> {total_bytes} bytes ({codec})")
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _open(self):
+        if self._file is not None:
+            return
+
+        f = open(self.path, "rb")
+        try:
+            f.seek(-FOOTER.size, 2)
+            dict_offset, dict_length, index_offset, index_length, magic = FOOTER.unpack(f.read(FOOTER.size))
+            if magic != MAGIC:
+                raise ValueError(f"Not a code store: {self.path}")
+
+            f.seek(index_offset)
+            index = json.loads(f.read(index_length).decode("utf-8"))
+
+            codec = index["codec"]
+            if codec == "zstd":
+                if not ZSTD_OK:
+                    raise ImportError("zstandard is required to read this code store")
+                if dict_length:
+                    f.seek(dict_offset)
+                    dict_data = zstandard.ZstdCompressionDict(f.read(dict_length))
+                    self._decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+                else:
+                    self._decompressor = zstandard.ZstdDecompressor()
+        except Exception:
+            f.close()
+            raise
+
+        self._codec = codec
+        self._index = index["entries"]
+        self._file = f
+
+    def ids(self):
+        with self._lock:
+            self._open()
+            return list(self._index.keys())
+
+    def get(self, obj_id: str) -> Optional[str]:
+        """Read and decompress one script, None if the id is unknown"""
+        with self._lock:
+            self._open()
+            entry = self._index.get(obj_id)
+            if entry is None:
+                return None
+
+            offset, length = entry
+            self._file.seek(offset)
+            blob = self._file.read(length)
+            if self._codec == "zstd":
+                data = self._decompressor.decompress(blob)
+            else:
+                data = zlib.decompress(blob)
+            return data.decode("utf-8")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file = None
+            self._index = None
+            self._decompressor = None
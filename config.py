@@ -12,11 +12,144 @@ VECTORSTORE_DIR.mkdir(exist_ok=True)
 EMBEDDINGS_BACKUP_DIR = VECTORSTORE_DIR / "embeddings"
 EMBEDDINGS_BACKUP_DIR.mkdir(exist_ok=True)
 
+# compressed scripts, kept out of the qdrant payload
+CODE_STORE_PATH = VECTORSTORE_DIR / "code_store.bin"
+# memory-mapped copy of the dataset collection, opened instead of the qdrant storage
+USE_VECTOR_SNAPSHOT = True
+VECTOR_SNAPSHOT_PATH = VECTORSTORE_DIR / "dataset_snapshot.bin"
+
+# chat history, responses are stored out-of-line and only referenced from the scene
+HISTORY_DIR = ADDON_DIR / "history"
+HISTORY_MAX_ENTRIES = 50
+HISTORY_DISPLAY_ENTRIES = 10
+HISTORY_LINE_LENGTH = 60
+# the store is shared by every .blend, trimmed least recently used first
+HISTORY_MAX_BYTES = 64 * 1024 * 1024
+
+# generated-asset cache, keyed by normalized code hash
+ASSET_CACHE_DIR = ADDON_DIR / "asset_cache"
+ASSET_CACHE_MAX_ENTRIES = 200
+ASSET_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# bm25 index over the descriptions, built alongside the collection
+LEXICAL_INDEX_PATH = VECTORSTORE_DIR / "lexical_index.json"
+
 # vector db collection
 VECTOR_NAME = "Blender500_embeddings"
 COLLECTION_NAME = "Blender500_collection"
+USER_COLLECTION_NAME = "Blender500_user_collection"
 EMBEDDING_MODEL_NAME = "nomic-ai/nomic-embed-text-v1.5"
 EMBEDDING_DIMENSION = 768
+# vendored copy of the embedding model, built with: python model_store.py vendor
+# when present it is loaded with hub access disabled, no network needed
+EMBEDDING_MODEL_DIR = ADDON_DIR / "models" / "nomic-embed-text-v1.5"
+# commit the vendored copy must be at, None accepts whatever was vendored
+EMBEDDING_MODEL_REVISION = None
+# fail instead of falling back to the hub when the vendored copy is missing
+EMBEDDING_MODEL_LOCAL_ONLY = False
+# hash every file on each load, otherwise only files whose size or mtime changed
+EMBEDDING_MODEL_FULL_VERIFY = False
 
 # dataset
-DATASET_JSON = DATASET_DIR / "dataset.json"
\ No newline at end of file
+DATASET_JSON = DATASET_DIR / "dataset.json"
+
+# 'auto' prefers parquet splits in DATASET_DIR over dataset.json, or force 'json' / 'parquet'
+DATASET_SOURCE = "auto"
+# parquet column names, id and subcategory fall back to the row order and split name
+PARQUET_COLUMNS = {
+    "id": "id",
+    "category": "category",
+    "subcategory": "subcategory",
+    "description": "description",
+    "code": "code",
+}
+
+# known object categories per subcategory (25 indoor, 25 outdoor)
+CATEGORIES = {
+    "indoor": [
+        "armchair", "bed", "bookshelf", "cabinet_kitchen", "candle", "chair", "door", "frame",
+        "fridge", "glass", "lamp", "living_room_table", "microwave", "mirror", "office_lamp",
+        "pillow", "plant", "plate", "pot", "rug", "sofa", "table", "trash_can", "wardrobe", "window"
+    ],
+    "outdoor": [
+        "ball", "bell_tower", "bench", "bin", "bush", "cactus", "car", "condominium",
+        "flower_margherita", "fountain", "gate", "gazebo", "grass", "hedge", "humanoid_statue",
+        "mountains", "rock", "sea_umbrella", "shrub", "shrub_leaf", "skyscrapers", "stop_signal",
+        "stoplight", "street_lamp", "tree"
+    ],
+}
+
+# payload fields indexed in the collection for filtered search
+PAYLOAD_INDEX_FIELDS = ["category", "subcategory"]
+
+# ingestion pipeline
+INGEST_BATCH_SIZE = 128
+INGEST_READ_WORKERS = 8
+INGEST_QUEUE_BATCHES = 4
+
+# concurrent query serving
+QUERY_WORKERS = 4
+QUERY_MAX_PENDING = 64
+
+# recent query embeddings kept for reuse
+QUERY_EMBEDDING_CACHE_SIZE = 32
+
+# retrieval started in the background once the prompt stops changing
+SPECULATIVE_DEBOUNCE_SECONDS = 0.4
+SPECULATIVE_CACHE_SIZE = 8
+
+# llm request scheduling per provider, a rate of 0 disables that bucket
+LLM_RATE_LIMITS = {
+    'DEFAULT': {'concurrency': 2, 'requests_per_minute': 50, 'tokens_per_minute': 40000},
+    'OPENAI': {'concurrency': 4, 'requests_per_minute': 500, 'tokens_per_minute': 30000},
+    'ANTHROPIC': {'concurrency': 4, 'requests_per_minute': 50, 'tokens_per_minute': 30000},
+    'GOOGLE': {'concurrency': 4, 'requests_per_minute': 150, 'tokens_per_minute': 1000000},
+    'MISTRAL': {'concurrency': 2, 'requests_per_minute': 60, 'tokens_per_minute': 500000},
+    'MOCK': {'concurrency': 4, 'requests_per_minute': 20, 'tokens_per_minute': 20000},
+}
+LLM_MAX_RETRIES = 5
+LLM_BACKOFF_BASE = 1.0
+LLM_BACKOFF_MAX = 30.0
+# reserved up front for the response, corrected once the provider reports usage
+LLM_EXPECTED_OUTPUT_TOKENS = 1500
+
+# scene mode, one llm call per object part of the prompt
+SCENE_MAX_OBJECTS = 8
+SCENE_MAX_INSTANCES = 10
+SCENE_MAX_WORKERS = 8
+# gap between the grid cells objects are laid out on, in meters
+SCENE_SPACING = 0.5
+
+# static cost guard run on generated scripts before exec
+COST_GUARD_MODE = 'CLAMP'
+COST_MAX_OBJECTS = 2000
+COST_MAX_FACES = 2000000
+COST_MAX_SUBDIVISION = 3
+COST_MAX_SEGMENTS = 256
+COST_UNKNOWN_LOOP_ITERATIONS = 10
+# estimate next to the measured result of every guarded run
+COST_LOG_PATH = ADDON_DIR / "cost_log.jsonl"
+
+# how often streamed llm output is checked for complete statements to run
+STREAM_EXEC_INTERVAL = 0.05
+
+# reference meshes shipped with the add-on, docs/meshes/<subcategory>/<category>/<n>.glb
+MESHES_DIR = ADDON_DIR / "docs" / "meshes"
+
+# hybrid retrieval
+RRF_K = 60
+QUERY_STATS_WINDOW = 1000
+
+# candidates fetched per requested result when mmr is on
+MMR_FETCH_FACTOR = 3
+MMR_DUPLICATE_SIMILARITY = 0.98
+
+# saved generations below this similarity are left out of retrieval
+USER_MIN_SCORE = 0.5
+
+# idle release of the embedder and the store, 0 minutes / 0 MB disables
+IDLE_UNLOAD_MINUTES = 10
+MEMORY_BUDGET_MB = 0
+# over budget, components are released after this short idle period instead of the ttl
+IDLE_BUDGET_GRACE_SECONDS = 30
+IDLE_CHECK_SECONDS = 30
@@ -0,0 +1,376 @@
+import ast
+from typing import Dict, List, Optional, Tuple
+
+# Static estimate of what a generated script will build, from primitive calls,
+# loop bounds, subdivision levels and array counts. Kept free of bpy so it can
+# run on any script text before it is executed.
+
+# default argument values of the mesh primitive operators
+_PRIMITIVE_DEFAULTS = {
+    "primitive_cube_add": {},
+    "primitive_plane_add": {},
+    "primitive_monkey_add": {},
+    "primitive_uv_sphere_add": {"segments": 32, "ring_count": 16},
+    "primitive_ico_sphere_add": {"subdivisions": 2},
+    "primitive_cylinder_add": {"vertices": 32},
+    "primitive_cone_add": {"vertices": 32},
+    "primitive_circle_add": {"vertices": 32},
+    "primitive_torus_add": {"major_segments": 48, "minor_segments": 12},
+    "primitive_grid_add": {"x_subdivisions": 10, "y_subdivisions": 10},
+}
+
+# arguments and attributes that resolution clamping applies to
+SEGMENT_ARGS = {"segments", "ring_count", "vertices", "major_segments", "minor_segments", "x_subdivisions", "y_subdivisions"}
+SUBDIVISION_ARGS = {"levels", "render_levels", "level", "number_cuts", "cuts", "subdivisions"}
+
+def _geometry(name: str, args: Dict[str, int]) -> Tuple[int, int]:
+    """(vertices, faces) of one primitive"""
+    if name == "primitive_cube_add":
+        return 8, 6
+    if name == "primitive_plane_add":
+        return 4, 1
+    if name == "primitive_monkey_add":
+        return 507, 500
+    if name == "primitive_uv_sphere_add":
+        segments, rings = args["segments"], args["ring_count"]
+        return segments * (rings - 1) + 2, segments * rings
+    if name == "primitive_ico_sphere_add":
+        level = 4 ** max(args["subdivisions"] - 1, 0)
+        return 10 * level + 2, 20 * level
+    if name == "primitive_cylinder_add":
+        return 2 * args["vertices"], args["vertices"] + 2
+    if name == "primitive_cone_add":
+        return args["vertices"] + 1, args["vertices"] + 1
+    if name == "primitive_circle_add":
+        return args["vertices"], 1
+    if name == "primitive_torus_add":
+        count = args["major_segments"] * args["minor_segments"]
+        return count, count
+    if name == "primitive_grid_add":
+        x, y = args["x_subdivisions"], args["y_subdivisions"]
+        return x * y, max(x - 1, 1) * max(y - 1, 1)
+    return 0, 0
+
+def _call_name(node: ast.Call) -> str:
+    func = node.func
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    if isinstance(func, ast.Name):
+        return func.id
+    return ""
+
+class CostEstimator(ast.NodeVisitor):
+    """Accumulates the estimate over one or more parsed chunks of the same script.
+
+    Loop bodies are weighted by their iteration count, loops whose bounds are
+    not constant count as unknown_loop_iterations and are listed in notes.
+    """
+
+    def __init__(self, unknown_loop_iterations: int = 10):
+        self.unknown_loop_iterations = unknown_loop_iterations
+        self.objects = 0
+        self.vertices = 0
+        self.faces = 0
+        self.max_subdivision = 0
+        self.notes = []
+        # filled by the caller when it clamped the script before estimating
+        self.clamped = []
+        self._constants = {}
+        self._multiplier = 1
+        self._last = None
+        # local helpers and class methods are counted at each call site, not where they are defined
+        self._functions = {}
+        self._methods = {}
+        self._classes = {}
+        self._expanding = []
+        # last known subdivision level per modifier expression, for "+="
+        self._levels = {}
+
+    # constant folding, only ints assigned once at top level are tracked
+    def _value(self, node) -> Optional[int]:
+        try:
+            value = ast.literal_eval(node)
+        except (ValueError, SyntaxError, TypeError):
+            value = self._constants.get(node.id) if isinstance(node, ast.Name) else None
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return value if isinstance(value, int) else None
+
+    def _literal(self, node):
+        try:
+            return ast.literal_eval(node)
+        except (ValueError, SyntaxError, TypeError):
+            return self._constants.get(node.id) if isinstance(node, ast.Name) else None
+
+    def _iterations(self, node: ast.expr) -> Optional[int]:
+        if isinstance(node, ast.Call) and _call_name(node) == "range":
+            bounds = [self._value(arg) for arg in node.args]
+            if None in bounds or not bounds:
+                return None
+            start, stop, step = (0, bounds[0], 1) if len(bounds) == 1 else (bounds + [1])[:3]
+            if step == 0:
+                return None
+            return max(0, (stop - start + step - (1 if step > 0 else -1)) // step)
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            return len(node.elts)
+        if isinstance(node, ast.Call) and _call_name(node) in ("enumerate", "zip", "reversed") and node.args:
+            counts = [self._iterations(arg) for arg in node.args]
+            return None if None in counts else min(counts)
+        if isinstance(node, ast.Name) and node.id in self._constants:
+            value = self._constants[node.id]
+            return len(value) if isinstance(value, (list, tuple)) else None
+        return None
+
+    def _loop(self, node, iterations: Optional[int], what: str):
+        if iterations is None:
+            iterations = self.unknown_loop_iterations
+            self.notes.append(f"line {node.lineno}: {what} with unknown bound, assumed {iterations} iterations")
+        saved = self._multiplier
+        self._multiplier *= iterations
+        for child in node.body:
+            self.visit(child)
+        self._multiplier = saved
+        for child in node.orelse:
+            self.visit(child)
+
+    def visit_For(self, node: ast.For):
+        self._loop(node, self._iterations(node.iter), "loop")
+
+    def visit_While(self, node: ast.While):
+        self._loop(node, None, "while loop")
+
+    def _comprehension(self, node, elements):
+        # each generator multiplies like a nested for loop
+        saved = self._multiplier
+        for generator in node.generators:
+            self.visit(generator.iter)
+            iterations = self._iterations(generator.iter)
+            if iterations is None:
+                iterations = self.unknown_loop_iterations
+                self.notes.append(f"line {node.lineno}: comprehension with unknown bound, assumed {iterations} iterations")
+            self._multiplier *= iterations
+            for condition in generator.ifs:
+                self.visit(condition)
+        for element in elements:
+            self.visit(element)
+        self._multiplier = saved
+
+    def visit_ListComp(self, node: ast.ListComp):
+        self._comprehension(node, [node.elt])
+
+    visit_SetComp = visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node: ast.DictComp):
+        self._comprehension(node, [node.key, node.value])
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self._functions[node.name] = node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        for child in node.body:
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self._methods[child.name] = child
+                if child.name == "__init__":
+                    self._classes[node.name] = child
+
+    def _bind(self, function: ast.FunctionDef, call: ast.Call, bound: bool = False) -> dict:
+        """Constant values of the parameters for one call, None where unknown.
+
+        bound skips the first parameter, self or cls of a method call.
+        """
+        args = function.args
+        positional = [arg.arg for arg in args.posonlyargs + args.args]
+        if bound and positional and not any(
+            isinstance(decorator, ast.Name) and decorator.id == "staticmethod" for decorator in function.decorator_list
+        ):
+            positional = positional[1:]
+        values = {name: None for name in positional + [arg.arg for arg in args.kwonlyargs]}
+        for name, default in zip(positional[len(positional) - len(args.defaults):], args.defaults):
+            values[name] = self._literal(default)
+        for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+            if default is not None:
+                values[arg.arg] = self._literal(default)
+        for name, value in zip(positional, call.args):
+            values[name] = None if isinstance(value, ast.Starred) else self._literal(value)
+        for keyword in call.keywords:
+            if keyword.arg in values:
+                values[keyword.arg] = self._literal(keyword.value)
+        return values
+
+    def _expand(self, function: ast.FunctionDef, call: ast.Call, bound: bool = False):
+        if function in self._expanding:
+            self.notes.append(f"line {call.lineno}: recursive call to {function.name} not counted")
+            return
+        bindings = self._bind(function, call, bound)
+        # parameters shadow top-level names, unknown ones must not resolve to them
+        saved = self._constants
+        self._constants = {name: value for name, value in saved.items() if name not in bindings}
+        self._constants.update({name: value for name, value in bindings.items() if value is not None})
+        self._expanding.append(function)
+        try:
+            for child in function.body:
+                self.visit(child)
+        finally:
+            self._expanding.pop()
+            self._constants = saved
+
+    def visit_Assign(self, node: ast.Assign):
+        if self._multiplier == 1 and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            try:
+                self._constants[node.targets[0].id] = ast.literal_eval(node.value)
+            except (ValueError, SyntaxError, TypeError):
+                self._constants.pop(node.targets[0].id, None)
+        for target in node.targets:
+            if isinstance(target, ast.Attribute):
+                self._attribute(target, node.value, node.lineno)
+        self.generic_visit(node)
+
+    def visit_AugAssign(self, node: ast.AugAssign):
+        target = node.target
+        if isinstance(target, ast.Name):
+            # only "+=" of known ints stays folded at top level
+            value = self._value(node.value)
+            current = self._constants.get(target.id)
+            if self._multiplier == 1 and isinstance(node.op, ast.Add) and isinstance(current, int) and value is not None:
+                self._constants[target.id] = current + value
+            else:
+                self._constants.pop(target.id, None)
+        elif isinstance(target, ast.Attribute) and isinstance(node.op, ast.Add):
+            self._attribute(target, node.value, node.lineno, increment=True)
+        elif isinstance(target, ast.Attribute) and target.attr in ("levels", "render_levels"):
+            self.notes.append(f"line {node.lineno}: subdivision level is not constant")
+        self.generic_visit(node)
+
+    def _attribute(self, target: ast.Attribute, value_node, lineno: int, increment: bool = False):
+        attr = target.attr
+        value = self._value(value_node)
+        if attr in ("levels", "render_levels"):
+            if value is None:
+                self.notes.append(f"line {lineno}: subdivision level is not constant")
+                return
+            key = ast.dump(target)
+            previous = self._levels.get(key)
+            if increment and previous is None:
+                self.notes.append(f"line {lineno}: subdivision level raised from an unknown value, counted from 0")
+            level = (previous or 0) + value if increment else value
+            self._levels[key] = level
+            self.max_subdivision = max(self.max_subdivision, level)
+            if attr == "levels":
+                # the mesh was already subdivided up to the previous level
+                self._subdivide(level - (previous or 0) if increment else level)
+        elif attr == "count" and increment and value is not None and value > 0:
+            self._repeat(value)
+        elif attr == "count" and value is not None and value > 1:
+            # array modifier, repeats the last mesh
+            self._repeat(value - 1)
+
+    def _subdivide(self, level: int):
+        if self._last is None or level <= 0:
+            return
+        vertices, faces, multiplier = self._last
+        factor = 4 ** level - 1
+        self.faces += faces * factor * multiplier
+        self.vertices += max(vertices, faces) * factor * multiplier
+        self._last = (vertices * (factor + 1), faces * (factor + 1), multiplier)
+
+    def _repeat(self, copies: int):
+        if self._last is None:
+            return
+        vertices, faces, multiplier = self._last
+        self.vertices += vertices * copies * multiplier
+        self.faces += faces * copies * multiplier
+
+    def visit_Call(self, node: ast.Call):
+        name = _call_name(node)
+        keywords = {kw.arg: self._value(kw.value) for kw in node.keywords if kw.arg}
+        if isinstance(node.func, ast.Name) and name in self._functions:
+            self._expand(self._functions[name], node)
+        elif isinstance(node.func, ast.Name) and name in self._classes:
+            self._expand(self._classes[name], node, bound=True)
+        elif isinstance(node.func, ast.Attribute) and name in self._methods:
+            self._expand(self._methods[name], node, bound=True)
+        elif name in _PRIMITIVE_DEFAULTS:
+            args = dict(_PRIMITIVE_DEFAULTS[name])
+            for key in args:
+                if keywords.get(key) is not None:
+                    args[key] = keywords[key]
+            vertices, faces = _geometry(name, args)
+            self.objects += self._multiplier
+            self.vertices += vertices * self._multiplier
+            self.faces += faces * self._multiplier
+            self._last = (vertices, faces, self._multiplier)
+        elif name.startswith("primitive_") and name.endswith("_add") or name == "duplicate" or (
+            name == "new" and isinstance(node.func, ast.Attribute)
+            and isinstance(node.func.value, ast.Attribute) and node.func.value.attr == "objects"
+        ):
+            self.objects += self._multiplier
+        elif name == "subdivision_set" and keywords.get("level") is not None:
+            self.max_subdivision = max(self.max_subdivision, keywords["level"])
+            self._subdivide(keywords["level"])
+        elif name in ("subdivide", "subdivide_edges"):
+            cuts = keywords.get("number_cuts", keywords.get("cuts", 1)) or 1
+            self.max_subdivision = max(self.max_subdivision, cuts)
+            # n cuts split each quad into (n + 1)^2
+            if self._last is not None:
+                vertices, faces, multiplier = self._last
+                self.faces += faces * ((cuts + 1) ** 2 - 1) * multiplier
+                self.vertices += max(vertices, faces) * ((cuts + 1) ** 2 - 1) * multiplier
+        self.generic_visit(node)
+
+    def estimate(self) -> dict:
+        return {
+            "objects": self.objects,
+            "vertices": self.vertices,
+            "faces": self.faces,
+            "max_subdivision": self.max_subdivision,
+            "notes": list(self.notes),
+            "clamped": list(self.clamped),
+        }
+
+class _Clamp(ast.NodeTransformer):
+    def __init__(self, max_subdivision: int, max_segments: int):
+        self.max_subdivision = max_subdivision
+        self.max_segments = max_segments
+        self.changes = []
+
+    def _clamp(self, node, name: str, limit: int):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool) and node.value > limit:
+            self.changes.append(f"line {node.lineno}: {name} {node.value} -> {limit}")
+            return ast.copy_location(ast.Constant(value=limit), node)
+        return node
+
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        for keyword in node.keywords:
+            if keyword.arg in SUBDIVISION_ARGS:
+                keyword.value = self._clamp(keyword.value, keyword.arg, self.max_subdivision)
+            elif keyword.arg in SEGMENT_ARGS and _call_name(node).startswith("primitive_"):
+                keyword.value = self._clamp(keyword.value, keyword.arg, self.max_segments)
+        return node
+
+    def visit_Assign(self, node: ast.Assign):
+        self.generic_visit(node)
+        if any(isinstance(t, ast.Attribute) and t.attr in ("levels", "render_levels") for t in node.targets):
+            node.value = self._clamp(node.value, "subdivision level", self.max_subdivision)
+        return node
+
+def clamp_tree(tree: ast.AST, max_subdivision: int, max_segments: int) -> List[str]:
+    """Lower constant subdivision levels and primitive resolutions in place"""
+    clamp = _Clamp(max_subdivision, max_segments)
+    clamp.visit(tree)
+    ast.fix_missing_locations(tree)
+    return clamp.changes
+
+def over_limits(estimate: dict, max_objects: int, max_faces: int, max_subdivision: Optional[int] = None) -> List[str]:
+    reasons = []
+    if max_subdivision is not None and estimate["max_subdivision"] > max_subdivision:
+        reasons.append(f"subdivision level {estimate['max_subdivision']} (limit {max_subdivision})")
+    if estimate["objects"] > max_objects:
+        reasons.append(f"~{estimate['objects']} objects (limit {max_objects})")
+    if estimate["faces"] > max_faces:
+        reasons.append(f"~{estimate['faces']} faces (limit {max_faces})")
+    return reasons
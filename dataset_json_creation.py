@@ -1,40 +1,70 @@
 import json
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-parent_dir = Path(__file__).resolve().parent.parent
-sys.path.insert(0, str(parent_dir))
-from config import DATASET_DIR
+# works from the add-on folder or from a copy inside dataset/
+addon_dir = Path(__file__).resolve().parent
+if not (addon_dir / "config.py").exists():
+    addon_dir = addon_dir.parent
+sys.path.insert(0, str(addon_dir))
+from config import DATASET_DIR, DATASET_JSON
+from dataset_source import content_hash
 
-dataset_path = Path(".")
-objects = []
+VARIANT_FILE = re.compile(r"^txt(\d+)\.txt$")
+
+def scan_category(subcategory, category_dir):
+    # variants are discovered from the files present, not assumed to be 1..10
+    category = category_dir.name  # armchair, chair, ...
+    variants = sorted(
+        int(match.group(1))
+        for match in (VARIANT_FILE.match(p.name) for p in category_dir.iterdir())
+        if match
+    )
+
+    objects = []
+    for i in variants:
+        description_file = category_dir / f"txt{i}.txt"
+        code_file = category_dir / f"code{i}.py"
+        if not code_file.exists():
+            print(f"Skipping {category}_{subcategory}_{i}: missing {code_file.name}")
+            continue
+
+        with open(description_file, 'r') as f:
+            description = f.read().strip()
+        with open(code_file, 'r') as f:
+            python_code = f.read().strip()
+
+        objects.append({
+            "id": f"{category}_{subcategory}_{i}",
+            "category": category,
+            "subcategory": subcategory,
+            "description_file": str(description_file),
+            "code_file": str(code_file),
+            "image_file": str(category_dir / f"image{i}.png"),
+            "content_hash": content_hash(category, subcategory, description, python_code)
+        })
+    return objects
 
-for subcategory_dir in dataset_path.iterdir():
+category_dirs = []
+for subcategory_dir in sorted(DATASET_DIR.iterdir()):
     if not subcategory_dir.is_dir():
         continue
-    
+
     subcategory = subcategory_dir.name  # indoor and outdoor
-    
-    for category_dir in subcategory_dir.iterdir():
-        if not category_dir.is_dir():
-            continue
-        
-        category = category_dir.name  # armchair, chair, ...
-        
-        for i in range(1, 11):  # from 1 to 10 since there are only 10 variations for each object
-            obj = {
-                "id": f"{category}_{subcategory}_{i}",
-                "category": category,
-                "subcategory": subcategory,
-                "description_file": str(DATASET_DIR / subcategory / category / f"txt{i}.txt"),
-                "code_file": str(DATASET_DIR / subcategory / category / f"code{i}.py"),
-                "image_file": str(DATASET_DIR / subcategory / category / f"image{i}.png")
-            }
-            objects.append(obj)
-
-output = {"dataset_version": "1.0", "objects": objects}
-
-with open("dataset.json", "w") as f:
+    for category_dir in sorted(subcategory_dir.iterdir()):
+        if category_dir.is_dir():
+            category_dirs.append((subcategory, category_dir))
+
+objects = []
+with ThreadPoolExecutor(max_workers=16) as pool:
+    for category_objects in pool.map(lambda args: scan_category(*args), category_dirs):
+        objects.extend(category_objects)
+
+output = {"dataset_version": "1.1", "objects": objects}
+
+with open(DATASET_JSON, "w") as f:
     json.dump(output, f, indent=2)
 
-    
\ No newline at end of file
+print(f"Wrote {len(objects)} objects to {DATASET_JSON}")
@@ -0,0 +1,102 @@
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# kept free of package-relative imports, dataset_json_creation.py uses it as a script
+
+# pyarrow is optional, only needed for the parquet splits
+try:
+    import pyarrow.parquet as pq
+    PARQUET_OK = True
+except ImportError:
+    pq = None
+    PARQUET_OK = False
+
+Entry = Tuple[dict, str, str]
+
+def content_hash(category: str, subcategory: str, description: str, python_code: str) -> str:
+    """Hash of everything that ends up in the index for one object"""
+    digest = hashlib.sha256()
+    for part in (category, subcategory, description, python_code):
+        digest.update(part.encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def entry_paths(obj: dict, base_dir: Path) -> Tuple[Path, Path]:
+    """(description file, code file) of one dataset.json object"""
+    paths = []
+    for key in ('description_file', 'code_file'):
+        path = Path(obj[key])
+        paths.append(path if path.is_absolute() else base_dir / path)
+    return paths[0], paths[1]
+
+def file_stamp(paths: Iterable[Path]) -> List[int]:
+    """Size and mtime of each file, raises OSError if one is missing"""
+    stamp = []
+    for path in paths:
+        stat = path.stat()
+        stamp += [stat.st_size, stat.st_mtime_ns]
+    return stamp
+
+def read_file_entry(obj: dict, base_dir: Path) -> Optional[Entry]:
+    """(metadata, description, code) for one dataset.json object, None if unreadable"""
+    try:
+        desc_path, code_path = entry_paths(obj, base_dir)
+
+        # Read description
+        with open(desc_path, 'r') as f:
+            description = f.read().strip()
+
+        # Read code
+        with open(code_path, 'r') as f:
+            python_code = f.read().strip()
+
+        metadata = {
+            "id": obj['id'],
+            'category': obj['category'],
+            'subcategory': obj['subcategory']
+        }
+        return metadata, description, python_code
+    except Exception as e:
+        print(f"Error processing {obj['id']}: {e}")
+        return None
+
+def _split_name(path: Path) -> str:
+    # "indoor.parquet" and hub shards like "indoor-00000-of-00001.parquet"
+    return path.stem.split('-')[0]
+
+def iter_parquet_dataset(paths: List[Path], columns: Dict[str, str], batch_size: int = 128) -> Iterable[Entry]:
+    """Stream entries column-wise from the parquet splits, one record batch at a time"""
+    if not PARQUET_OK:
+        raise ImportError("pyarrow is required to read the parquet dataset")
+
+    variants = {}
+    for path in paths:
+        parquet_file = pq.ParquetFile(path)
+        available = set(parquet_file.schema_arrow.names)
+        wanted = [name for name in columns.values() if name in available]
+        for required in ('category', 'description', 'code'):
+            if columns[required] not in available:
+                raise ValueError(f"{path.name} has no '{columns[required]}' column")
+
+        split = _split_name(path)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=wanted):
+            data = {name: batch.column(name).to_pylist() for name in wanted}
+            for row in range(batch.num_rows):
+                category = data[columns['category']][row]
+                subcategory = data[columns['subcategory']][row] if columns['subcategory'] in data else split
+
+                if columns['id'] in data:
+                    obj_id = data[columns['id']][row]
+                else:
+                    # same ids as the file-based dataset, variants numbered in row order
+                    key = (subcategory, category)
+                    variants[key] = variants.get(key, 0) + 1
+                    obj_id = f"{category}_{subcategory}_{variants[key]}"
+
+                metadata = {
+                    "id": obj_id,
+                    'category': category,
+                    'subcategory': subcategory
+                }
+                yield metadata, (data[columns['description']][row] or "").strip(), (data[columns['code']][row] or "").strip()
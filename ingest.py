@@ -0,0 +1,138 @@
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List
+
+_DONE = object()
+
+class StageCounter:
+    """Items processed and busy time of one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+
+    def add(self, items: int, seconds: float):
+        self.items += items
+        self.seconds += seconds
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return f"{self.name}: {self.items} items in {self.seconds:.2f}s ({self.throughput:.1f}/s)"
+
+def parallel_read(items: Iterable, read_fn: Callable, workers: int = 8) -> Iterable:
+    """Apply read_fn on a thread pool, yielding results in input order as they complete.
+
+    At most workers * 2 reads are in flight, the next item is submitted only
+    after the oldest result was taken, so a slow consumer bounds the memory.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-read") as pool:
+        pending = collections.deque()
+        for item in items:
+            pending.append(pool.submit(read_fn, item))
+            if len(pending) < workers * 2:
+                continue
+            result = pending.popleft().result()
+            if result is not None:
+                yield result
+        while pending:
+            result = pending.popleft().result()
+            if result is not None:
+                yield result
+
+class IngestPipeline:
+    """Streams entries into the encoder in batches while the previous batch is upserted.
+
+    reader thread -> bounded queue -> encode (caller thread) -> upsert (single worker)
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List], object],
+        upsert_fn: Callable[[List, object], None],
+        batch_size: int = 128,
+        queue_batches: int = 4
+    ):
+        self.encode_fn = encode_fn
+        self.upsert_fn = upsert_fn
+        self.batch_size = batch_size
+        self.queue_batches = queue_batches
+        self.read_counter = StageCounter("read")
+        self.encode_counter = StageCounter("encode")
+        self.upsert_counter = StageCounter("upsert")
+
+    def _produce(self, entries: Iterable, batches: queue.Queue, errors: List):
+        try:
+            batch = []
+            start = time.perf_counter()
+            for entry in entries:
+                batch.append(entry)
+                if len(batch) == self.batch_size:
+                    self.read_counter.add(len(batch), time.perf_counter() - start)
+                    batches.put(batch)
+                    batch = []
+                    start = time.perf_counter()
+            if batch:
+                self.read_counter.add(len(batch), time.perf_counter() - start)
+                batches.put(batch)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            batches.put(_DONE)
+
+    def _upsert(self, batch: List, embeddings):
+        start = time.perf_counter()
+        self.upsert_fn(batch, embeddings)
+        self.upsert_counter.add(len(batch), time.perf_counter() - start)
+
+    def run(self, entries: Iterable) -> List:
+        """Run the pipeline and return every entry that went through it"""
+        batches = queue.Queue(maxsize=self.queue_batches)
+        errors = []
+        processed = []
+        reader = threading.Thread(
+            target=self._produce, args=(entries, batches, errors), name="rag-ingest-reader", daemon=True
+        )
+        reader.start()
+
+        pending = None
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-upsert") as upserter:
+            try:
+                while True:
+                    batch = batches.get()
+                    if batch is _DONE:
+                        break
+
+                    start = time.perf_counter()
+                    embeddings = self.encode_fn(batch)
+                    self.encode_counter.add(len(batch), time.perf_counter() - start)
+
+                    # at most one upsert in flight, it overlaps with the next encode
+                    if pending is not None:
+                        pending.result()
+                    pending = upserter.submit(self._upsert, batch, embeddings)
+                    processed.extend(batch)
+
+                if pending is not None:
+                    pending.result()
+            finally:
+                # unblock the reader if the encoder or an upsert failed
+                while reader.is_alive():
+                    try:
+                        batches.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                reader.join()
+
+        if errors:
+            raise errors[0]
+        return processed
+
+    def report(self) -> str:
+        return " | ".join(str(c) for c in (self.read_counter, self.encode_counter, self.upsert_counter))
@@ -0,0 +1,211 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+from importlib import metadata
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# pip ships its own copy of packaging, Blender's python may not have the standalone one
+try:
+    from packaging.requirements import Requirement
+except ImportError:
+    from pip._vendor.packaging.requirements import Requirement
+
+# Installs the add-on dependencies into lib/, skipping what is already satisfied.
+# Build a wheelhouse once on a connected machine, then copy it next to the add-on:
+#   python installer.py wheelhouse
+#   python installer.py install        (offline when wheelhouse/ holds wheels)
+# Kept free of bpy and package-relative imports so it also runs as a script.
+
+ADDON_DIR = Path(__file__).resolve().parent
+LIB_DIR = ADDON_DIR / "lib"
+WHEELHOUSE_DIR = ADDON_DIR / "wheelhouse"
+
+# everything resolved together in a single pip run
+REQUIREMENTS = [
+    "torch==2.8.0",
+    "torchvision==0.23.0",
+    "torchaudio==2.8.0",
+    "sentence-transformers",
+    "transformers",
+    "huggingface-hub",
+    "safetensors",
+    "tokenizers",
+    "scikit-learn",
+    "scipy",
+    "numpy",
+    "einops",
+    "zstandard",
+    "qdrant-client",
+    "grpcio",
+    "grpcio-tools",
+    "httpx",
+    "portalocker",
+    "datapizza-ai",
+    "datapizza-ai-vectorstores-qdrant",
+    "datapizza-ai-clients-mistral",
+    "datapizza-ai-clients-anthropic",
+    "datapizza-ai-clients-google",
+    "datapizza-ai-clients-openai",
+    "datapizza-ai-clients-openai-like",
+]
+
+class InstallProgress:
+    """State of the background install, read by the panel on redraw"""
+
+    def __init__(self):
+        self.running = False
+        self.step = ""
+        self.detail = ""
+        self.success = None
+
+    def update(self, step=None, detail=None):
+        if step is not None:
+            self.step = step
+            self.detail = ""
+            print(f"[install] {step}")
+        if detail is not None:
+            self.detail = detail[:80]
+
+progress = InstallProgress()
+# held while checking and claiming progress.running
+_job_lock = threading.Lock()
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def installed_versions(lib_path) -> Dict[str, str]:
+    """Distributions already present in the add-on lib folder"""
+    versions = {}
+    if not os.path.isdir(lib_path):
+        return versions
+    for dist in metadata.distributions(path=[str(lib_path)]):
+        name = dist.metadata.get("Name")
+        if name:
+            versions[_normalize(name)] = dist.version
+    return versions
+
+def unsatisfied(requirements: List[str], installed: Dict[str, str]) -> List[str]:
+    missing = []
+    for spec in requirements:
+        requirement = Requirement(spec)
+        version = installed.get(_normalize(requirement.name))
+        if version is None or (requirement.specifier and version not in requirement.specifier):
+            missing.append(spec)
+    return missing
+
+def has_wheels(wheelhouse) -> bool:
+    return wheelhouse is not None and Path(wheelhouse).is_dir() and any(Path(wheelhouse).glob("*.whl"))
+
+def _run_pip(args: List[str]) -> bool:
+    # stream pip output into the progress detail line
+    command = [sys.executable, "-m", "pip"] + args + ["--disable-pip-version-check"]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in process.stdout:
+        line = line.strip()
+        if line:
+            print(line)
+            if line.startswith(("Collecting", "Downloading", "Installing", "Saved", "Successfully", "ERROR")):
+                progress.update(detail=line)
+    return process.wait() == 0
+
+def install(lib_path=LIB_DIR, wheelhouse: Optional[Path] = WHEELHOUSE_DIR) -> bool:
+    """Install only the unsatisfied requirements into lib_path, offline when a wheelhouse exists"""
+    try:
+        os.makedirs(lib_path, exist_ok=True)
+
+        progress.update(step="Checking installed packages...")
+        missing = unsatisfied(REQUIREMENTS, installed_versions(lib_path))
+        if not missing:
+            progress.update(step="All requirements already satisfied")
+            return True
+
+        offline = has_wheels(wheelhouse)
+        source = "local wheelhouse" if offline else "PyPI"
+        progress.update(step=f"Installing {len(missing)} packages from {source}...")
+        # pip does not see lib_path as installed, without the full pinned set as
+        # constraints a partial install could resolve e.g. torch to another version
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("\n".join(REQUIREMENTS) + "\n")
+            constraints = f.name
+        try:
+            args = ["install", "-t", str(lib_path), "--upgrade", "-c", constraints] + missing
+            if offline:
+                args += ["--no-index", "--find-links", str(wheelhouse)]
+            ok = _run_pip(args)
+        finally:
+            os.remove(constraints)
+        if not ok:
+            progress.update(step="pip install failed, see console")
+            return False
+
+        progress.update(step="Verifying installation...")
+        still_missing = unsatisfied(REQUIREMENTS, installed_versions(lib_path))
+        if still_missing:
+            progress.update(step=f"Still missing: {', '.join(still_missing)}")
+            return False
+
+        progress.update(step="Installation complete, restart Blender")
+        return True
+    except Exception as e:
+        progress.update(step=f"Unexpected error: {e}")
+        return False
+
+def build_wheelhouse(wheelhouse: Path = WHEELHOUSE_DIR) -> bool:
+    """Download wheels for every requirement once, for offline installs on other machines"""
+    try:
+        Path(wheelhouse).mkdir(parents=True, exist_ok=True)
+        progress.update(step=f"Downloading wheels to {wheelhouse}...")
+        if not _run_pip(["download", "-d", str(wheelhouse)] + REQUIREMENTS):
+            progress.update(step="pip download failed, see console")
+            return False
+        count = len(list(Path(wheelhouse).glob("*.whl")))
+        progress.update(step=f"Wheelhouse ready with {count} wheels")
+        return True
+    except Exception as e:
+        progress.update(step=f"Unexpected error: {e}")
+        return False
+
+def run_in_background(target, *args, on_done=None) -> bool:
+    """Start an install or wheelhouse build unless one is already running"""
+    # claimed before the thread starts, so a second click cannot start another pip run
+    with _job_lock:
+        if progress.running:
+            return False
+        progress.running = True
+        progress.success = None
+
+    def worker():
+        try:
+            progress.success = target(*args)
+            if on_done is not None:
+                on_done(progress.success)
+        finally:
+            progress.running = False
+
+    try:
+        threading.Thread(target=worker, name="rag-installer", daemon=True).start()
+    except Exception:
+        progress.running = False
+        raise
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Install the add-on dependencies or build an offline wheelhouse")
+    parser.add_argument("command", choices=["install", "wheelhouse"])
+    parser.add_argument("--lib", type=Path, default=LIB_DIR)
+    parser.add_argument("--wheelhouse", type=Path, default=WHEELHOUSE_DIR)
+    args = parser.parse_args()
+
+    if args.command == "install":
+        ok = install(args.lib, args.wheelhouse)
+    else:
+        ok = build_wheelhouse(args.wheelhouse)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
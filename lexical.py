@@ -0,0 +1,140 @@
+import json
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+STOPWORDS = {
+    "a", "an", "and", "the", "of", "with", "in", "on", "for", "to", "is", "it", "its",
+    "that", "this", "by", "at", "as", "or", "be", "are", "from", "has", "have", "very",
+    "object", "description", "make", "create", "generate", "me", "some", "one", "two",
+}
+
+def tokenize(text: str) -> List[str]:
+    # lowercase words, stopwords dropped, naive plural folding
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+class BM25Index:
+    """In-memory BM25 inverted index over the dataset descriptions"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_len: Dict[str, int] = {}
+        self.metadata: Dict[str, Dict] = {}
+        self.avgdl = 0.0
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def add(self, doc_id: str, text: str, metadata: Optional[Dict] = None):
+        if doc_id in self.doc_len:
+            self.remove(doc_id)
+
+        tokens = tokenize(text)
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_len[doc_id] = len(tokens)
+        self.metadata[doc_id] = metadata or {"id": doc_id}
+        self._update_avgdl()
+
+    def remove(self, doc_id: str):
+        if doc_id not in self.doc_len:
+            return
+        for term in list(self.postings.keys()):
+            docs = self.postings[term]
+            if docs.pop(doc_id, None) is not None and not docs:
+                del self.postings[term]
+        del self.doc_len[doc_id]
+        self.metadata.pop(doc_id, None)
+        self._update_avgdl()
+
+    def _update_avgdl(self):
+        self.avgdl = sum(self.doc_len.values()) / len(self.doc_len) if self.doc_len else 0.0
+
+    def _matches(self, doc_id: str, metadata_filter: Optional[Dict]) -> bool:
+        if not metadata_filter:
+            return True
+        meta = self.metadata.get(doc_id, {})
+        for key, value in metadata_filter.items():
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                if meta.get(key) not in value:
+                    return False
+            elif meta.get(key) != value:
+                return False
+        return True
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        metadata_filter: Optional[Dict] = None
+    ) -> Tuple[List[Tuple[str, float]], float]:
+        """Return the top-k (doc_id, score) pairs and the query-term coverage of the best hit"""
+        terms = set(tokenize(query))
+        if not terms or not self.doc_len:
+            return [], 0.0
+
+        n_docs = len(self.doc_len)
+        scores: Dict[str, float] = {}
+        for term in terms:
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                if not self._matches(doc_id, metadata_filter):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / self.avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        if not ranked:
+            return [], 0.0
+
+        best = ranked[0][0]
+        covered = sum(1 for term in terms if best in self.postings.get(term, {}))
+        return ranked, covered / len(terms)
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "postings": self.postings,
+            "doc_len": self.doc_len,
+            "metadata": self.metadata,
+        }
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path) -> "BM25Index":
+        with open(path, "r") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.postings = data["postings"]
+        index.doc_len = data["doc_len"]
+        index.metadata = data["metadata"]
+        index._update_avgdl()
+        return index
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked id lists, score = sum of 1 / (k + rank)"""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
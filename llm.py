@@ -3,6 +3,13 @@ from datapizza.clients.openai import OpenAIClient
 from datapizza.clients.google import GoogleClient
 from datapizza.clients.mistral import MistralClient
 from datapizza.clients.openai_like import OpenAILikeClient
+import hashlib
+import threading
+
+from . import config
+from .mock_provider import MockClient
+from .patching import EDIT_PROMPT, EDIT_SYSTEM_PROMPT
+from .scheduler import LLMScheduler, INTERACTIVE
 
 class LLM:
     def __init__(self, props):
@@ -10,6 +17,8 @@ class LLM:
         self.error = None
         self.provider = props.llm_provider
         self.model = props.model    
+        # usage of the last call made from the current thread
+        self._local = threading.local()
         self.system_prompt = """You are a Blender Python expert. Your task is to generate executable Blender Python code based on user requests and available object references.
 ## STRICT RULES
 
@@ -148,6 +157,10 @@ No explanations before or after. Just the code block."""
     def _initialize(self, props):
         # init the right client
         # based on user choice
+        if props.llm_provider == 'MOCK':
+            self.client = MockClient()
+            return
+        
         if not props.api_key:
             self.error = 'api key not set'
             return
@@ -172,27 +185,139 @@ No explanations before or after. Just the code block."""
     def is_ready(self):
         return self.client is not None and self.error is None
 
-    def generate(self, prompt, context, max_tokens=32000):
+    def close(self):
+        # release the provider client and its http session
+        if self.client is None:
+            return
+        for attr in ("client", "a_client"):
+            inner = getattr(self.client, attr, None)
+            close = getattr(inner, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    print(f"Error closing {self.provider} client: {e}")
+        self.client = None
+
+    def _full_prompt(self, prompt, context):
+        if not context:
+            return prompt
+        context_text = "\n\n".join([
+            f"Object: {obj['obj_id']} \n Code: \n{obj['code']}" for obj in context
+        ])
+        return f"Available objects:\n{context_text}\n\nUser request: {prompt}"
+
+    def _estimate_tokens(self, full_prompt):
+        return len(full_prompt) // 4 + config.LLM_EXPECTED_OUTPUT_TOKENS
+
+    def _record_usage(self, estimated, response):
+        if response is None:
+            return
+        output = getattr(response, 'completion_tokens_used', 0) or 0
+        used = (getattr(response, 'prompt_tokens_used', 0) or 0) + output
+        get_scheduler().record_usage(self.provider, estimated, used)
+        # rough estimate when the provider does not report usage
+        self._local.output_tokens = output or len(response.text or "") // 4
+
+    def last_output_tokens(self):
+        return getattr(self._local, 'output_tokens', 0)
+
+    def stream(self, prompt, context, max_tokens=32000, priority=INTERACTIVE):
+        """Yield the response text received so far, raises on provider errors"""
+        full_prompt = self._full_prompt(prompt, context)
+        estimated = self._estimate_tokens(full_prompt)
+        last_response = None
+        for response in get_scheduler().stream(
+            self.provider,
+            lambda: self.client.stream_invoke(input=full_prompt, max_tokens=max_tokens),
+            estimated,
+            priority
+        ):
+            last_response = response
+            yield response.text
+        self._record_usage(estimated, last_response)
+
+    def generate(self, prompt, context, max_tokens=32000, priority=INTERACTIVE, system_prompt=None):
         if not self.is_ready():
             return None, self.error
         
         try: 
-            full_prompt = prompt
-            if context:
-                context_text = "\n\n".join([
-                    f"Object: {obj['obj_id']} \n Code: \n{obj['code']}" for obj in context
-                ])
-                full_prompt = f"Available objects:\n{context_text}\n\nUser request: {prompt}"
-
-            last_response = None
-            for response in self.client.stream_invoke(
-                input=full_prompt,
-                max_tokens=max_tokens
-            ):
-                last_response = response
+            full_prompt = self._full_prompt(prompt, context)
+            estimated = self._estimate_tokens(full_prompt)
+            # per-call override of the client's generation system prompt
+            kwargs = {'system_prompt': system_prompt} if system_prompt else {}
+            
+            def invoke():
+                last_response = None
+                for response in self.client.stream_invoke(
+                    input=full_prompt,
+                    max_tokens=max_tokens,
+                    **kwargs
+                ):
+                    last_response = response
+                return last_response
+            
+            # queued behind the provider limits, retried on rate limits
+            last_response = get_scheduler().call(self.provider, invoke, estimated, priority)
+            self._record_usage(estimated, last_response)
             if last_response:
                 return last_response.text, None
             
             return None, "No response received"
         except Exception as e:
-            return None, f"Generation failed: {e}"
\ No newline at end of file
+            return None, f"Generation failed: {e}"
+
+    def edit(self, script, instruction, max_tokens=8000, priority=INTERACTIVE):
+        """Ask for search/replace blocks against script instead of a new script"""
+        return self.generate(
+            EDIT_PROMPT.format(script=script, instruction=instruction),
+            context=None,
+            max_tokens=max_tokens,
+            priority=priority,
+            system_prompt=EDIT_SYSTEM_PROMPT
+        )
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                limits=config.LLM_RATE_LIMITS,
+                max_retries=config.LLM_MAX_RETRIES,
+                backoff_base=config.LLM_BACKOFF_BASE,
+                backoff_max=config.LLM_BACKOFF_MAX
+            )
+        return _scheduler
+
+# pool of long-lived clients keyed by (provider, model, api key hash),
+# so keep-alive connections are reused across generations
+_llm_pool = {}
+_llm_pool_lock = threading.Lock()
+
+def _pool_key(props):
+    key_hash = hashlib.sha256(props.api_key.encode("utf-8")).hexdigest()
+    return (props.llm_provider, props.model, key_hash)
+
+def get_llm(props) -> LLM:
+    """Return a pooled LLM for the current settings, creating it on first use"""
+    key = _pool_key(props)
+    with _llm_pool_lock:
+        llm = _llm_pool.get(key)
+        if llm is not None and llm.is_ready():
+            return llm
+
+        llm = LLM(props)
+        if llm.is_ready():
+            _llm_pool[key] = llm
+        return llm
+
+def invalidate_llm_pool():
+    """Close and drop every pooled client (called when LLM settings change)"""
+    with _llm_pool_lock:
+        clients = list(_llm_pool.values())
+        _llm_pool.clear()
+    for llm in clients:
+        llm.close()
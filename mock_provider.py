@@ -0,0 +1,86 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+# Local stand-in for a provider client, used to exercise the scheduler offline.
+# It enforces its own requests/tokens per minute like a real api and can inject
+# transient failures; select it with llm_provider='MOCK' (no api key needed).
+
+MOCK_SCRIPT = '''import bpy
+
+bpy.ops.object.select_all(action='DESELECT')
+bpy.ops.mesh.primitive_cube_add(size=1, location=(0, 0, 0.5))
+obj = bpy.context.active_object
+obj.name = "MockObject"
+'''
+
+class MockRateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.response = type("MockResponse", (), {"headers": {"retry-after": retry_after} if retry_after else {}})()
+
+class MockServerError(Exception):
+    status_code = 503
+
+class MockResponse:
+    def __init__(self, text: str, prompt_tokens: int, completion_tokens: int):
+        self.text = text
+        self.prompt_tokens_used = prompt_tokens
+        self.completion_tokens_used = completion_tokens
+
+class MockClient:
+    """Streams MOCK_SCRIPT line by line, throttled by a sliding one-minute window"""
+
+    def __init__(
+        self,
+        requests_per_minute: int = 20,
+        tokens_per_minute: int = 20000,
+        failure_rate: float = 0.0,
+        first_token_seconds: float = 0.2,
+        chunk_seconds: float = 0.02,
+        seed: Optional[int] = None,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.failure_rate = failure_rate
+        self.first_token_seconds = first_token_seconds
+        self.chunk_seconds = chunk_seconds
+        self.requests = 0
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = deque()
+
+    def _admit(self, tokens: int):
+        with self._lock:
+            now = time.monotonic()
+            while self._window and now - self._window[0][0] > 60:
+                self._window.popleft()
+            used_tokens = sum(t for _, t in self._window)
+            if len(self._window) >= self.requests_per_minute or used_tokens + tokens > self.tokens_per_minute:
+                self.throttled += 1
+                retry = 60 - (now - self._window[0][0]) if self._window else 1.0
+                raise MockRateLimitError("Rate limit exceeded", retry_after=min(retry, 5.0))
+            if self._random.random() < self.failure_rate:
+                raise MockServerError("Service unavailable")
+            self._window.append((now, tokens))
+            self.requests += 1
+
+    def stream_invoke(self, input: str, max_tokens: int = 32000, system_prompt: Optional[str] = None):
+        prompt_tokens = len(input) // 4
+        body = f"```python\n{MOCK_SCRIPT}```"
+        self._admit(prompt_tokens + len(body) // 4)
+
+        time.sleep(self.first_token_seconds)
+        text = ""
+        for line in body.splitlines(keepends=True):
+            text += line
+            yield MockResponse(text, prompt_tokens, len(text) // 4)
+            time.sleep(self.chunk_seconds)
+
+    def close(self):
+        pass
@@ -0,0 +1,172 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+# Vendored copy of the embedding model, loaded without the Hugging Face hub.
+# Build it once on a connected machine, then ship the folder with the add-on:
+#   python model_store.py vendor      (pinned revision, remote code made local)
+#   python model_store.py verify
+# Kept free of bpy and package-relative imports so it also runs as a script.
+
+ADDON_DIR = Path(__file__).resolve().parent
+DEFAULT_REPO = "nomic-ai/nomic-embed-text-v1.5"
+DEFAULT_DIR = ADDON_DIR / "models" / "nomic-embed-text-v1.5"
+
+MANIFEST_NAME = "rag_model_manifest.json"
+# size/mtime of files already hashed, so a normal load does not re-read the weights
+VERIFIED_NAME = ".rag_verified.json"
+# not needed to encode, some are large
+IGNORE_PATTERNS = ["onnx/*", "*.onnx", "*.msgpack", "*.h5", "*.ot"]
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _model_files(model_dir: Path) -> Dict[str, Path]:
+    # hidden entries are hub download state and our own bookkeeping
+    files = {}
+    for path in sorted(model_dir.rglob("*")):
+        relative = path.relative_to(model_dir)
+        if path.is_file() and not any(part.startswith(".") for part in relative.parts) and path.name != MANIFEST_NAME:
+            files[relative.as_posix()] = path
+    return files
+
+def _localize_auto_map(model_dir: Path) -> Dict[str, set]:
+    """Point "repo--module.Class" auto_map entries at modules copied next to the weights"""
+    config_path = model_dir / "config.json"
+    with open(config_path, "r") as f:
+        model_config = json.load(f)
+
+    code_files = {}
+    def localize(reference):
+        if isinstance(reference, list):
+            return [localize(item) for item in reference]
+        if not isinstance(reference, str) or "--" not in reference:
+            return reference
+        repo_id, local = reference.split("--", 1)
+        code_files.setdefault(repo_id, set()).add(local.split(".")[0] + ".py")
+        return local
+
+    auto_map = model_config.get("auto_map", {})
+    for key, reference in auto_map.items():
+        auto_map[key] = localize(reference)
+    with open(config_path, "w") as f:
+        json.dump(model_config, f, indent=2)
+    return code_files
+
+def vendor(repo_id: str, model_dir: Path, revision: Optional[str] = None) -> dict:
+    """Download one revision of the model and the remote code it needs, then write the manifest"""
+    from huggingface_hub import HfApi, hf_hub_download, snapshot_download
+
+    api = HfApi()
+    revision = api.model_info(repo_id, revision=revision).sha
+    model_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Vendoring {repo_id}@{revision} into {model_dir}")
+    snapshot_download(repo_id, revision=revision, local_dir=model_dir, ignore_patterns=IGNORE_PATTERNS)
+
+    remote_code = {}
+    for code_repo, filenames in _localize_auto_map(model_dir).items():
+        code_revision = api.model_info(code_repo).sha
+        for filename in sorted(filenames):
+            hf_hub_download(code_repo, filename, revision=code_revision, local_dir=model_dir)
+        remote_code[code_repo] = code_revision
+        print(f"Remote code {code_repo}@{code_revision}: {', '.join(sorted(filenames))}")
+
+    manifest = {
+        "repo_id": repo_id,
+        "revision": revision,
+        "remote_code": remote_code,
+        "files": {name: _sha256(path) for name, path in _model_files(model_dir).items()},
+    }
+    with open(model_dir / MANIFEST_NAME, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"Manifest written: {len(manifest['files'])} files")
+    return manifest
+
+def verify(model_dir, revision: Optional[str] = None, full: bool = False) -> dict:
+    """Check the vendored files against the manifest, raises ValueError listing every mismatch.
+
+    Files whose size and mtime match the last successful check are not hashed
+    again unless full is set.
+    """
+    model_dir = Path(model_dir)
+    with open(model_dir / MANIFEST_NAME, "r") as f:
+        manifest = json.load(f)
+    if revision and manifest["revision"] != revision:
+        raise ValueError(f"Vendored model is at {manifest['revision']}, config pins {revision}")
+
+    verified_path = model_dir / VERIFIED_NAME
+    verified = {}
+    if not full and verified_path.exists():
+        try:
+            with open(verified_path, "r") as f:
+                verified = json.load(f)
+        except (OSError, ValueError):
+            verified = {}
+
+    problems = []
+    stamps = {}
+    files = _model_files(model_dir)
+    for name, expected in manifest["files"].items():
+        path = files.get(name)
+        if path is None:
+            problems.append(f"missing {name}")
+            continue
+        stat = path.stat()
+        stamp = [stat.st_size, stat.st_mtime_ns, expected]
+        if verified.get(name) != stamp and _sha256(path) != expected:
+            problems.append(f"checksum mismatch {name}")
+            continue
+        stamps[name] = stamp
+    # unlisted code would run with trust_remote_code
+    problems.extend(f"unexpected {name}" for name in files if name.endswith(".py") and name not in manifest["files"])
+    if problems:
+        raise ValueError(f"Vendored model in {model_dir} failed verification: {'; '.join(problems)}")
+
+    try:
+        with open(verified_path, "w") as f:
+            json.dump(stamps, f)
+    except OSError:
+        # read-only install, the next load hashes again
+        pass
+    return manifest
+
+def has_vendored_model(model_dir) -> bool:
+    return model_dir is not None and (Path(model_dir) / MANIFEST_NAME).exists()
+
+def disable_hub():
+    """No hub requests from this process, also for transformers/huggingface_hub imported before"""
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    os.environ["HF_HUB_DISABLE_TELEMETRY"] = "1"
+    constants = sys.modules.get("huggingface_hub.constants")
+    if constants is not None:
+        constants.HF_HUB_OFFLINE = True
+
+def main():
+    parser = argparse.ArgumentParser(description="Vendor the embedding model for offline use or verify a vendored copy")
+    parser.add_argument("command", choices=["vendor", "verify"])
+    parser.add_argument("--repo", default=DEFAULT_REPO)
+    parser.add_argument("--dir", type=Path, default=DEFAULT_DIR)
+    parser.add_argument("--revision", default=None, help="commit to vendor, the current main when omitted")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "vendor":
+            vendor(args.repo, args.dir, args.revision)
+        # a revision given to vendor may be a branch, the manifest holds the commit
+        manifest = verify(args.dir, None if args.command == "vendor" else args.revision, full=True)
+    except (OSError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+    print(f"OK: {manifest['repo_id']}@{manifest['revision']}, {len(manifest['files'])} files")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,36 @@
 import bpy
 from bpy.types import Operator 
+import queue
 import sys
+import threading
+import time
+
+# how often the reference fast path triggers and what it saves over the llm path,
+# and what edit mode saves over full regenerations
+_generation_stats = {
+    'llm_runs': 0,
+    'llm_seconds': 0.0,
+    'llm_output_tokens': 0,
+    'reference_runs': 0,
+    'reference_seconds': 0.0,
+    'edit_runs': 0,
+    'edit_seconds': 0.0,
+    'edit_output_tokens': 0,
+}
+
+def get_generation_stats():
+    stats = dict(_generation_stats)
+    total = stats['llm_runs'] + stats['reference_runs']
+    llm_avg = stats['llm_seconds'] / stats['llm_runs'] if stats['llm_runs'] else 0.0
+    reference_avg = stats['reference_seconds'] / stats['reference_runs'] if stats['reference_runs'] else 0.0
+    stats['reference_rate'] = stats['reference_runs'] / total if total else 0.0
+    stats['llm_avg_seconds'] = llm_avg
+    stats['reference_avg_seconds'] = reference_avg
+    stats['seconds_saved'] = max(0.0, llm_avg - reference_avg) * stats['reference_runs'] if llm_avg else 0.0
+    stats['llm_avg_output_tokens'] = stats['llm_output_tokens'] / stats['llm_runs'] if stats['llm_runs'] else 0.0
+    stats['edit_avg_seconds'] = stats['edit_seconds'] / stats['edit_runs'] if stats['edit_runs'] else 0.0
+    stats['edit_avg_output_tokens'] = stats['edit_output_tokens'] / stats['edit_runs'] if stats['edit_runs'] else 0.0
+    return stats
 
 class RAG_OT_Generate(Operator):
     """Generate scene from prompt"""
@@ -9,9 +39,12 @@ class RAG_OT_Generate(Operator):
     bl_options = {'REGISTER', 'UNDO'}
     
     def execute(self, context):
-        from .llm import LLM
+        from .llm import get_llm
         from .rag import get_rag_manager
-        from .utils import process_response
+        from .speculative import get_speculative_retriever, query_settings
+        from .utils import process_response, append_history
+        
+        start = time.perf_counter()
 
         props = context.scene.rag_props
         
@@ -25,20 +58,54 @@ class RAG_OT_Generate(Operator):
         if not props.prompt:
             self.report({'WARNING'}, "Enter a prompt")
             return {'CANCELLED'}
+        # the field stays editable while a streamed build runs
+        self._prompt = props.prompt
+        
+        rag = get_rag_manager()
+        settings = query_settings(props)
+        subcategory, category = settings['subcategory'], settings['category']
+        
+        # follow-ups patch the script of the selected object instead of starting over
+        edit_ref = self._edit_target(context) if props.edit_mode else None
+        
+        # prompts listing several objects, one sub-request each
+        scene_parts = None
+        if props.scene_mode and edit_ref is None:
+            from .scene import split_scene_prompt
+            setting, scene_parts = split_scene_prompt(props.prompt)
+            if len(scene_parts) < 2 and not any(part['count'] > 1 for part in scene_parts):
+                scene_parts = None
+        
+        # zero-llm fast path, instantiate the closest dataset object directly
+        if props.reference_mode != 'OFF' and scene_parts is None and edit_ref is None:
+            props.status = "Matching reference objects..."
+            match, error = rag.match_reference(props.prompt, subcategory=subcategory, category=category)
+            if error:
+                props.status = f"Error: {error}"
+                self.report({'ERROR'}, error)
+                return {'CANCELLED'}
+            
+            if match and (props.reference_mode == 'ALWAYS' or match[1] >= props.reference_threshold):
+                return self._use_reference(context, rag, match, start)
         
-        # init the llm client
-        llm = LLM(props)
+        # get the pooled llm client
+        llm = get_llm(props)
         if not llm.is_ready():
             self.report({'ERROR'}, llm.error)
             return {'CANCELLED'}
         
-        # init vector db
+        if edit_ref is not None:
+            return self._edit_script(context, llm, edit_ref, start)
+        
+        if scene_parts is not None:
+            return self._generate_scene(context, llm, rag, setting, scene_parts, settings, start)
+        
+        # reuse the retrieval started while the prompt was edited
         props.status = "Querying vector database..."
-        rag = get_rag_manager()
-        results, error = rag.query(
-            prompt=props.prompt,
-            k=props.top_k
-        ) 
+        future = get_speculative_retriever().take(props.prompt, settings) if props.speculative_retrieval else None
+        results, error = future.result() if future is not None else (None, None)
+        if future is None or error:
+            results, error = rag.query(prompt=props.prompt, **settings)
         
         if error:
             props.status = f"Error: {error}"
@@ -49,7 +116,10 @@ class RAG_OT_Generate(Operator):
         if results:
             for idx in range(len(results)):
                 obj_id = results[idx].metadata['id']
-                code = results[idx].metadata['code']     
+                code = rag.get_code(results[idx])
+                if code is None:
+                    print(f"No code stored for {obj_id}")
+                    continue
                 retrieved_objects.append({
                     'obj_id': obj_id,
                     'code': code
@@ -58,10 +128,10 @@ class RAG_OT_Generate(Operator):
             self.report({'INFO'}, f"Found {len(retrieved_objects)} objects")
             print(f"Retrieved objects: {[obj['obj_id'] for obj in retrieved_objects]}")
 
-        if props.history:
-            props.history += f"\n\nUser: {props.prompt}"
-        else:
-            props.history = f"User: {props.prompt}"
+        append_history(props, 'USER', props.prompt)
+        
+        if props.stream_execution:
+            return self._start_streaming(context, llm, retrieved_objects, start)
         
         # generate the code
         props.status = "Generating response.."
@@ -73,26 +143,328 @@ class RAG_OT_Generate(Operator):
             props.status = f'Error: {error}'
             self.report({'Error'}, error)
             return {'CANCELLED'}
+        self._output_tokens = llm.last_output_tokens()
         
         # execute and save generate code
         props.status = "Processing generated code..."
-        result = process_response(response)
+        result = process_response(response, use_cache=props.use_asset_cache)
+        return self._finish(context, response, result, start)
+    
+    def _finish(self, context, response, result, start):
+        from .rag import get_rag_manager
+        from .utils import append_history, store_history_content, tag_script_objects
+        
+        props = context.scene.rag_props
+        rag = get_rag_manager()
         
         if result['filepath']:
             self.report({'INFO'}, f"Code saved to: {result['filepath']}")
             print(f"Generated code saved to: {result['filepath']}")
         
+        if result['cached']:
+            self.report({'INFO'}, "Reused cached asset")
+        
         if result['error']:
             props.status = f"Error: {result['error']}"
-            props.history += f"\n\nAssistant: [Code generated but failed]\n{result['error']}"
+            append_history(props, 'ASSISTANT', f"[Code generated but failed] {result['error']}", content=response, success=False)
             self.report({'ERROR'}, result['error'])
             return {'CANCELLED'}
         
-        props.history += f"\n\nAssistant: {response}"
-        props.prompt = ""
+        if props.save_generations:
+            saved, error = rag.add_generation(
+                prompt=self._prompt,
+                code=result['code'],
+                duplicate_threshold=props.duplicate_threshold
+            )
+            if error:
+                self.report({'WARNING'}, error)
+            elif saved:
+                self.report({'INFO'}, "Generation added to the user collection")
+        
+        # kept for edit mode, the objects remember which script built them
+        script_ref = store_history_content(result['code'])
+        tag_script_objects(result.get('objects', []), script_ref)
+        props.last_script_ref = script_ref
+        
+        line_count = len(result['code'].splitlines())
+        append_history(props, 'ASSISTANT', f"generated {line_count} lines of code", content=response)
+        _generation_stats['llm_runs'] += 1
+        _generation_stats['llm_seconds'] += time.perf_counter() - start
+        _generation_stats['llm_output_tokens'] += getattr(self, '_output_tokens', 0)
+        
+        # keep whatever the user typed while the response streamed
+        if props.prompt == self._prompt:
+            props.prompt = ""
         props.status = "Ready"
         self.report({'INFO'}, "Generated!")
         return {'FINISHED'}
+    
+    def _edit_target(self, context):
+        from .utils import load_history_content
+        
+        # the selected object's script, otherwise the last generated one
+        obj = context.active_object
+        ref = obj.get("rag_script") if obj is not None else None
+        ref = ref or context.scene.rag_props.last_script_ref
+        if ref and load_history_content(ref) is not None:
+            return ref
+        return None
+    
+    def _edit_script(self, context, llm, base_ref, start):
+        from .patching import parse_edit_blocks, apply_edit_blocks
+        from .scene import rerun_script
+        from .utils import load_history_content, parse_code, save_code, append_history, store_history_content
+        
+        props = context.scene.rag_props
+        base_code = load_history_content(base_ref)
+        append_history(props, 'USER', props.prompt)
+        
+        props.status = "Requesting edit..."
+        response, error = llm.edit(base_code, props.prompt)
+        if error:
+            props.status = f"Error: {error}"
+            self.report({'ERROR'}, error)
+            return {'CANCELLED'}
+        output_tokens = llm.last_output_tokens()
+        
+        blocks = parse_edit_blocks(response)
+        if blocks:
+            code, error = apply_edit_blocks(base_code, blocks)
+        else:
+            # the model answered with a whole script anyway
+            code, error = parse_code(response)
+        if error:
+            props.status = f"Error: {error}"
+            append_history(props, 'ASSISTANT', f"[Edit not applied] {error}", content=response, success=False)
+            self.report({'ERROR'}, error)
+            return {'CANCELLED'}
+        
+        # only re-run when the patch actually changed the script
+        if code.strip() != base_code.strip():
+            props.status = "Re-running edited script..."
+            _, error = rerun_script(base_ref, code)
+            if error:
+                props.status = f"Error: {error}"
+                append_history(props, 'ASSISTANT', f"[Edited code failed] {error}", content=response, success=False)
+                self.report({'ERROR'}, error)
+                return {'CANCELLED'}
+            save_code(code)
+            props.last_script_ref = store_history_content(code)
+        
+        elapsed = time.perf_counter() - start
+        _generation_stats['edit_runs'] += 1
+        _generation_stats['edit_seconds'] += elapsed
+        _generation_stats['edit_output_tokens'] += output_tokens
+        print(f"Edit: {len(blocks)} blocks, {output_tokens} output tokens in {elapsed:.2f}s")
+        
+        append_history(props, 'ASSISTANT', f"edited script ({len(blocks)} changes)", content=response)
+        props.prompt = ""
+        props.status = "Ready"
+        self.report({'INFO'}, "Edited!")
+        return {'FINISHED'}
+    
+    def _generate_scene(self, context, llm, rag, setting, parts, settings, start):
+        from .scene import generate_objects, build_scene
+        from .utils import append_history, save_code
+        
+        props = context.scene.rag_props
+        append_history(props, 'USER', props.prompt)
+        
+        props.status = f"Generating {len(parts)} objects..."
+        stats, error = generate_objects(llm, rag, parts, setting, settings)
+        if error:
+            props.status = f"Error: {error}"
+            append_history(props, 'ASSISTANT', f"[Scene failed] {error}", success=False)
+            self.report({'ERROR'}, error)
+            return {'CANCELLED'}
+        
+        props.status = "Building scene..."
+        built, errors = build_scene(parts)
+        for message in errors:
+            self.report({'WARNING'}, message)
+        
+        # one file with every object script, for reference and reuse
+        combined = "\n\n".join(
+            f"# --- {part['name']} x{part['count']} ---\n{part['code']}" for part in parts if part.get('code')
+        )
+        response = "\n\n".join(f"```python\n{part['code']}\n```" for part in parts if part.get('code'))
+        if combined:
+            save_code(combined)
+        
+        print(
+            f"Scene: {len(built)} instances of {len(parts)} objects, "
+            f"wall {stats['wall_seconds']:.1f}s vs {stats['sum_seconds']:.1f}s sequential"
+        )
+        if not built:
+            error = "; ".join(errors) or "No objects created"
+            props.status = f"Error: {error}"
+            append_history(props, 'ASSISTANT', f"[Scene failed] {error}", content=response or None, success=False)
+            self.report({'ERROR'}, error)
+            return {'CANCELLED'}
+        
+        summary = f"scene: {', '.join(built)}"
+        if errors:
+            summary += f" ({len(errors)} failed)"
+        append_history(props, 'ASSISTANT', summary, content=response, success=not errors)
+        # one run per object llm call, so the averages stay per call
+        called = [part for part in parts if not part.get('retrieval_failed')]
+        _generation_stats['llm_runs'] += len(called)
+        _generation_stats['llm_seconds'] += sum(part['seconds'] for part in called)
+        _generation_stats['llm_output_tokens'] += sum(part['output_tokens'] for part in called)
+        
+        props.prompt = ""
+        props.status = "Ready"
+        self.report({'INFO'}, f"Generated {len(built)} objects")
+        return {'FINISHED'}
+    
+    def _start_streaming(self, context, llm, retrieved_objects, start):
+        from .stream_exec import IncrementalExecutor
+        from . import config
+        
+        props = context.scene.rag_props
+        self._start = start
+        self._text = ""
+        self._exec = IncrementalExecutor(props.cost_guard)
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        prompt = self._prompt
+        
+        # the provider stream is read off the main thread, statements run on it
+        def read_stream():
+            try:
+                for text in llm.stream(prompt, retrieved_objects):
+                    if self._stop.is_set():
+                        return
+                    self._queue.put(('text', text))
+                self._output_tokens = llm.last_output_tokens()
+                self._queue.put(('done', None))
+            except Exception as e:
+                self._queue.put(('error', f"Generation failed: {e}"))
+        
+        threading.Thread(target=read_stream, name="rag-llm-stream", daemon=True).start()
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(config.STREAM_EXEC_INTERVAL, window=context.window)
+        wm.modal_handler_add(self)
+        props.status = "Generating and building... (Esc to cancel)"
+        return {'RUNNING_MODAL'}
+    
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            return self._abort_streaming(context, "Generation cancelled")
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        
+        done = False
+        while True:
+            try:
+                kind, payload = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'error':
+                return self._abort_streaming(context, payload)
+            if kind == 'done':
+                done = True
+            else:
+                self._text = payload
+        
+        if done:
+            if not self._exec.finish(self._text):
+                return self._abort_streaming(context, self._exec.error)
+            return self._finish_streaming(context)
+        
+        if not self._exec.feed(self._text):
+            return self._abort_streaming(context, self._exec.error)
+        if context.area:
+            context.area.tag_redraw()
+        return {'RUNNING_MODAL'}
+    
+    def _stop_streaming(self, context):
+        self._stop.set()
+        context.window_manager.event_timer_remove(self._timer)
+    
+    def _abort_streaming(self, context, error):
+        from .utils import append_history
+        
+        self._stop_streaming(context)
+        self._exec.rollback()
+        if self._exec.cost_mode != 'OFF' and self._exec.error and self._exec.error.startswith("Script blocked"):
+            from .utils import record_cost
+            record_cost(self._exec.estimator.estimate(), None, "blocked")
+        props = context.scene.rag_props
+        props.status = f"Error: {error}"
+        append_history(props, 'ASSISTANT', f"[Streamed build rolled back] {error}", content=self._text or None, success=False)
+        self.report({'ERROR'}, error)
+        return {'CANCELLED'}
+    
+    def _finish_streaming(self, context):
+        from .utils import parse_code, save_code
+        
+        self._stop_streaming(context)
+        props = context.scene.rag_props
+        code, _ = parse_code(self._text)
+        result = {
+            'success': True,
+            'code': code,
+            'filepath': None,
+            'error': None,
+            'cached': False,
+            'objects': self._exec.snapshot.created()
+        }
+        filepath, error = save_code(code)
+        if error:
+            print(f"Save error: {error}")
+        result['filepath'] = filepath
+        
+        if props.use_asset_cache:
+            from .asset_cache import get_asset_cache
+            get_asset_cache().store(code, self._exec.snapshot.created(), self._exec.exec_seconds)
+        
+        if self._exec.cost_mode != 'OFF':
+            from .utils import record_cost, measure_objects
+            estimate = self._exec.estimator.estimate()
+            record_cost(estimate, measure_objects(result['objects']), "clamped" if estimate['clamped'] else "ran", self._exec.exec_seconds)
+        
+        print(f"Streamed build: {self._exec.executed} statements run during generation")
+        return self._finish(context, self._text, result, self._start)
+    
+    def _use_reference(self, context, rag, match, start):
+        from .utils import process_code, append_history, reference_mesh_path, import_reference_mesh
+        
+        props = context.scene.rag_props
+        metadata, score = match
+        obj_id = metadata['id']
+        append_history(props, 'USER', props.prompt)
+        
+        mesh_path = reference_mesh_path(metadata)
+        if props.reference_source == 'GLB' and mesh_path.exists():
+            props.status = f"Importing reference {obj_id}..."
+            success, error = import_reference_mesh(mesh_path)
+        else:
+            # dataset script, also the fallback for variants without a GLB
+            code = rag.get_code_by_id(obj_id)
+            if code is None:
+                success, error = False, f"No code stored for {obj_id}"
+            else:
+                props.status = f"Running reference {obj_id}..."
+                result = process_code(code, use_cache=props.use_asset_cache)
+                success, error = result['success'], result['error']
+        
+        if not success:
+            props.status = f"Error: {error}"
+            append_history(props, 'ASSISTANT', f"[Reference failed] {error}", success=False)
+            self.report({'ERROR'}, error)
+            return {'CANCELLED'}
+        
+        elapsed = time.perf_counter() - start
+        _generation_stats['reference_runs'] += 1
+        _generation_stats['reference_seconds'] += elapsed
+        print(f"Reference fast path: {obj_id} (similarity {score:.3f}) in {elapsed:.2f}s, LLM skipped")
+        
+        append_history(props, 'ASSISTANT', f"reference {obj_id} ({score:.2f})")
+        props.prompt = ""
+        props.status = "Ready"
+        self.report({'INFO'}, f"Used reference {obj_id}")
+        return {'FINISHED'}
 
 class RAG_OT_Clear(Operator):
     """Clear chat history"""
@@ -101,8 +473,30 @@ class RAG_OT_Clear(Operator):
     bl_options = {'REGISTER', 'UNDO'}
     
     def execute(self, context):
-        context.scene.rag_props.history = ""
+        context.scene.rag_props.history.clear()
         context.scene.rag_props.prompt = ""
         context.scene.rag_props.status = "Ready"
         return {'FINISHED'}
-    
\ No newline at end of file
+
+class RAG_OT_SyncDataset(Operator):
+    """Re-index only the dataset objects that changed"""
+    bl_idname = "rag.sync_dataset"
+    bl_label = "Sync Dataset"
+    
+    def execute(self, context):
+        from .rag import get_rag_manager
+        
+        props = context.scene.rag_props
+        props.status = "Syncing dataset..."
+        stats, error = get_rag_manager().sync_dataset()
+        if error:
+            props.status = f"Error: {error}"
+            self.report({'ERROR'}, error)
+            return {'CANCELLED'}
+        
+        props.status = "Ready"
+        self.report(
+            {'INFO'},
+            f"Synced: {stats['added']} added, {stats['updated']} updated, {stats['removed']} removed"
+        )
+        return {'FINISHED'}
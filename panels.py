@@ -1,6 +1,7 @@
 import sys
 import bpy
 from bpy.types import Panel
+from . import config
 
 class RAG_PT_Main(Panel):
     bl_label = "BlenderRAG"
@@ -31,12 +32,27 @@ class RAG_PT_Main(Panel):
             box.label(text="Dependencies Missing", icon='ERROR')
             box.separator()
             
+            installer = sys.modules.get(f"{addon_name}.installer")
+            progress = installer.progress if installer else None
+            if progress and (progress.running or progress.step):
+                col = box.column(align=True)
+                col.label(text=progress.step, icon='SORTTIME' if progress.running else 'INFO')
+                if progress.detail:
+                    col.label(text=progress.detail)
+                box.separator()
+
             # button install dependecies
             col = box.column(align=True)
             col.scale_y = 2.0
+            col.enabled = not (progress and progress.running)
             col.operator("rag.install_dependencies", 
                         text="Install Dependencies",
                         icon='IMPORT')
+            row = box.row()
+            row.enabled = col.enabled
+            row.operator("rag.build_wheelhouse", text="Build Offline Wheelhouse", icon='PACKAGE')
+            if installer and installer.has_wheels(installer.WHEELHOUSE_DIR):
+                box.label(text="Wheelhouse found, installing offline", icon='CHECKMARK')
             
             box.separator()
             col = box.column(align=True)
@@ -67,14 +83,14 @@ class RAG_PT_Main(Panel):
             box = layout.box()
             box.label(text=props.status, icon='INFO')
         
-        if props.history:
+        if len(props.history):
             layout.separator()
             box = layout.box()
             box.label(text="History:", icon='TEXT')
             col = box.column(align=True)
-            for line in props.history.split('\n')[:10]:
-                if line.strip():
-                    col.label(text=line[:60])
+            start = max(0, len(props.history) - config.HISTORY_DISPLAY_ENTRIES)
+            for entry in props.history[start:]:
+                col.label(text=entry.display, icon='NONE' if entry.success else 'ERROR')
 
 class RAG_PT_Settings(Panel):
     bl_label = "Settings"
@@ -109,4 +125,91 @@ class RAG_PT_Settings(Panel):
         
         # retrieval settings
         layout.label(text="Retrieval Settings:")
-        layout.prop(props, "top_k", text="Number of Results")
\ No newline at end of file
+        layout.prop(props, "top_k", text="Number of Results")
+        layout.prop(props, "subcategory_filter", text="Environment")
+        layout.prop(props, "category_filter", text="Category")
+        layout.prop(props, "auto_detect_category")
+        layout.prop(props, "use_lexical")
+        if props.use_lexical:
+            layout.prop(props, "lexical_confidence")
+        layout.prop(props, "mmr_diversity")
+        layout.prop(props, "speculative_retrieval")
+        
+        layout.operator("rag.sync_dataset", text="Sync Dataset", icon='FILE_REFRESH')
+        layout.prop(props, "reference_mode")
+        if props.reference_mode != 'OFF':
+            layout.prop(props, "reference_source")
+            if props.reference_mode == 'AUTO':
+                layout.prop(props, "reference_threshold")
+            operators_module = sys.modules.get(f"{addon_name}.operators")
+            if operators_module:
+                stats = operators_module.get_generation_stats()
+                if stats['reference_runs']:
+                    box = layout.box()
+                    box.label(text=f"Reference used: {stats['reference_rate']:.0%} of generations")
+                    box.label(text=f"Avg {stats['reference_avg_seconds']:.2f}s vs {stats['llm_avg_seconds']:.2f}s with LLM")
+        layout.prop(props, "edit_mode")
+        operators_module = sys.modules.get(f"{addon_name}.operators")
+        if props.edit_mode and operators_module:
+            stats = operators_module.get_generation_stats()
+            if stats['edit_runs']:
+                box = layout.box()
+                box.label(text=f"Edits: {stats['edit_avg_output_tokens']:.0f} output tokens, {stats['edit_avg_seconds']:.1f}s avg")
+                if stats['llm_runs']:
+                    box.label(text=f"Full: {stats['llm_avg_output_tokens']:.0f} output tokens, {stats['llm_avg_seconds']:.1f}s avg")
+        layout.prop(props, "scene_mode")
+        layout.prop(props, "stream_execution")
+        layout.prop(props, "cost_guard")
+        utils_module = sys.modules.get(f"{addon_name}.utils")
+        last_cost = utils_module and utils_module._last_cost
+        if props.cost_guard != 'OFF' and last_cost:
+            box = layout.box()
+            estimate, actual = last_cost['estimate'], last_cost['actual']
+            box.label(text=f"Estimated {estimate['objects']} objects, {estimate['faces']} faces")
+            if actual:
+                box.label(text=f"Measured {actual['objects']} objects, {actual['faces']} faces")
+            if last_cost['action'] != 'ran':
+                box.label(text=f"Script {last_cost['action']}", icon='ERROR' if last_cost['action'] == 'blocked' else 'INFO')
+        layout.prop(props, "use_asset_cache")
+        if props.use_asset_cache:
+            cache_module = sys.modules.get(f"{addon_name}.asset_cache")
+            if cache_module and cache_module._asset_cache:
+                stats = cache_module._asset_cache.stats()
+                box = layout.box()
+                box.label(text=f"Cache: {stats['entries']} assets, {stats['bytes'] / 1e6:.1f} MB")
+                box.label(text=f"Hits {stats['hits']} / misses {stats['misses']}, {stats['seconds_saved']:.1f}s saved")
+        layout.prop(props, "save_generations")
+        if props.save_generations:
+            layout.prop(props, "duplicate_threshold")
+        
+        # memory
+        layout.separator()
+        layout.label(text="Memory:")
+        layout.prop(props, "idle_unload_minutes")
+        if props.idle_unload_minutes:
+            layout.prop(props, "idle_unload_store")
+        layout.prop(props, "memory_budget_mb")
+        rag_module = sys.modules.get(f"{addon_name}.rag")
+        if rag_module and rag_module._rag_instance:
+            stats = rag_module._rag_instance.get_memory_stats()
+            box = layout.box()
+            embedder = f"{stats['embedder_mb']:.0f} MB" if stats['embedder_loaded'] else "unloaded"
+            store = f"{stats['store_mb']:.0f} MB" if stats['store_loaded'] else "unloaded"
+            box.label(text=f"Embedder {embedder} | vectors {store}")
+            if stats['process_rss_mb'] is not None:
+                box.label(text=f"Blender process: {stats['process_rss_mb']:.0f} MB resident")
+            if stats['idle_unloads']:
+                box.label(text=f"Idle releases {stats['idle_unloads']}, reload {stats['last_reload_seconds']:.1f}s (avg {stats['avg_reload_seconds']:.1f}s)")
+        
+        # retrieval stats
+        if rag_module and rag_module._rag_instance and rag_module._rag_instance.query_count:
+            stats = rag_module._rag_instance.get_query_stats()
+            box = layout.box()
+            box.label(text=f"Queries: {stats['queries']} | lexical only: {stats['lexical_fraction']:.0%}")
+            box.label(text=f"Latency p50 {stats['p50_ms']:.1f} / p90 {stats['p90_ms']:.1f} / p99 {stats['p99_ms']:.1f} ms")
+            speculative = sys.modules.get(f"{addon_name}.speculative")
+            if speculative and speculative._retriever:
+                spec = speculative._retriever.stats()
+                box.label(text=f"Speculative hits {spec['hits']} / misses {spec['misses']}, {spec['cancelled']} cancelled")
+            if stats['mmr_requests']:
+                box.label(text=f"Context tokens: {stats['mmr_tokens_with']:.0f} with MMR / {stats['mmr_tokens_without']:.0f} without")
\ No newline at end of file
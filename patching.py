@@ -0,0 +1,100 @@
+import re
+from typing import List, Optional, Tuple
+
+# search/replace blocks asked from the llm in edit mode, more robust to apply
+# than line-numbered unified diffs
+_BLOCK = re.compile(
+    r"<{5,}\s*SEARCH[^\n]*\n(.*?)^={5,}[ \t]*\n(.*?)^>{5,}\s*REPLACE",
+    re.DOTALL | re.MULTILINE
+)
+
+# used instead of the generation system prompt, which asks for one full code block
+EDIT_SYSTEM_PROMPT = """You are a Blender Python expert. Your task is to edit an existing, executable Blender Python script according to the user's request.
+## STRICT RULES
+- Return ONLY search/replace edit blocks, never the full script and no ```python``` code block
+- No explanations before, between or after the blocks
+- Each block has exactly this form:
+<<<<<<< SEARCH
+lines copied verbatim from the current script
+=======
+replacement lines
+>>>>>>> REPLACE
+- SEARCH copies whole lines, including their indentation, and is just long enough to be unique
+- Keep the script immediately executable in Blender's Python environment
+- Only use the imports bpy, bmesh, math, mathutils"""
+
+EDIT_PROMPT = """Edit the existing Blender script below instead of writing a new one.
+For this request do not return the full script. Return only edit blocks, as many as needed, each exactly in this form:
+<<<<<<< SEARCH
+lines copied verbatim from the current script
+=======
+replacement lines
+>>>>>>> REPLACE
+Each SEARCH part must match the current script exactly, including indentation, and be just long enough to be unique.
+Leave SEARCH empty to append code at the end of the script.
+
+Current script:
+```python
+{script}
+```
+
+Requested change: {instruction}"""
+
+def parse_edit_blocks(response: str) -> List[Tuple[str, str]]:
+    return [(search, replace) for search, replace in _BLOCK.findall(response or "")]
+
+def _find_lines(code_lines: List[str], search_lines: List[str], normalize) -> List[int]:
+    # matches whole lines only, a raw substring could start mid-line
+    target = [normalize(line) for line in search_lines]
+    normalized = [normalize(line) for line in code_lines]
+    return [
+        i for i in range(len(code_lines) - len(target) + 1)
+        if normalized[i:i + len(target)] == target
+    ]
+
+def _exact(line: str) -> str:
+    return line.rstrip("\r\n")
+
+def _loose(line: str) -> str:
+    # whitespace-insensitive fallback, the model often re-indents blank or trailing space
+    return line.strip()
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+def _reindent(replace: str, search_lines: List[str], matched: List[str]) -> str:
+    # shift the replacement by the indentation the loose match ignored
+    for search_line, code_line in zip(search_lines, matched):
+        if search_line.strip():
+            old, new = _indent(search_line), _indent(code_line)
+            break
+    else:
+        return replace
+    return "".join(
+        new + line[len(old):] if line.strip() and line.startswith(old) else line
+        for line in replace.splitlines(keepends=True)
+    )
+
+def apply_edit_blocks(code: str, blocks: List[Tuple[str, str]]) -> Tuple[Optional[str], Optional[str]]:
+    """Apply the blocks in order, each SEARCH has to match exactly once"""
+    for number, (search, replace) in enumerate(blocks, start=1):
+        if not search.strip():
+            code = code.rstrip("\n") + "\n" + replace
+            continue
+
+        lines = code.splitlines(keepends=True)
+        search_lines = search.rstrip("\n").splitlines()
+        matches = _find_lines(lines, search_lines, _exact)
+        if len(matches) > 1:
+            return None, f"Edit block {number} matches {len(matches)} places"
+        loose = not matches
+        if loose:
+            matches = _find_lines(lines, search_lines, _loose)
+        if len(matches) != 1:
+            return None, f"Edit block {number} does not match the script" if not matches else f"Edit block {number} matches {len(matches)} places"
+        start = matches[0]
+        if loose:
+            replace = _reindent(replace, search_lines, lines[start:start + len(search_lines)])
+        replacement = replace if replace.endswith("\n") or not replace else replace + "\n"
+        code = "".join(lines[:start]) + replacement + "".join(lines[start + len(search_lines):])
+    return code, None
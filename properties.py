@@ -1,6 +1,8 @@
+import sys
 import bpy
-from bpy.props import StringProperty, EnumProperty, IntProperty, FloatProperty, BoolProperty, PointerProperty
+from bpy.props import StringProperty, EnumProperty, IntProperty, FloatProperty, BoolProperty, PointerProperty, CollectionProperty
 from bpy.types import PropertyGroup
+from . import config
 
 def get_model_items(self, context):
     """Return model choices based on selected provider"""
@@ -23,9 +25,78 @@ def get_model_items(self, context):
             ('mistral-large-latest', "Mistral Large", ""),
             ('mistral-medium-latest', "Mistral Medium", ""),
         ],
+        'MOCK': [
+            ('mock', "Mock", ""),
+        ],
     }
     return models.get(self.llm_provider, [('', "None", "")])
 
+def get_category_items(self, context):
+    """Return category choices for the selected subcategory"""
+    if self.subcategory_filter == 'ALL':
+        return _CATEGORY_ITEMS['ALL']
+    return _CATEGORY_ITEMS.get(self.subcategory_filter, _CATEGORY_ITEMS['ALL'])
+
+def _build_category_items():
+    # kept at module level, blender needs the enum strings to stay alive
+    items = {'ALL': [('ALL', "All", "")]}
+    for subcategory, categories in config.CATEGORIES.items():
+        sub_items = [('ALL', "All", "")]
+        for category in categories:
+            sub_items.append((category, category.replace('_', ' ').title(), ""))
+        items[subcategory] = sub_items
+        items['ALL'] = items['ALL'] + sub_items[1:]
+    return items
+
+_CATEGORY_ITEMS = _build_category_items()
+
+def invalidate_llm_clients(self, context):
+    """Drop pooled LLM clients so the next generation uses the new settings"""
+    try:
+        from .llm import invalidate_llm_pool
+    except ImportError:
+        return
+    invalidate_llm_pool()
+
+def schedule_speculative_retrieval(self, context):
+    """Retrieve in the background for the new prompt before Generate is pressed"""
+    if not self.speculative_retrieval or not self.prompt.strip():
+        return
+    addon_module = sys.modules.get(__name__.split('.')[0])
+    if not getattr(addon_module, '_dependencies_ready', False):
+        return
+    from .speculative import schedule
+    schedule(self)
+
+class RAGHistoryEntry(PropertyGroup):
+    """One chat turn, the full response lives outside the .blend file"""
+    
+    role: EnumProperty(
+        name="Role",
+        items=[
+            ('USER', "User", ""),
+            ('ASSISTANT', "Assistant", ""),
+        ],
+        default='USER'
+    )
+    
+    # pre-truncated so drawing does no string work
+    display: StringProperty(
+        name="Display",
+        default=""
+    )
+    
+    # content hash of the stored response, empty for user turns
+    content_ref: StringProperty(
+        name="Content Reference",
+        default=""
+    )
+    
+    success: BoolProperty(
+        name="Success",
+        default=True
+    )
+
 class RAGProperties(PropertyGroup):
     """Settings for RAG Assistant"""
     
@@ -37,19 +108,23 @@ class RAGProperties(PropertyGroup):
             ('ANTHROPIC', "Anthropic", ""),
             ('GOOGLE', "Google", ""),
             ('MISTRAL', "Mistral", ""),
+            ('MOCK', "Mock (offline)", "Local mock provider with simulated rate limits, for testing"),
         ],
-        default='ANTHROPIC'
+        default='ANTHROPIC',
+        update=invalidate_llm_clients
     )
     
     api_key: StringProperty(
         name="API Key",
         default="",
-        subtype='PASSWORD'
+        subtype='PASSWORD',
+        update=invalidate_llm_clients
     )
     
     model: EnumProperty(
         name="Model",
-        items=get_model_items  
+        items=get_model_items,
+        update=invalidate_llm_clients
     )
     
     # RAG Settings
@@ -60,15 +135,173 @@ class RAGProperties(PropertyGroup):
         max=20
     )
     
+    subcategory_filter: EnumProperty(
+        name="Environment",
+        items=[
+            ('ALL', "All", ""),
+            ('indoor', "Indoor", ""),
+            ('outdoor', "Outdoor", ""),
+        ],
+        default='ALL'
+    )
+    
+    category_filter: EnumProperty(
+        name="Category",
+        items=get_category_items
+    )
+    
+    auto_detect_category: BoolProperty(
+        name="Auto-detect Category",
+        description="Restrict retrieval to a category named in the prompt",
+        default=False
+    )
+    
+    use_lexical: BoolProperty(
+        name="Hybrid Lexical Search",
+        description="BM25 first stage, fused with dense results or answering alone when confident",
+        default=True
+    )
+    
+    lexical_confidence: FloatProperty(
+        name="Lexical Confidence",
+        description="Share of prompt terms the best lexical hit must contain to skip the embedder",
+        default=1.0,
+        min=0.0,
+        max=1.0
+    )
+    
+    mmr_diversity: FloatProperty(
+        name="Diversity",
+        description="Maximal marginal relevance trade-off, 0 keeps the plain top-k",
+        default=0.0,
+        min=0.0,
+        max=1.0
+    )
+    
+    # Zero-LLM fast path
+    reference_mode: EnumProperty(
+        name="Use Reference",
+        items=[
+            ('OFF', "Off", "Always generate with the LLM"),
+            ('AUTO', "Auto", "Use the closest dataset object when it is similar enough"),
+            ('ALWAYS', "Always", "Always use the closest dataset object, skip the LLM"),
+        ],
+        default='OFF'
+    )
+    
+    reference_source: EnumProperty(
+        name="Reference Source",
+        items=[
+            ('GLB', "Mesh", "Import the pre-built GLB from docs/meshes"),
+            ('CODE', "Script", "Run the dataset script"),
+        ],
+        default='GLB'
+    )
+    
+    reference_threshold: FloatProperty(
+        name="Reference Threshold",
+        description="Minimum similarity of the closest dataset object to skip the LLM",
+        default=0.9,
+        min=0.0,
+        max=1.0
+    )
+    
+    idle_unload_minutes: IntProperty(
+        name="Idle Unload (min)",
+        description="Release the embedding model after this many minutes without queries, 0 keeps it loaded",
+        default=config.IDLE_UNLOAD_MINUTES,
+        min=0,
+        max=240
+    )
+
+    idle_unload_store: BoolProperty(
+        name="Also Unload Vector Store",
+        description="Close the vector store too when idle, the next query reopens and re-syncs it",
+        default=False
+    )
+
+    memory_budget_mb: IntProperty(
+        name="Memory Budget (MB)",
+        description="Release components shortly after use while their resident size exceeds this, 0 disables",
+        default=config.MEMORY_BUDGET_MB,
+        min=0
+    )
+
+    edit_mode: BoolProperty(
+        name="Edit Mode",
+        description="Follow-up prompts patch the script of the selected (or last) generated object and re-run it",
+        default=False
+    )
+
+    last_script_ref: StringProperty(
+        name="Last Script",
+        description="Stored script of the last generation, the edit mode fallback target",
+        default="",
+        options={'HIDDEN'}
+    )
+
+    scene_mode: BoolProperty(
+        name="Scene Mode",
+        description="Split prompts listing several objects and generate each object concurrently",
+        default=False
+    )
+
+    stream_execution: BoolProperty(
+        name="Build While Streaming",
+        description="Run each complete statement as the LLM streams it, rolled back if a later one fails",
+        default=False
+    )
+
+    cost_guard: EnumProperty(
+        name="Cost Guard",
+        description="Static estimate of objects and faces before a generated script runs",
+        items=[
+            ('OFF', "Off", "Run scripts unchecked"),
+            ('CLAMP', "Clamp", "Lower subdivision levels and primitive resolution, block if still over the limits"),
+            ('BLOCK', "Block", "Refuse scripts over the limits"),
+        ],
+        default=config.COST_GUARD_MODE
+    )
+
+    use_asset_cache: BoolProperty(
+        name="Asset Cache",
+        description="Reuse objects built by an identical script instead of running it again",
+        default=False
+    )
+    
+    # Self-growing index
+    save_generations: BoolProperty(
+        name="Save Generations",
+        description="Add successful generations to a user collection used by retrieval",
+        default=False
+    )
+    
+    duplicate_threshold: FloatProperty(
+        name="Duplicate Threshold",
+        description="Generations at least this similar to an indexed object are not saved",
+        default=0.95,
+        min=0.0,
+        max=1.0
+    )
+    
     # Chat
     prompt: StringProperty(
         name="Prompt",
-        default=""
+        default="",
+        # fire on every keystroke, not only when the field is confirmed
+        options={'TEXTEDIT_UPDATE'},
+        update=schedule_speculative_retrieval
+    )
+
+    speculative_retrieval: BoolProperty(
+        name="Speculative Retrieval",
+        description="Search the vector database as soon as the prompt is edited, Generate then reuses the results",
+        default=True
     )
     
-    history: StringProperty(
+    history: CollectionProperty(
         name="History",
-        default=""
+        type=RAGHistoryEntry
     )
     
     status: StringProperty(
@@ -1,11 +1,28 @@
+import gc
 import json
+import re
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque, OrderedDict
 from pathlib import Path
 from typing import Optional, List, Tuple
 
 # dependency checking
 try:
+    import numpy as np
+    import torch
     from sentence_transformers import SentenceTransformer
     from .vector_store import VectorStore
+    from .vector_snapshot import VectorSnapshot
+    from .model_store import has_vendored_model, verify as verify_model, disable_hub
+    from .code_store import CodeStore
+    from .lexical import BM25Index, reciprocal_rank_fusion
+    from .ingest import IngestPipeline, parallel_read
+    from .dataset_source import content_hash, read_file_entry, iter_parquet_dataset, entry_paths, file_stamp
+    from .locks import RWLock
+    from datapizza.type import Chunk
     from datapizza.core.vectorstore import Distance
     DEPENDENCIES_OK = True
     DEPENDENCY_ERROR = None
@@ -16,6 +33,87 @@ try:
     from . import config
 except ImportError:
     config = None
+# only used to report the process footprint
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+
+def _free_torch_memory():
+    # drop the python references first so the allocator caches actually hold free blocks
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    if getattr(torch.backends, 'mps', None) is not None and torch.backends.mps.is_available():
+        torch.mps.empty_cache()
+
+def _build_category_aliases():
+    # phrase -> (subcategory, category), e.g. "street lamp" -> ("outdoor", "street_lamp")
+    aliases = {}
+    if config is None:
+        return aliases
+    
+    for subcategory, categories in config.CATEGORIES.items():
+        for category in categories:
+            words = category.split('_')
+            phrases = {' '.join(words), ' '.join(reversed(words))}
+            for phrase in list(phrases):
+                phrases.add(phrase + 's')
+                phrases.add(phrase + 'es')
+            for phrase in phrases:
+                aliases[phrase] = (subcategory, category)
+    
+    # common names that differ from the folder names
+    extra = {
+        "coffee table": ("indoor", "living_room_table"),
+        "daisy": ("outdoor", "flower_margherita"),
+        "flower": ("outdoor", "flower_margherita"),
+        "statue": ("outdoor", "humanoid_statue"),
+        "stop sign": ("outdoor", "stop_signal"),
+        "traffic light": ("outdoor", "stoplight"),
+        "parasol": ("outdoor", "sea_umbrella"),
+        "beach umbrella": ("outdoor", "sea_umbrella"),
+        "skyscraper": ("outdoor", "skyscrapers"),
+        "mountain": ("outdoor", "mountains"),
+        # compounds where the last noun is not the object
+        "bed frame": ("indoor", "bed"),
+        "door frame": ("indoor", "door"),
+        "window frame": ("indoor", "window"),
+        "picture frame": ("indoor", "frame"),
+        "trash bin": ("indoor", "trash_can"),
+        "garbage bin": ("indoor", "trash_can"),
+        "flower pot": ("indoor", "pot"),
+        "plant pot": ("indoor", "pot"),
+    }
+    aliases.update(extra)
+    return aliases
+
+_CATEGORY_ALIASES = _build_category_aliases()
+
+# words that end the head noun phrase, "a lamp on a table" is about the lamp
+_HEAD_END = re.compile(r" (?:with|on|in|at|next|near|beside|under|behind|above|for|made|containing|featuring) ")
+
+def detect_category(prompt: str) -> Tuple[Optional[str], Optional[str]]:
+    """Keyword match of the prompt against the known category names"""
+    text = ' ' + ' '.join(re.findall(r"[a-z]+", prompt.lower())) + ' '
+    head = _HEAD_END.split(text, maxsplit=1)[0] + ' '
+    
+    for scope in (head, text):
+        # longest phrase wins, so "office lamp" beats "lamp", then the one ending
+        # last, english puts the noun after its modifiers: "a glass table" is a table
+        best = None
+        for phrase, target in _CATEGORY_ALIASES.items():
+            end = scope.rfind(f" {phrase} ")
+            if end < 0:
+                continue
+            rank = (len(phrase), end + len(phrase))
+            if best is None or rank > best[0]:
+                best = (rank, target)
+        if best is not None:
+            return best[1]
+    return None, None
 
 class RAGManager:
     # class manager for rag pipeline
@@ -23,13 +121,47 @@ class RAGManager:
     def __init__(self):
         self.embedder = None
         self.vector_store = None
+        self.code_store = None
+        self.lexical_index = None
+        self.user_collection_ready = False
         self.error_message = None
+        self.query_count = 0
+        self.lexical_count = 0
+        self.query_latencies = deque(maxlen=config.QUERY_STATS_WINDOW if config else 1000)
+        self.mmr_requests = 0
+        self.mmr_tokens_with = 0
+        self.mmr_tokens_without = 0
+        self.idle_unloads = 0
+        self.reload_seconds = deque(maxlen=50)
+        self.embedder_bytes = 0
+        self.store_bytes = 0
+        # bumped on every write, speculative results from older data are not reused
+        self.data_version = 0
+        
+        # one-time init, readers share the store, ingestion and unload are exclusive
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._rw_lock = RWLock() if DEPENDENCIES_OK else None
+        self._stats_lock = threading.Lock()
+        self._embedding_cache = OrderedDict()
+        self._executor = None
+        self._pending = threading.BoundedSemaphore(config.QUERY_MAX_PENDING if config else 64)
+        self._embedder_lock = threading.Lock()
+        self._last_used = time.monotonic()
+        self._released = False
     
     def _ensure_initialized(self):
         """Initialize on first use if not already done"""
-        if self.embedder is not None and self.vector_store is not None:
+        if self._initialized:
             return True
         
+        with self._init_lock:
+            # another thread may have finished while we waited
+            if self._initialized:
+                return True
+            return self._initialize()
+    
+    def _initialize(self):
         if not DEPENDENCIES_OK:
             self.error_message = f"Missing dependencies: {DEPENDENCY_ERROR}"
             return False
@@ -38,12 +170,11 @@ class RAGManager:
             self.error_message = "Config not available"
             return False
         
+        start = time.perf_counter()
+        reloading, self._released = self._released, False
         try:
             # embedding model
-            self.embedder = SentenceTransformer(
-                model_name_or_path=config.EMBEDDING_MODEL_NAME,
-                trust_remote_code=True,
-            )
+            self._get_embedder()
             
             # vector store
             self.vector_store = VectorStore(
@@ -51,11 +182,42 @@ class RAGManager:
                 vector_store_directiory=str(config.VECTORSTORE_DIR),
                 embedding_backup_directory=str(config.EMBEDDINGS_BACKUP_DIR)
             )
+            self.code_store = CodeStore(config.CODE_STORE_PATH)
             
+            store_start = time.perf_counter()
+            from_snapshot = self._open_snapshot()
             # check if collection exists, create if needed
-            if not self._collection_exists():
+            if from_snapshot:
+                pass
+            elif not self._collection_exists():
                 self._create_collection()
+            else:
+                # collections built before payload indexing existed
+                self.vector_store.create_payload_indexes(
+                    config.COLLECTION_NAME, config.PAYLOAD_INDEX_FIELDS
+                )
+                try:
+                    self._sync_collection()
+                except Exception as e:
+                    # a broken dataset should not block the existing collection
+                    print(f"Dataset sync skipped: {e}")
+                if self.lexical_index is None:
+                    self._load_lexical_index()
+            if not from_snapshot and config.USE_VECTOR_SNAPSHOT:
+                self._write_snapshot()
+            
+            self.user_collection_ready = self.vector_store.has_collection(config.USER_COLLECTION_NAME)
+            if from_snapshot and self.user_collection_ready:
+                # saved generations still live in qdrant, open it while the user types
+                self.vector_store.open_in_background()
+            self._refresh_store_bytes()
+            source = "snapshot" if from_snapshot else "qdrant"
+            print(f"Vector store ready from {source} in {(time.perf_counter() - store_start) * 1000:.1f} ms")
 
+            self._initialized = True
+            self._last_used = time.monotonic()
+            if reloading:
+                self.reload_seconds.append(time.perf_counter() - start)
             return True
         except Exception as e:
             self.error_message = f"Initialization failed: {str(e)}"
@@ -64,110 +226,834 @@ class RAGManager:
             traceback.print_exc()
             return False
     
-    def _collection_exists(self) -> bool:
+    def _acquire_read(self) -> bool:
+        # initialized and read-locked, re-initializes if an unload slipped in between
+        while True:
+            if not self._ensure_initialized():
+                return False
+            self._rw_lock.acquire_read()
+            if self._initialized:
+                self._last_used = time.monotonic()
+                return True
+            self._rw_lock.release_read()
+    
+    def _get_embedder(self):
+        """Embedding model, loaded again on demand after an idle release"""
+        if self.embedder is not None:
+            return self.embedder
+        with self._embedder_lock:
+            if self.embedder is None:
+                start = time.perf_counter()
+                embedder = self._load_embedder()
+                self.embedder_bytes = sum(
+                    t.numel() * t.element_size()
+                    for t in list(embedder.parameters()) + list(embedder.buffers())
+                )
+                self.embedder = embedder
+                if self._released:
+                    self._released = False
+                    self.reload_seconds.append(time.perf_counter() - start)
+        return self.embedder
+    
+    def _load_embedder(self):
+        # the vendored copy is pinned and checked, the hub name is the online fallback
+        model_dir = config.EMBEDDING_MODEL_DIR
+        if has_vendored_model(model_dir):
+            start = time.perf_counter()
+            manifest = verify_model(model_dir, config.EMBEDDING_MODEL_REVISION, full=config.EMBEDDING_MODEL_FULL_VERIFY)
+            verify_seconds = time.perf_counter() - start
+            disable_hub()
+            embedder = SentenceTransformer(
+                model_name_or_path=str(model_dir),
+                trust_remote_code=True,
+                local_files_only=True,
+            )
+            print(
+                f"Embedder {manifest['repo_id']}@{manifest['revision'][:12]} loaded offline in "
+                f"{time.perf_counter() - start:.2f}s (verification {verify_seconds:.2f}s)"
+            )
+            return embedder
+        
+        if config.EMBEDDING_MODEL_LOCAL_ONLY:
+            raise FileNotFoundError(f"No vendored embedding model in {model_dir}, run: python model_store.py vendor")
+        return SentenceTransformer(
+            model_name_or_path=config.EMBEDDING_MODEL_NAME,
+            trust_remote_code=True,
+        )
+    
+    def _refresh_store_bytes(self):
+        # local qdrant keeps every vector in memory, snapshot pages belong to the os cache
+        names = [config.COLLECTION_NAME]
+        if self.user_collection_ready:
+            names.append(config.USER_COLLECTION_NAME)
+        names = [name for name in names if name not in self.vector_store.snapshots]
+        if not self.vector_store.client_open:
+            names = []
+        try:
+            points = sum(self.vector_store.count_points(name) for name in names)
+            self.store_bytes = points * config.EMBEDDING_DIMENSION * 4
+        except Exception as e:
+            print(f"Could not size the vector store: {e}")
+    
+    def _collection_exists(self, collection_name: Optional[str] = None) -> bool:
         """Check if collection exists"""
         try:
-            self.vector_store.get_collection_info(config.COLLECTION_NAME)
+            self.vector_store.get_collection_info(collection_name or config.COLLECTION_NAME)
             return True
         except:
             return False
     
+    def _open_snapshot(self) -> bool:
+        """Serve the dataset collection from the prebuilt snapshot when it matches the dataset"""
+        if not config.USE_VECTOR_SNAPSHOT or not config.VECTOR_SNAPSHOT_PATH.exists():
+            return False
+        try:
+            snapshot = self.vector_store.attach_snapshot(config.COLLECTION_NAME, config.VECTOR_SNAPSHOT_PATH)
+            if snapshot.dimension != config.EMBEDDING_DIMENSION:
+                raise ValueError(f"{snapshot.dimension}-dimensional vectors, the embedder gives {config.EMBEDDING_DIMENSION}")
+            if not self._dataset_unchanged(snapshot.meta.get('manifest') or {}):
+                print("Vector snapshot is out of date, opening qdrant")
+                self.vector_store.detach_snapshot(config.COLLECTION_NAME)
+                # still better than embedding everything again, the sync only redoes the changes
+                if not self._collection_exists():
+                    self.vector_store.import_snapshot(config.VECTOR_SNAPSHOT_PATH)
+                return False
+        except Exception as e:
+            print(f"Vector snapshot unusable: {e}")
+            self.vector_store.detach_snapshot(config.COLLECTION_NAME)
+            return False
+        
+        if self.lexical_index is None:
+            self._load_lexical_index()
+        return True
+    
+    def _write_snapshot(self):
+        # skipped when the existing snapshot already holds the collection as it is
+        try:
+            manifest = self.vector_store.load_manifest(config.COLLECTION_NAME)
+            if config.VECTOR_SNAPSHOT_PATH.exists():
+                snapshot = VectorSnapshot(config.VECTOR_SNAPSHOT_PATH)
+                current = manifest and snapshot.meta.get('manifest') == manifest
+                snapshot.close()
+                if current:
+                    return
+            self.vector_store.export_snapshot(config.COLLECTION_NAME, config.VECTOR_SNAPSHOT_PATH, manifest=manifest)
+        except Exception as e:
+            print(f"Vector snapshot not written: {e}")
+    
+    def _detach_snapshot(self):
+        # writes go to qdrant, a collection only shipped as a snapshot is imported first
+        if config.COLLECTION_NAME not in self.vector_store.snapshots:
+            return False
+        self.vector_store.detach_snapshot(config.COLLECTION_NAME)
+        if not self._collection_exists():
+            self.vector_store.import_snapshot(config.VECTOR_SNAPSHOT_PATH)
+        return True
+    
+    def export_snapshot(self) -> Tuple[Optional[str], Optional[str]]:
+        """Write the dataset collection to config.VECTOR_SNAPSHOT_PATH, e.g. to ship it with the add-on"""
+        if not self._ensure_initialized():
+            return None, self.error_message
+        
+        with self._rw_lock.write():
+            try:
+                attached = self._detach_snapshot()
+                self.vector_store.export_snapshot(
+                    config.COLLECTION_NAME,
+                    config.VECTOR_SNAPSHOT_PATH,
+                    manifest=self.vector_store.load_manifest(config.COLLECTION_NAME)
+                )
+                if attached:
+                    self._open_snapshot()
+                return str(config.VECTOR_SNAPSHOT_PATH), None
+            except Exception as e:
+                return None, f"Snapshot export failed: {str(e)}"
+    
+    def _ensure_user_collection(self):
+        if self.user_collection_ready:
+            return
+        self.vector_store.create_collection(
+            collection_name=config.USER_COLLECTION_NAME,
+            embedding_dimension=config.EMBEDDING_DIMENSION,
+            vector_name=config.VECTOR_NAME,
+            distance_metric=Distance.COSINE,
+            payload_index_fields=config.PAYLOAD_INDEX_FIELDS
+        )
+        self.user_collection_ready = True
+    
+    def add_generation(self, prompt: str, code: str, duplicate_threshold: float = 0.95) -> Tuple[bool, Optional[str]]:
+        """Append a successful generation to the user collection unless a near-duplicate exists"""
+        if not self._ensure_initialized():
+            return False, self.error_message
+        
+        # exclusive, so two saves of the same object cannot both pass the duplicate check
+        self._rw_lock.acquire_write()
+        try:
+            embedding = self._get_embedder().encode(
+                f"Object description: {prompt}",
+                precision='float32',
+                convert_to_tensor=True,
+            )
+            
+            collections = [config.COLLECTION_NAME]
+            if self.user_collection_ready:
+                collections.append(config.USER_COLLECTION_NAME)
+            for collection_name in collections:
+                score = self.vector_store.top_score(
+                    query_embedding=embedding,
+                    collection_name=collection_name,
+                    vector_name=config.VECTOR_NAME
+                )
+                if score is not None and score >= duplicate_threshold:
+                    print(f"Generation not saved: near-duplicate in {collection_name} ({score:.3f})")
+                    return False, None
+            
+            self._ensure_user_collection()
+            obj_id = "user_" + hashlib.sha256(f"{prompt}\0{code}".encode('utf-8')).hexdigest()[:16]
+            # user scripts stay in the payload, the code store is built once per dataset sync
+            self.vector_store.add_data(
+                collection_name=config.USER_COLLECTION_NAME,
+                vector_name=config.VECTOR_NAME,
+                embeddings=embedding,
+                metadata_list=[{
+                    "id": obj_id,
+                    'category': 'user',
+                    'subcategory': 'user',
+                    'prompt': prompt,
+                    'code': code
+                }]
+            )
+            self.store_bytes += config.EMBEDDING_DIMENSION * 4
+            self.data_version += 1
+            return True, None
+        except Exception as e:
+            return False, f"Saving generation failed: {str(e)}"
+        finally:
+            self._rw_lock.release_write()
+    
+    def _parquet_files(self) -> List[Path]:
+        if config.DATASET_SOURCE == 'json':
+            return []
+        files = sorted(config.DATASET_DIR.glob("*.parquet"))
+        if config.DATASET_SOURCE == 'parquet' and not files:
+            raise FileNotFoundError(f"No parquet files in {config.DATASET_DIR}")
+        return files
+    
+    def _load_dataset_objects(self) -> List[dict]:
+        with open(config.DATASET_JSON, 'r') as f:
+            return json.load(f)['objects']
+    
+    def _read_entry(self, obj: dict) -> Optional[Tuple[dict, str, str]]:
+        return read_file_entry(obj, config.ADDON_DIR)
+    
+    def _iter_dataset(self):
+        """Yield (metadata, description, code) for every dataset object.
+        
+        Parquet splits in the dataset folder are read column-wise in record batches,
+        otherwise the files listed in dataset.json are read on a thread pool.
+        """
+        parquet_files = self._parquet_files()
+        if parquet_files:
+            yield from iter_parquet_dataset(
+                parquet_files, config.PARQUET_COLUMNS, batch_size=config.INGEST_BATCH_SIZE
+            )
+            return
+        
+        yield from parallel_read(self._load_dataset_objects(), self._read_entry, workers=config.INGEST_READ_WORKERS)
+    
+    def _read_dataset(self) -> List[Tuple[dict, str, str]]:
+        return list(self._iter_dataset())
+    
+    def _build_lexical_index(self, entries):
+        index = BM25Index()
+        for metadata, description, _ in entries:
+            # the category name is part of the text so "a bench" hits every bench variant
+            category = metadata['category'].replace('_', ' ')
+            index.add(metadata['id'], f"{category} {description}", metadata)
+        index.save(config.LEXICAL_INDEX_PATH)
+        self.lexical_index = index
+        print(f"Lexical index built with {len(index)} descriptions")
+    
+    def _load_lexical_index(self):
+        try:
+            if config.LEXICAL_INDEX_PATH.exists():
+                self.lexical_index = BM25Index.load(config.LEXICAL_INDEX_PATH)
+            else:
+                # collection predates the lexical index, no re-embedding needed
+                self._build_lexical_index(self._read_dataset())
+        except Exception as e:
+            print(f"Lexical index unavailable: {e}")
+            self.lexical_index = None
+    
     def _create_collection(self):
         self.vector_store.create_collection(
             collection_name=config.COLLECTION_NAME,
             embedding_dimension=config.EMBEDDING_DIMENSION,
             vector_name=config.VECTOR_NAME,
-            distance_metric=Distance.COSINE
+            distance_metric=Distance.COSINE,
+            payload_index_fields=config.PAYLOAD_INDEX_FIELDS
         )
         
-        with open(config.DATASET_JSON, 'r') as f:
-            data = json.load(f)
+        # file reads stream straight into the encoder
+        entries = self._embed_and_add(self._iter_dataset())
+        self._build_side_indexes(entries)
+        self.vector_store.save_manifest(config.COLLECTION_NAME, self._build_manifest(entries))
         
-        objects = data['objects']
-        texts_to_embed = []
-        metadata_list = []
+        print(f"Database created with {len(entries)} objects")
+    
+    def _build_side_indexes(self, entries):
+        self._build_lexical_index(entries)
         
+        # scripts go to the code store, the payload only keeps ids and categories
+        self.code_store.close()
+        CodeStore.build(
+            config.CODE_STORE_PATH,
+            {metadata['id']: python_code for metadata, _, python_code in entries}
+        )
+    
+    def _encode_batch(self, batch):
+        return self._get_embedder().encode(
+            sentences=[f"Object description: {description}" for _, description, _ in batch],
+            precision='float32',
+            convert_to_tensor=True,
+            show_progress_bar=False,
+        )
+    
+    def _upsert_batch(self, batch, embeddings):
+        self.vector_store.add_data(
+            collection_name=config.COLLECTION_NAME,
+            vector_name=config.VECTOR_NAME,
+            embeddings=embeddings,
+            metadata_list=[metadata for metadata, _, _ in batch]
+        )
+    
+    def _embed_and_add(self, entries) -> List[Tuple[dict, str, str]]:
+        # upsert of one batch overlaps with encoding the next
+        pipeline = IngestPipeline(
+            encode_fn=self._encode_batch,
+            upsert_fn=self._upsert_batch,
+            batch_size=config.INGEST_BATCH_SIZE,
+            queue_batches=config.INGEST_QUEUE_BATCHES
+        )
+        processed = pipeline.run(entries)
+        print(f"Ingestion: {pipeline.report()}")
+        return processed
+    
+    def _build_manifest(self, entries) -> dict:
+        return {
+            metadata['id']: content_hash(metadata['category'], metadata['subcategory'], description, python_code)
+            for metadata, description, python_code in entries
+        }
+    
+    def _dataset_unchanged(self, previous: dict) -> bool:
+        """Whether every dataset object still hashes to its manifest entry.
+        
+        The files are only read again when their size or mtime differ from the
+        last check, edits made without regenerating dataset.json are still seen.
+        """
+        if not previous or self._parquet_files():
+            return False
+        objects = self._load_dataset_objects()
+        if {obj['id'] for obj in objects} != set(previous):
+            return False
+        
+        stamps = self.vector_store.load_file_stamps(config.COLLECTION_NAME)
+        checked = {}
         for obj in objects:
+            expected = previous[obj['id']]
+            # dataset.json hashes can only prove a change, not the absence of one
+            if obj.get('content_hash', expected) != expected:
+                return False
+            try:
+                stamp = file_stamp(entry_paths(obj, config.ADDON_DIR)) + [expected]
+            except OSError:
+                return False
+            if stamps.get(obj['id']) != stamp:
+                entry = self._read_entry(obj)
+                if entry is None:
+                    return False
+                metadata, description, python_code = entry
+                if content_hash(metadata['category'], metadata['subcategory'], description, python_code) != expected:
+                    return False
+            checked[obj['id']] = stamp
+        
+        if checked != stamps:
+            try:
+                self.vector_store.save_file_stamps(config.COLLECTION_NAME, checked)
+            except OSError as e:
+                print(f"Could not save dataset file stamps: {e}")
+        return True
+    
+    def _sync_collection(self) -> dict:
+        """Re-embed only the objects whose content hash changed since the last sync"""
+        previous = self.vector_store.load_manifest(config.COLLECTION_NAME) or {}
+        if self._dataset_unchanged(previous):
+            stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": len(previous)}
+            print(f"Dataset sync: {stats}")
+            return stats
+        
+        entries = self._read_dataset()
+        manifest = self._build_manifest(entries)
+        
+        changed = [entry for entry in entries if previous.get(entry[0]['id']) != manifest[entry[0]['id']]]
+        removed = [obj_id for obj_id in previous if obj_id not in manifest]
+        stats = {
+            "added": sum(1 for metadata, _, _ in changed if metadata['id'] not in previous),
+            "updated": sum(1 for metadata, _, _ in changed if metadata['id'] in previous),
+            "removed": len(removed),
+            "unchanged": len(entries) - len(changed),
+        }
+        
+        if changed or removed:
+            # also clears points left by collections built without a manifest
+            self.vector_store.delete_data(
+                collection_name=config.COLLECTION_NAME,
+                object_ids=removed + [metadata['id'] for metadata, _, _ in changed]
+            )
+            self._embed_and_add(changed)
+            self._build_side_indexes(entries)
+            self.vector_store.save_manifest(config.COLLECTION_NAME, manifest)
+        
+        print(f"Dataset sync: {stats}")
+        return stats
+    
+    def sync_dataset(self) -> Tuple[Optional[dict], Optional[str]]:
+        """Diff dataset.json against the manifest and apply the changes on demand"""
+        if not self._ensure_initialized():
+            return None, self.error_message
+        
+        with self._rw_lock.write():
             try:
-                # Read description
-                desc_path = Path(obj['description_file'])
-                if not desc_path.is_absolute():
-                    desc_path = config.ADDON_DIR / desc_path
-                with open(desc_path, 'r') as f:
-                    description = f.read().strip()
-                
-                # Read code
-                code_path = Path(obj['code_file'])
-                if not code_path.is_absolute():
-                    code_path = config.ADDON_DIR / code_path
-                with open(code_path, 'r') as f:
-                    python_code = f.read().strip()
-                
-                texts_to_embed.append(f"Object description: {description}")
-                metadata_list.append({
-                    "id": obj['id'],
-                    'category': obj['category'],
-                    'subcategory': obj['subcategory'],
-                    'code': python_code
-                })
+                attached = self._detach_snapshot()
+                stats = self._sync_collection()
+                if attached:
+                    if stats['added'] or stats['updated'] or stats['removed']:
+                        self._write_snapshot()
+                    self._open_snapshot()
+                self._refresh_store_bytes()
+                self.data_version += 1
+                return stats, None
             except Exception as e:
-                print(f"Error processing {obj['id']}: {e}")
+                return None, f"Sync failed: {str(e)}"
+    
+    def query(
+        self,
+        prompt: str,
+        k: int = 5,
+        subcategory: Optional[str] = None,
+        category: Optional[str] = None,
+        auto_detect: bool = False,
+        use_lexical: bool = True,
+        lexical_confidence: float = 1.0,
+        mmr_diversity: float = 0.0
+    ) -> Tuple[Optional[List], Optional[str]]:
+        if not self._acquire_read():
+            return None, self.error_message
         
-        # Embed and add in batches
-        batch_size = 128
-        for i in range(0, len(texts_to_embed), batch_size):
-            batch_texts = texts_to_embed[i:i+batch_size]
-            batch_metadata = metadata_list[i:i+batch_size]
+        try:
+            start = time.perf_counter()
             
-            embeddings = self.embedder.encode(
-                sentences=batch_texts,
-                precision='float32',
-                convert_to_tensor=True,
-                show_progress_bar=True,
+            # explicit filters win over the keyword detector
+            detected = False
+            if category is None and auto_detect:
+                detected_sub, detected_cat = detect_category(prompt)
+                if detected_cat and (subcategory is None or subcategory == detected_sub):
+                    subcategory, category = detected_sub, detected_cat
+                    detected = True
+
+            metadata_filter = {"subcategory": subcategory, "category": category}
+            
+            # mmr needs a wider candidate set to pick diverse objects from
+            use_mmr = mmr_diversity > 0
+            candidate_k = config.MMR_FETCH_FACTOR * k if use_mmr else k
+            
+            # lexical first stage, answers alone when the best hit covers the whole prompt
+            lexical_hits = []
+            if use_lexical and self.lexical_index is not None:
+                lexical_hits, coverage = self.lexical_index.search(
+                    prompt, k=2 * candidate_k, metadata_filter=metadata_filter
+                )
+                if coverage >= lexical_confidence and len(lexical_hits) >= k:
+                    candidates = self._fuse([], lexical_hits[:candidate_k], candidate_k)
+                    results = self._select(candidates, k, mmr_diversity)
+                    self._record_query(start, lexical=True)
+                    return results, None
+
+            # Embed query
+            query_embedding = self._encode_query(prompt)
+            
+            # Search, over-fetched when it gets fused with the lexical ranking
+            fetch_k = 2 * candidate_k if lexical_hits else candidate_k
+            results = self.vector_store.search(
+                collection_name=config.COLLECTION_NAME,
+                query_embedding=query_embedding,
+                k=fetch_k,
+                metadata_filter=metadata_filter
             )
+
+            # a wrong guess from the detector should not leave the llm without context
+            if not results and detected:
+                results = self.vector_store.search(
+                    collection_name=config.COLLECTION_NAME,
+                    query_embedding=query_embedding,
+                    k=fetch_k
+                )
             
-            self.vector_store.add_data(
+            # saved generations only compete when they are actually close to the prompt
+            user_results = []
+            if self.user_collection_ready and category is None:
+                user_results = self.vector_store.search(
+                    collection_name=config.USER_COLLECTION_NAME,
+                    query_embedding=query_embedding,
+                    k=fetch_k,
+                    score_threshold=config.USER_MIN_SCORE
+                )
+            
+            candidates = self._fuse([results, user_results], lexical_hits, candidate_k)
+            results = self._select(candidates, k, mmr_diversity)
+            
+            self._record_query(start, lexical=False)
+            return results, None
+            
+        except Exception as e:
+            return None, f"Query failed: {str(e)}"
+        finally:
+            self._rw_lock.release_read()
+    
+    def _encode_query(self, prompt: str):
+        # small lru so the reference check and the retrieval share one encode
+        with self._stats_lock:
+            if prompt in self._embedding_cache:
+                self._embedding_cache.move_to_end(prompt)
+                return self._embedding_cache[prompt]
+        
+        embedding = self._get_embedder().encode(
+            prompt,
+            precision='float32',
+            convert_to_tensor=True,
+        )
+        
+        with self._stats_lock:
+            self._embedding_cache[prompt] = embedding
+            while len(self._embedding_cache) > config.QUERY_EMBEDDING_CACHE_SIZE:
+                self._embedding_cache.popitem(last=False)
+        return embedding
+    
+    def match_reference(
+        self,
+        prompt: str,
+        subcategory: Optional[str] = None,
+        category: Optional[str] = None
+    ) -> Tuple[Optional[Tuple[dict, float]], Optional[str]]:
+        """Closest dataset object and its cosine similarity to the prompt"""
+        if not self._acquire_read():
+            return None, self.error_message
+        
+        try:
+            hits = self.vector_store.nearest(
+                query_embedding=self._encode_query(prompt),
                 collection_name=config.COLLECTION_NAME,
                 vector_name=config.VECTOR_NAME,
-                embeddings=embeddings,
-                metadata_list=batch_metadata
+                k=1,
+                metadata_filter={"subcategory": subcategory, "category": category}
             )
-        
-        print(f"Database created with {len(texts_to_embed)} objects")
+            return (hits[0] if hits else None), None
+        except Exception as e:
+            return None, f"Reference match failed: {str(e)}"
+        finally:
+            self._rw_lock.release_read()
     
-    def query(self, prompt: str, k: int = 5) -> Tuple[Optional[List], Optional[str]]:
-        if not self._ensure_initialized():
+    def get_code_by_id(self, obj_id: str) -> Optional[str]:
+        if self.code_store is None or not self.code_store.exists():
+            return None
+        return self.code_store.get(obj_id)
+    
+    def query_batch(
+        self,
+        prompts: List[str],
+        k: int = 5,
+        subcategory: Optional[str] = None,
+        category: Optional[str] = None
+    ) -> Tuple[Optional[List[List]], Optional[str]]:
+        """Retrieve for many prompts with one encoder pass and one batched search.
+
+        Dense-only: the dataset collection is searched with the given filters,
+        without category detection, the lexical stage, the user collection or
+        mmr, and results come back without scores. Use query() or
+        submit_query() per prompt for the full ranking.
+        """
+        if not prompts:
+            return [], None
+        if not self._acquire_read():
             return None, self.error_message
         
         try:
-            # Embed query
-            query_embedding = self.embedder.encode(
-                prompt,
+            start = time.perf_counter()
+            
+            query_embeddings = self._get_embedder().encode(
+                sentences=list(prompts),
                 precision='float32',
                 convert_to_tensor=True,
+                batch_size=max(len(prompts), 1),
             )
             
-            # Search
-            results = self.vector_store.search(
+            results = self.vector_store.search_batch(
+                query_embeddings=query_embeddings,
                 collection_name=config.COLLECTION_NAME,
-                query_embedding=query_embedding,
-                k=k
+                vector_name=config.VECTOR_NAME,
+                k=k,
+                metadata_filter={"subcategory": subcategory, "category": category}
             )
             
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"Batch query: {len(prompts)} prompts in {elapsed_ms:.2f} ms")
             return results, None
-            
         except Exception as e:
-            return None, f"Query failed: {str(e)}"
+            return None, f"Batch query failed: {str(e)}"
+        finally:
+            self._rw_lock.release_read()
     
-    def unload(self):
-        if self.vector_store:
-            self.vector_store.close()
+    def submit_query(self, prompt: str, **kwargs) -> Future:
+        """Run query() on the bounded worker pool, blocks while too many queries are pending"""
+        self._pending.acquire()
+        try:
+            with self._init_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=config.QUERY_WORKERS, thread_name_prefix="rag-query"
+                    )
+                future = self._executor.submit(self.query, prompt, **kwargs)
+        except Exception:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+    
+    def _lexical_result(self, doc_id: str):
+        # same shape as a dense hit, the operator only reads metadata
+        return Chunk(id=doc_id, text="", metadata=dict(self.lexical_index.metadata[doc_id]))
+    
+    def _fuse(self, dense_lists, lexical_hits, k: int) -> List[Tuple[object, float]]:
+        # (result, fused score) in rank order, a single ranking keeps its order
+        dense_by_id = {}
+        rankings = []
+        for dense_results in dense_lists:
+            if not dense_results:
+                continue
+            rankings.append([result.metadata['id'] for result in dense_results])
+            for result in dense_results:
+                dense_by_id.setdefault(result.metadata['id'], result)
+        if lexical_hits:
+            rankings.append([doc_id for doc_id, _ in lexical_hits])
+        fused = reciprocal_rank_fusion(rankings, k=config.RRF_K)
+        
+        results = []
+        for doc_id, score in fused[:k]:
+            if doc_id in dense_by_id:
+                results.append((dense_by_id[doc_id], score))
+            else:
+                results.append((self._lexical_result(doc_id), score))
+        return results
+    
+    def _select(self, candidates, k: int, mmr_diversity: float) -> List:
+        top = [result for result, _ in candidates[:k]]
+        if mmr_diversity <= 0 or len(candidates) <= k:
+            return top
+        
+        results = self._mmr(candidates, k, mmr_diversity)
+        self._record_context_tokens(with_mmr=results, without_mmr=top)
+        return results
+    
+    def _mmr(self, candidates, k: int, diversity: float) -> List:
+        """Maximal marginal relevance: trade rank relevance against similarity to already picked objects"""
+        ids = [result.metadata['id'] for result, _ in candidates]
+        vectors = self.vector_store.get_vectors(
+            collection_names=[config.COLLECTION_NAME, config.USER_COLLECTION_NAME] if self.user_collection_ready else [config.COLLECTION_NAME],
+            vector_name=config.VECTOR_NAME,
+            object_ids=ids
+        )
+        
+        # missing vectors (points from very old collections) never count as redundant
+        matrix = np.zeros((len(ids), config.EMBEDDING_DIMENSION), dtype=np.float32)
+        for i, obj_id in enumerate(ids):
+            if obj_id in vectors:
+                vector = np.asarray(vectors[obj_id], dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                if norm > 0:
+                    matrix[i] = vector / norm
+        similarity = matrix @ matrix.T
+        
+        scores = np.array([score for _, score in candidates], dtype=np.float32)
+        spread = scores.max() - scores.min()
+        relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+        
+        selected = [0]
+        remaining = list(range(1, len(ids)))
+        duplicates = []
+        while remaining and len(selected) < k:
+            redundancy = similarity[remaining][:, selected].max(axis=1)
+            # near-identical variants are set aside, they only cost prompt tokens
+            keep = redundancy < config.MMR_DUPLICATE_SIMILARITY
+            duplicates.extend(i for i, kept in zip(remaining, keep) if not kept)
+            remaining = [i for i, kept in zip(remaining, keep) if kept]
+            if not remaining:
+                break
+            redundancy = redundancy[keep]
+            mmr_scores = (1 - diversity) * relevance[remaining] - diversity * redundancy
+            best = remaining[int(np.argmax(mmr_scores))]
+            selected.append(best)
+            remaining.remove(best)
+        
+        # still k results when the pool ran out of distinct objects, best ranked duplicates first
+        selected.extend(sorted(duplicates)[:k - len(selected)])
+        return [candidates[i][0] for i in selected]
+    
+    def _context_tokens(self, results) -> int:
+        # rough chars/4 estimate of the exemplar block sent to the llm
+        chars = 0
+        for result in results:
+            code = self.get_code(result) or ""
+            chars += len(f"Object: {result.metadata['id']} \n Code: \n{code}") + 2
+        return chars // 4
+    
+    def _record_context_tokens(self, with_mmr, without_mmr):
+        tokens_with = self._context_tokens(with_mmr)
+        tokens_without = self._context_tokens(without_mmr)
+        with self._stats_lock:
+            self.mmr_requests += 1
+            self.mmr_tokens_with += tokens_with
+            self.mmr_tokens_without += tokens_without
+        print(f"Context tokens: {tokens_with} with MMR, {tokens_without} without")
+    
+    def _record_query(self, start: float, lexical: bool):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self.query_count += 1
+            if lexical:
+                self.lexical_count += 1
+            self.query_latencies.append(elapsed_ms)
+        path = "lexical" if lexical else "hybrid"
+        print(f"Query served by {path} stage in {elapsed_ms:.2f} ms")
+    
+    def get_query_stats(self) -> dict:
+        """Fraction of queries served without the embedder and latency percentiles (ms)"""
+        with self._stats_lock:
+            latencies = sorted(self.query_latencies)
+        
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+        
+        return {
+            "queries": self.query_count,
+            "lexical_fraction": self.lexical_count / self.query_count if self.query_count else 0.0,
+            "p50_ms": percentile(0.50),
+            "p90_ms": percentile(0.90),
+            "p99_ms": percentile(0.99),
+            "mmr_requests": self.mmr_requests,
+            "mmr_tokens_with": self.mmr_tokens_with / self.mmr_requests if self.mmr_requests else 0.0,
+            "mmr_tokens_without": self.mmr_tokens_without / self.mmr_requests if self.mmr_requests else 0.0,
+        }
+    
+    def get_code(self, result) -> Optional[str]:
+        """Script for a search result, read lazily from the code store"""
+        # collections built before the code store kept the script in the payload
+        if 'code' in result.metadata:
+            return result.metadata['code']
+        return self.get_code_by_id(result.metadata['id'])
+
+    def _release(self, store: bool):
+        # caller holds the init lock and the write lock
         self.embedder = None
-        self.vector_store = None
+        self._embedding_cache.clear()
+        if store:
+            self._initialized = False
+            if self.vector_store:
+                self.vector_store.close()
+            if self.code_store:
+                self.code_store.close()
+            self.vector_store = None
+            self.code_store = None
+            self.lexical_index = None
+            self.user_collection_ready = False
+        _free_torch_memory()
+
+    def release_if_idle(self, ttl_minutes: int, unload_store: bool = False, budget_mb: int = 0) -> bool:
+        """Free the embedder, and the store when asked or over budget, once queries stop.
+
+        Over the memory budget the short grace period replaces the ttl. Never
+        blocks: if a query or an ingestion is running it simply tries again later.
+        """
+        if self.embedder is None or self._rw_lock is None:
+            return False
+        
+        idle = time.monotonic() - self._last_used
+        budget = budget_mb * MB
+        over_budget = budget > 0 and self.embedder_bytes + self.store_bytes > budget
+        if over_budget:
+            if idle < config.IDLE_BUDGET_GRACE_SECONDS:
+                return False
+        elif ttl_minutes <= 0 or idle < ttl_minutes * 60:
+            return False
+        
+        if not self._init_lock.acquire(blocking=False):
+            return False
+        try:
+            if not self._rw_lock.try_acquire_write():
+                return False
+            try:
+                release_store = unload_store or (budget > 0 and self.store_bytes > budget)
+                freed = self.embedder_bytes + (self.store_bytes if release_store else 0)
+                self._release(store=release_store)
+                self._released = True
+                self.idle_unloads += 1
+            finally:
+                self._rw_lock.release_write()
+        finally:
+            self._init_lock.release()
+        
+        what = "embedder and vector store" if release_store else "embedder"
+        print(f"Idle for {idle / 60:.1f} min, released the {what} (~{freed / MB:.0f} MB)")
+        return True
+
+    def get_memory_stats(self) -> dict:
+        """Resident size of the loaded components (MB) and reload latency after idle releases"""
+        embedder_loaded = self.embedder is not None
+        store_loaded = self._initialized
+        rss = psutil.Process().memory_info().rss / MB if psutil is not None else None
+        return {
+            "embedder_loaded": embedder_loaded,
+            "store_loaded": store_loaded,
+            "embedder_mb": self.embedder_bytes / MB if embedder_loaded else 0.0,
+            "store_mb": self.store_bytes / MB if store_loaded else 0.0,
+            "process_rss_mb": rss,
+            "idle_seconds": time.monotonic() - self._last_used,
+            "idle_unloads": self.idle_unloads,
+            "reloads": len(self.reload_seconds),
+            "last_reload_seconds": self.reload_seconds[-1] if self.reload_seconds else 0.0,
+            "avg_reload_seconds": sum(self.reload_seconds) / len(self.reload_seconds) if self.reload_seconds else 0.0,
+        }
+
+    def unload(self):
+        with self._init_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        
+        if self._rw_lock is None:
+            return
+        
+        # waits for in-flight queries, new ones re-initialize afterwards
+        with self._init_lock, self._rw_lock.write():
+            self._release(store=True)
 
 _rag_instance = None # singleton instance
+_rag_instance_lock = threading.Lock()
 def get_rag_manager() -> RAGManager:
     global _rag_instance
     if _rag_instance is None:
-        _rag_instance = RAGManager()
+        with _rag_instance_lock:
+            if _rag_instance is None:
+                _rag_instance = RAGManager()
     return _rag_instance
\ No newline at end of file
@@ -0,0 +1,243 @@
+import math
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import bpy
+from mathutils import Vector
+
+from . import config
+from .rag import detect_category
+from .stream_exec import DataSnapshot
+from .utils import parse_code, execute_code, store_history_content, tag_script_objects, script_objects
+
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "single": 1,
+    "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    "a pair of": 2, "pair of": 2, "a couple of": 2, "couple of": 2,
+}
+_COUNT = re.compile(
+    r"^(" + "|".join(sorted((re.escape(w) for w in _NUMBER_WORDS), key=len, reverse=True)) + r"|\d+)\s+",
+    re.IGNORECASE
+)
+_SETTING = re.compile(r"^(.*?)\s+(?:with|containing|featuring|including)\s+(.*)$", re.IGNORECASE)
+_SEPARATORS = re.compile(r"\s*(?:,|;|\band\b|\bplus\b)\s*", re.IGNORECASE)
+
+def _singular(word: str) -> str:
+    lower = word.lower()
+    if lower.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if lower.endswith(("ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if lower.endswith("s") and not lower.endswith("ss"):
+        return word[:-1]
+    return word
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")[:24] or "object"
+
+def split_scene_prompt(prompt: str) -> Tuple[Optional[str], List[dict]]:
+    """Setting and object sub-requests of a scene prompt.
+
+    "a living room with a sofa, two lamps and a rug" gives the setting
+    "a living room" and sofa x1, lamp x2, rug x1. A prompt describing a
+    single object comes back as one part.
+    """
+    text = prompt.strip().rstrip(".")
+    setting = None
+    match = _SETTING.match(text)
+    # "a sofa with cushions" describes one object, not a setting
+    if match and detect_category(match.group(1))[1] is None:
+        setting, text = match.group(1).strip(), match.group(2)
+
+    pieces = [piece for piece in _SEPARATORS.split(text) if piece]
+    # "a black and white rug": a piece without an object of its own continues
+    # into the next one unless that one starts with its own count
+    merged = []
+    for piece in pieces:
+        if merged and not _COUNT.match(piece) and detect_category(merged[-1])[1] is None:
+            merged[-1] = f"{merged[-1]} and {piece}"
+        else:
+            merged.append(piece)
+
+    parts = []
+    for piece in merged:
+        count = 1
+        match = _COUNT.match(piece)
+        if match:
+            word = match.group(1).lower()
+            count = int(word) if word.isdigit() else _NUMBER_WORDS[word]
+            piece = piece[match.end():]
+        count = max(1, min(count, config.SCENE_MAX_INSTANCES))
+        if count > 1:
+            # singular head noun, the script builds one instance
+            head, _, rest = piece.partition(" with ")
+            words = head.split()
+            words[-1] = _singular(words[-1])
+            piece = " ".join(words) + (f" with {rest}" if rest else "")
+        parts.append({"description": piece, "count": count, "name": _slug(piece)})
+    return setting, parts[:config.SCENE_MAX_OBJECTS]
+
+def generate_objects(llm, rag, parts: List[dict], setting: Optional[str], settings: dict) -> Tuple[Optional[dict], Optional[str]]:
+    """One retrieval and one llm call per part, all parts concurrently.
+
+    Each part goes through the same query() ranking as a single prompt, with
+    its own category detected unless the panel filter is set. Fills
+    code/error/seconds/output_tokens into each part, wall time is bounded by
+    the slowest object rather than the sum.
+    """
+    start = time.perf_counter()
+    # a part names one object, its category is usually clear even when the scene's is not
+    settings = dict(settings, auto_detect=True)
+    retrievals = [rag.submit_query(part["description"], **settings) for part in parts]
+
+    def generate(part, retrieval):
+        hits, error = retrieval.result()
+        part["retrieval_seconds"] = time.perf_counter() - start
+        if error:
+            part.update(code=None, error=error, seconds=0.0, output_tokens=0, retrieval_failed=True)
+            return
+        part_start = time.perf_counter()
+        context = []
+        for hit in hits:
+            code = rag.get_code(hit)
+            if code is not None:
+                context.append({'obj_id': hit.metadata['id'], 'code': code})
+        request = part["description"]
+        if setting:
+            request = f"{request}, as part of {setting}. Model only this object, centered at the origin"
+        response, error = llm.generate(prompt=request, context=context)
+        # per thread, read back on the thread that made the call
+        output_tokens = llm.last_output_tokens() if not error else 0
+        code = None
+        if not error:
+            code, error = parse_code(response)
+        part.update(code=code, error=error, seconds=time.perf_counter() - part_start, output_tokens=output_tokens)
+
+    with ThreadPoolExecutor(max_workers=min(len(parts), config.SCENE_MAX_WORKERS), thread_name_prefix="rag-scene") as pool:
+        for future in [pool.submit(generate, part, retrieval) for part, retrieval in zip(parts, retrievals)]:
+            future.result()
+
+    if all(part.get("retrieval_failed") for part in parts):
+        return None, parts[0]["error"]
+
+    stats = {
+        "retrieval_seconds": max(part["retrieval_seconds"] for part in parts),
+        "wall_seconds": time.perf_counter() - start,
+        "sum_seconds": sum(part["retrieval_seconds"] + part["seconds"] for part in parts),
+    }
+    return stats, None
+
+def _bounds(objects) -> Tuple[Vector, Vector]:
+    corners = [obj.matrix_world @ Vector(corner) for obj in objects for corner in obj.bound_box]
+    if not corners:
+        corners = [obj.matrix_world.translation for obj in objects]
+    low = Vector((min(c.x for c in corners), min(c.y for c in corners), min(c.z for c in corners)))
+    high = Vector((max(c.x for c in corners), max(c.y for c in corners), max(c.z for c in corners)))
+    return low, high
+
+def _roots(objects) -> List:
+    created = set(objects)
+    return [obj for obj in objects if obj.parent not in created]
+
+def _center(objects) -> Vector:
+    low, high = _bounds(objects)
+    return (low + high) / 2
+
+def _layout(instances: List[Tuple[str, List]]):
+    # grid of cells sized after the largest footprint, centered on the origin
+    bpy.context.view_layer.update()
+    bounds = [_bounds(objects) for _, objects in instances]
+    cell = max(max(high.x - low.x, high.y - low.y) for low, high in bounds) + config.SCENE_SPACING
+    columns = math.ceil(math.sqrt(len(instances)))
+    rows = math.ceil(len(instances) / columns)
+    for index, ((_, objects), (low, high)) in enumerate(zip(instances, bounds)):
+        row, column = divmod(index, columns)
+        target = Vector(((column - (columns - 1) / 2) * cell, ((rows - 1) / 2 - row) * cell, 0.0))
+        center = (low + high) / 2
+        offset = Vector((target.x - center.x, target.y - center.y, 0.0))
+        for obj in _roots(objects):
+            obj.location += offset
+
+def build_scene(parts: List[dict]) -> Tuple[List[str], List[str]]:
+    """Run each part's script once per instance, namespace the new datablocks and lay them out"""
+    instances = []
+    errors = []
+    for part in parts:
+        if part.get("error") or not part.get("code"):
+            errors.append(f"{part['name']}: {part.get('error') or 'no code'}")
+            continue
+        script_ref = store_history_content(part["code"])
+        for index in range(1, part["count"] + 1):
+            snapshot = DataSnapshot()
+            success, error = execute_code(part["code"])
+            if not success:
+                snapshot.rollback()
+                errors.append(f"{part['name']}: {error}")
+                break
+            namespace = f"{part['name']}_{index}"
+            objects = snapshot.created("objects")
+            # renamed before the next instance, so its "already exists" checks pass
+            for block in objects + snapshot.created("collections"):
+                block.name = f"{namespace}:{block.name}"
+            tag_script_objects(objects, script_ref, namespace)
+            if objects:
+                instances.append((namespace, objects))
+
+    if instances:
+        _layout(instances)
+    return [namespace for namespace, _ in instances], errors
+
+def rerun_script(old_ref: str, code: str) -> Tuple[List, Optional[str]]:
+    """Replace the objects built by an earlier script with the output of its edited version.
+
+    Every instance keeps its namespace and its place in the scene. The new
+    script runs for all instances before any old object is removed, a failure
+    in any of them rolls back every run and leaves the old objects as they were.
+    """
+    groups = script_objects(old_ref) or {"": []}
+    bpy.context.view_layer.update()
+    # out of the way of the script's "already exists" checks
+    original_names = {}
+    for old_objects in groups.values():
+        for obj in old_objects:
+            original_names[obj] = obj.name
+            obj.name = f"rag_old:{obj.name}"
+
+    # taken before the first run, rolling it back removes what every run created
+    snapshot = DataSnapshot()
+    runs = []
+    for namespace, old_objects in groups.items():
+        run = DataSnapshot()
+        success, error = execute_code(code)
+        if not success:
+            snapshot.rollback()
+            for obj, name in original_names.items():
+                obj.name = name
+            return [], error
+        objects = run.created("objects")
+        # renamed before the next instance runs, like in build_scene
+        if namespace:
+            for block in objects + run.created("collections"):
+                block.name = f"{namespace}:{block.name}"
+        runs.append((namespace, old_objects, objects))
+
+    new_ref = store_history_content(code)
+    bpy.context.view_layer.update()
+    created = []
+    for namespace, old_objects, objects in runs:
+        if old_objects and objects:
+            old_center = _center(old_objects)
+            center = _center(objects)
+            offset = Vector((old_center.x - center.x, old_center.y - center.y, 0.0))
+            for obj in _roots(objects):
+                obj.location += offset
+        tag_script_objects(objects, new_ref, namespace)
+        created.extend(objects)
+
+    removed = [obj for old_objects in groups.values() for obj in old_objects]
+    if removed:
+        bpy.data.batch_remove(ids=removed)
+    return created, None
@@ -0,0 +1,221 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional
+
+# lower runs first, interactive generations jump ahead of queued batch work
+INTERACTIVE = 0
+BATCH = 10
+
+_RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+_RETRYABLE_NAMES = ("RateLimit", "Timeout", "Overloaded", "ServiceUnavailable", "APIConnection", "ResourceExhausted")
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    for holder in (exc, getattr(exc, "response", None)):
+        for attr in ("status_code", "status", "code"):
+            value = getattr(holder, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+def is_retryable(exc: BaseException) -> bool:
+    """Rate limits and transient provider errors, also when wrapped by the client"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if _status_of(exc) in _RETRYABLE_STATUS:
+            return True
+        if any(name in type(exc).__name__ for name in _RETRYABLE_NAMES):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+def is_rate_limit(exc: BaseException) -> bool:
+    return _status_of(exc) == 429 or "RateLimit" in type(exc).__name__
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Refills continuously at rate_per_minute, holds at most one minute of budget"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until amount is available, 0 when it can be taken now"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float):
+        if self.rate > 0:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        # actual usage known after the call, may leave the bucket in debt
+        if self.rate > 0:
+            self.level = min(self.capacity, self.level - amount)
+
+class _ProviderState:
+    def __init__(self, limits: dict):
+        self.concurrency = max(1, limits.get("concurrency", 1))
+        self.requests = TokenBucket(limits.get("requests_per_minute", 0))
+        self.tokens = TokenBucket(limits.get("tokens_per_minute", 0))
+        self.cond = threading.Condition()
+        self.waiting = []
+        self.active = 0
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "failed": 0, "wait_seconds": 0.0}
+
+class LLMScheduler:
+    """Admission control in front of the provider clients.
+
+    Per provider: a concurrency cap, request and token buckets, and a priority
+    queue of waiting callers. Failed calls are retried with exponential backoff
+    and full jitter when the error looks like a rate limit or a transient fault.
+    """
+
+    def __init__(self, limits: Dict[str, dict], max_retries: int, backoff_base: float, backoff_max: float):
+        self.limits = limits
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._states = {}
+        self._states_lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def _state(self, provider: str) -> _ProviderState:
+        with self._states_lock:
+            state = self._states.get(provider)
+            if state is None:
+                state = _ProviderState(self.limits.get(provider, self.limits["DEFAULT"]))
+                self._states[provider] = state
+            return state
+
+    def _acquire(self, state: _ProviderState, tokens: int, priority: int):
+        start = time.monotonic()
+        ticket = (priority, next(self._seq))
+        with state.cond:
+            heapq.heappush(state.waiting, ticket)
+            try:
+                while True:
+                    if state.waiting[0] == ticket and state.active < state.concurrency:
+                        wait = max(state.requests.delay(1), state.tokens.delay(tokens))
+                        if wait <= 0:
+                            break
+                        state.cond.wait(wait)
+                    else:
+                        state.cond.wait()
+            except BaseException:
+                state.waiting.remove(ticket)
+                heapq.heapify(state.waiting)
+                state.cond.notify_all()
+                raise
+            heapq.heappop(state.waiting)
+            state.requests.take(1)
+            state.tokens.take(tokens)
+            state.active += 1
+            state.stats["requests"] += 1
+            state.stats["wait_seconds"] += time.monotonic() - start
+            state.cond.notify_all()
+
+    def _release(self, state: _ProviderState):
+        with state.cond:
+            state.active -= 1
+            state.cond.notify_all()
+
+    @contextmanager
+    def slot(self, provider: str, tokens: int, priority: int = INTERACTIVE):
+        state = self._state(provider)
+        self._acquire(state, tokens, priority)
+        try:
+            yield
+        finally:
+            self._release(state)
+
+    def record_usage(self, provider: str, estimated: int, actual: int):
+        """Correct the token bucket once the provider reported real usage"""
+        if actual <= 0:
+            return
+        state = self._state(provider)
+        with state.cond:
+            state.tokens.adjust(actual - estimated)
+
+    def _backoff(self, state: _ProviderState, provider: str, attempt: int, exc: BaseException) -> bool:
+        if attempt >= self.max_retries or not is_retryable(exc):
+            with state.cond:
+                state.stats["failed"] += 1
+            return False
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        delay = max(delay, retry_after(exc) or 0.0)
+        with state.cond:
+            state.stats["retries"] += 1
+            if is_rate_limit(exc):
+                state.stats["rate_limited"] += 1
+                # the provider disagrees with our budget, drain it so queued calls wait too
+                state.requests.level = min(state.requests.level, 0.0)
+        print(f"{provider}: {type(exc).__name__}, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        time.sleep(delay)
+        return True
+
+    def call(self, provider: str, fn: Callable, tokens: int, priority: int = INTERACTIVE):
+        """Run fn inside a slot, retried on rate limits and transient errors"""
+        state = self._state(provider)
+        for attempt in itertools.count():
+            try:
+                with self.slot(provider, tokens, priority):
+                    return fn()
+            except Exception as e:
+                if not self._backoff(state, provider, attempt, e):
+                    raise
+
+    def stream(self, provider: str, open_stream: Callable[[], Iterable], tokens: int, priority: int = INTERACTIVE):
+        """Yield from open_stream() while holding a slot.
+
+        Only failures before the first chunk are retried, later ones would
+        duplicate output the caller already consumed.
+        """
+        state = self._state(provider)
+        for attempt in itertools.count():
+            with self.slot(provider, tokens, priority):
+                try:
+                    iterator = iter(open_stream())
+                    first = next(iterator)
+                except StopIteration:
+                    return
+                except Exception as e:
+                    error = e
+                else:
+                    yield first
+                    yield from iterator
+                    return
+            if not self._backoff(state, provider, attempt, error):
+                raise error
+
+    def stats(self) -> Dict[str, dict]:
+        with self._states_lock:
+            states = dict(self._states)
+        result = {}
+        for provider, state in states.items():
+            with state.cond:
+                result[provider] = dict(state.stats, active=state.active, queued=len(state.waiting))
+        return result
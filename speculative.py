@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional, Tuple
+
+import bpy
+
+from . import config
+from .rag import get_rag_manager
+
+def query_settings(props) -> dict:
+    """Keyword arguments for RAGManager.query taken from the panel settings"""
+    return {
+        'k': props.top_k,
+        'subcategory': None if props.subcategory_filter == 'ALL' else props.subcategory_filter,
+        'category': None if props.category_filter in ('', 'ALL') else props.category_filter,
+        'auto_detect': props.auto_detect_category,
+        'use_lexical': props.use_lexical,
+        'lexical_confidence': props.lexical_confidence,
+        'mmr_diversity': props.mmr_diversity,
+    }
+
+class SpeculativeRetriever:
+    """Retrieval started before Generate is pressed, cached by prompt and settings.
+
+    Each prompt change cancels the work queued for older prompts, so only the
+    latest text keeps a worker busy. Finished results stay cached until the
+    data they were computed on changes.
+    """
+
+    def __init__(self, rag, max_entries: int):
+        self.rag = rag
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self._lock = threading.Lock()
+        self._futures = OrderedDict()
+
+    def _key(self, prompt: str, settings: dict) -> Tuple:
+        # writes to the collections make older results stale
+        return (prompt, self.rag.data_version, tuple(sorted(settings.items())))
+
+    def submit(self, prompt: str, settings: dict):
+        key = self._key(prompt, settings)
+        with self._lock:
+            if key in self._futures:
+                self._futures.move_to_end(key)
+                return
+            for other, future in list(self._futures.items()):
+                # a query already running finishes and stays usable
+                if future.cancel():
+                    self.cancelled += 1
+                    del self._futures[other]
+
+        future = self.rag.submit_query(prompt, **settings)
+        with self._lock:
+            self._futures[key] = future
+            while len(self._futures) > self.max_entries:
+                self._futures.popitem(last=False)
+
+    def take(self, prompt: str, settings: dict) -> Optional[Future]:
+        """Speculative future for exactly this prompt and settings, None on a miss"""
+        with self._lock:
+            future = self._futures.get(self._key(prompt, settings))
+            if future is None or future.cancelled():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "cancelled": self.cancelled,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+_retriever = None
+def get_speculative_retriever() -> SpeculativeRetriever:
+    global _retriever
+    if _retriever is None:
+        _retriever = SpeculativeRetriever(get_rag_manager(), config.SPECULATIVE_CACHE_SIZE)
+    return _retriever
+
+# debounce state, only touched from the main thread
+_last_change = 0.0
+
+def _debounced_submit():
+    remaining = config.SPECULATIVE_DEBOUNCE_SECONDS - (time.monotonic() - _last_change)
+    if remaining > 0:
+        return remaining
+
+    scene = bpy.context.scene
+    props = getattr(scene, "rag_props", None) if scene else None
+    if props is None or not props.prompt.strip() or not props.speculative_retrieval:
+        return None
+    try:
+        get_speculative_retriever().submit(props.prompt, query_settings(props))
+    except Exception as e:
+        print(f"Speculative retrieval failed: {e}")
+    return None
+
+def schedule(props):
+    """Start retrieval for the current prompt once it stops changing"""
+    global _last_change
+    _last_change = time.monotonic()
+    if not bpy.app.timers.is_registered(_debounced_submit):
+        bpy.app.timers.register(_debounced_submit, first_interval=config.SPECULATIVE_DEBOUNCE_SECONDS)
+
+def cancel_pending():
+    if bpy.app.timers.is_registered(_debounced_submit):
+        bpy.app.timers.unregister(_debounced_submit)
@@ -0,0 +1,179 @@
+import ast
+import re
+import time
+from typing import List, Optional, Tuple
+
+import bpy
+
+from .utils import check_cost, new_cost_estimator
+
+# lines at column 0 that continue the statement above instead of starting a new one
+_CONTINUATION = re.compile(r"^(else|elif|except|finally|case)\b|^[)\]}]")
+_FENCE_START = re.compile(r"```[a-zA-Z]*[ \t]*\n")
+
+class CodeStreamParser:
+    """Splits a streamed response into complete top-level statements.
+
+    Fed with the response text received so far. Only whole lines inside the
+    code block are considered, and a prefix is released once the next line
+    starts a new top-level statement and the prefix parses on its own.
+    """
+
+    def __init__(self):
+        self.code_start = None
+        self.code_end = None
+        self.emitted_lines = 0
+
+    def _code(self, text: str) -> Optional[str]:
+        if self.code_start is None:
+            match = _FENCE_START.search(text)
+            if match:
+                self.code_start = match.end()
+            elif text.lstrip().startswith("import bpy"):
+                # same unfenced fallback as parse_code
+                self.code_start = len(text) - len(text.lstrip())
+            else:
+                return None
+        code = text[self.code_start:]
+        end = code.find("\n```")
+        if end >= 0:
+            self.code_end = self.code_start + end
+            return code[:end + 1]
+        return code
+
+    def feed(self, text: str) -> List[Tuple[str, int]]:
+        """(source, first line number) of the statements completed by this text"""
+        code = self._code(text)
+        if code is None:
+            return []
+        complete = code.splitlines()[:code.count("\n")]
+        if self.code_end is not None:
+            return self._release(complete, len(complete))
+
+        lines = complete[self.emitted_lines:]
+        for split in range(len(lines) - 1, 0, -1):
+            line = lines[split]
+            if not line or line[0] in " \t#" or _CONTINUATION.match(line):
+                continue
+            released = self._release(complete, self.emitted_lines + split)
+            if released:
+                return released
+        return []
+
+    def finish(self, text: str) -> List[Tuple[str, int]]:
+        """Whatever is left once the stream ended, must parse as a whole"""
+        code = self._code(text)
+        if code is None:
+            return []
+        lines = code.splitlines()
+        source = "\n".join(lines[self.emitted_lines:])
+        if not source.strip():
+            return []
+        ast.parse(source)
+        first_line = self.emitted_lines + 1
+        self.emitted_lines = len(lines)
+        return [(source, first_line)]
+
+    def _release(self, lines: List[str], end: int) -> List[Tuple[str, int]]:
+        source = "\n".join(lines[self.emitted_lines:end])
+        if not source.strip():
+            self.emitted_lines = end
+            return []
+        try:
+            ast.parse(source)
+        except SyntaxError:
+            # e.g. a column-0 line inside a multi-line string
+            return []
+        first_line = self.emitted_lines + 1
+        self.emitted_lines = end
+        return [(source, first_line)]
+
+# removed in this order so users are gone before the data they reference
+_ROLLBACK_COLLECTIONS = (
+    "objects", "collections", "meshes", "curves", "materials", "node_groups",
+    "lights", "cameras", "images", "textures", "armatures", "actions",
+)
+
+class DataSnapshot:
+    """Datablocks present before a script ran, anything newer can be rolled back"""
+
+    def __init__(self):
+        self.before = {name: set(getattr(bpy.data, name)) for name in _ROLLBACK_COLLECTIONS}
+
+    def created(self, name: str = "objects") -> List:
+        return [block for block in getattr(bpy.data, name) if block not in self.before[name]]
+
+    def rollback(self) -> int:
+        created = []
+        for name in _ROLLBACK_COLLECTIONS:
+            created.extend(self.created(name))
+        if created:
+            bpy.data.batch_remove(ids=created)
+        return len(created)
+
+class IncrementalExecutor:
+    """Runs the statements of a streamed script as they complete, on the main thread"""
+
+    def __init__(self, cost_mode: str = 'OFF'):
+        self.parser = CodeStreamParser()
+        # one estimator over the whole script, each statement adds to it before it runs
+        self.cost_mode = cost_mode
+        self.estimator = new_cost_estimator()
+        self.snapshot = DataSnapshot()
+        self.namespace = {"__builtins__": __builtins__}
+        self.executed = 0
+        self.exec_seconds = 0.0
+        self.error = None
+
+    def _run(self, statements: List[Tuple[str, int]]) -> bool:
+        start = time.perf_counter()
+        try:
+            return self._run_statements(statements)
+        finally:
+            self.exec_seconds += time.perf_counter() - start
+
+    def _run_statements(self, statements: List[Tuple[str, int]]) -> bool:
+        for source, first_line in statements:
+            try:
+                tree = ast.parse(source)
+                # keep line numbers relative to the whole script in tracebacks
+                ast.increment_lineno(tree, first_line - 1)
+                if self.cost_mode != 'OFF':
+                    _, error = check_cost(tree, self.estimator, self.cost_mode)
+                    if error:
+                        self.error = error
+                        return False
+                exec(compile(tree, "<generated>", "exec"), self.namespace)
+                self.executed += len(tree.body)
+            except SyntaxError as e:
+                self.error = f"Syntax error at line {e.lineno}: {e.msg}"
+                return False
+            except Exception as e:
+                self.error = f"Execution error: {e}"
+                return False
+        return True
+
+    def feed(self, text: str) -> bool:
+        if self.error:
+            return False
+        return self._run(self.parser.feed(text))
+
+    def finish(self, text: str) -> bool:
+        if self.error:
+            return False
+        try:
+            statements = self.parser.finish(text)
+        except SyntaxError as e:
+            self.error = f"Syntax error at line {self.parser.emitted_lines + (e.lineno or 1)}: {e.msg}"
+            return False
+        if not self._run(statements):
+            return False
+        if self.parser.code_start is None:
+            self.error = "No code block found in response"
+            return False
+        return True
+
+    def rollback(self) -> int:
+        removed = self.snapshot.rollback()
+        print(f"Rolled back {self.executed} streamed statements, removed {removed} datablocks")
+        return removed
@@ -1,6 +1,13 @@
 import bpy
+import ast
+import json
 import re
 import os
+import hashlib
+import time
+
+from . import config
+from .cost_guard import CostEstimator, clamp_tree, over_limits
 
 CODE_FILE_NAME = "rag_generated_code.py"
 
@@ -12,6 +19,111 @@ def get_code_filepath():
     
     return os.path.join(directory, CODE_FILE_NAME)
 
+def store_history_content(content):
+    # content-addressed, identical responses share one file
+    if not content:
+        return ""
+    
+    ref = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    filepath = config.HISTORY_DIR / f"{ref}.txt"
+    if filepath.exists():
+        _touch_history_file(filepath)
+        return ref
+    
+    config.HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(content)
+    trim_history_store(keep=filepath)
+    return ref
+
+def load_history_content(ref):
+    if not ref:
+        return None
+    
+    filepath = config.HISTORY_DIR / f"{ref}.txt"
+    if not filepath.exists():
+        return None
+    with open(filepath, 'r', encoding='utf-8') as f:
+        content = f.read()
+    _touch_history_file(filepath)
+    return content
+
+def _touch_history_file(filepath):
+    # the mtime is the last use, the store is trimmed by it
+    try:
+        os.utime(filepath)
+    except OSError:
+        pass
+
+def trim_history_store(max_bytes=None, keep=None):
+    """Remove the least recently used contents until the store fits in max_bytes.
+
+    Other .blend files and undo steps may still reference any file here, so
+    nothing is deleted because one scene stopped using it, only by size.
+    """
+    max_bytes = config.HISTORY_MAX_BYTES if max_bytes is None else max_bytes
+    files = []
+    for filepath in config.HISTORY_DIR.glob("*.txt"):
+        try:
+            stat = filepath.stat()
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, filepath))
+    
+    total = sum(size for _, size, _ in files)
+    for _, size, filepath in sorted(files, key=lambda item: item[0]):
+        if total <= max_bytes:
+            break
+        if filepath == keep:
+            continue
+        try:
+            filepath.unlink()
+        except OSError as e:
+            print(f"Could not remove history content {filepath.name}: {e}")
+            continue
+        total -= size
+
+def append_history(props, role, text, content=None, success=True):
+    # bounded ring buffer, the oldest turn is dropped once full
+    entry = props.history.add()
+    entry.role = role
+    prefix = "User" if role == 'USER' else "Assistant"
+    entry.display = f"{prefix}: {text}"[:config.HISTORY_LINE_LENGTH]
+    entry.content_ref = store_history_content(content)
+    entry.success = success
+    
+    while len(props.history) > config.HISTORY_MAX_ENTRIES:
+        props.history.remove(0)
+    # re-fetched, removals can invalidate the python reference into the collection
+    return props.history[-1]
+
+def tag_script_objects(objects, script_ref, namespace=""):
+    # lets edit mode find the script an object came from
+    for obj in objects:
+        obj["rag_script"] = script_ref
+        obj["rag_namespace"] = namespace
+
+def script_objects(script_ref):
+    """Objects built by a script, grouped by the namespace of each instance"""
+    groups = {}
+    for obj in bpy.data.objects:
+        if obj.get("rag_script") == script_ref:
+            groups.setdefault(obj.get("rag_namespace", ""), []).append(obj)
+    return groups
+
+def reference_mesh_path(metadata):
+    # dataset ids are <category>_<subcategory>_<variant>
+    variant = metadata['id'].rsplit('_', 1)[-1]
+    return config.MESHES_DIR / metadata['subcategory'] / metadata['category'] / f"{variant}.glb"
+
+def import_reference_mesh(filepath):
+    try:
+        bpy.ops.object.select_all(action='DESELECT')
+        bpy.ops.import_scene.gltf(filepath=str(filepath))
+        return True, None
+    except Exception as e:
+        return False, f"Failed to import {filepath}: {e}"
+
 def parse_code(response):   
     if not response:
         return None, "Empty response"
@@ -52,30 +164,104 @@ def save_code(code, filepath=None):
     except Exception as e:
         return None, f"Failed to save code: {e}"
 
+# last guarded run, shown in the settings panel
+_last_cost = None
+
+def cost_guard_mode():
+    props = getattr(bpy.context.scene, "rag_props", None)
+    return props.cost_guard if props is not None else config.COST_GUARD_MODE
+
+def new_cost_estimator():
+    return CostEstimator(unknown_loop_iterations=config.COST_UNKNOWN_LOOP_ITERATIONS)
+
+def check_cost(tree, estimator, mode):
+    """Clamp and/or estimate a parsed script, error when it is over the limits"""
+    if mode == 'CLAMP':
+        estimator.clamped.extend(clamp_tree(tree, config.COST_MAX_SUBDIVISION, config.COST_MAX_SEGMENTS))
+    estimator.visit(tree)
+    estimate = estimator.estimate()
+    
+    # in clamp mode subdivision was already lowered to the limit
+    reasons = over_limits(
+        estimate, config.COST_MAX_OBJECTS, config.COST_MAX_FACES,
+        config.COST_MAX_SUBDIVISION if mode == 'BLOCK' else None
+    )
+    if reasons:
+        return estimate, f"Script blocked before execution: {', '.join(reasons)}"
+    return estimate, None
+
+def measure_objects(objects):
+    """Objects, vertices and faces actually built, with modifiers evaluated"""
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    vertices = faces = 0
+    for obj in objects:
+        if obj.type != 'MESH':
+            continue
+        evaluated = obj.evaluated_get(depsgraph)
+        mesh = evaluated.to_mesh()
+        vertices += len(mesh.vertices)
+        faces += len(mesh.polygons)
+        evaluated.to_mesh_clear()
+    return {"objects": len(objects), "vertices": vertices, "faces": faces}
+
+def record_cost(estimate, actual, action, seconds=0.0):
+    global _last_cost
+    _last_cost = {"estimate": estimate, "actual": actual, "action": action}
+    entry = {"time": time.time(), "action": action, "seconds": seconds, "estimate": estimate, "actual": actual}
+    try:
+        with open(config.COST_LOG_PATH, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"Could not write cost log: {e}")
+    if actual:
+        print(
+            f"Cost estimate {estimate['objects']} objects / {estimate['faces']} faces, "
+            f"measured {actual['objects']} / {actual['faces']}"
+        )
+
 def execute_code(code):
     # execute Python code in Blender   
     if not code:
         return False, "No code to execute"
     
     try:
-        # Execute in Blender's context
-        exec(code, {"__builtins__": __builtins__})
-        return True, None
-    
+        tree = ast.parse(code)
     except SyntaxError as e:
         return False, f"Syntax error at line {e.lineno}: {e.msg}"
     
+    # static estimate first, a runaway script would lock blender up
+    mode = cost_guard_mode()
+    estimate = None
+    if mode != 'OFF':
+        estimate, error = check_cost(tree, new_cost_estimator(), mode)
+        if estimate['clamped']:
+            print(f"Cost guard clamped: {'; '.join(estimate['clamped'])}")
+        if error:
+            record_cost(estimate, None, "blocked")
+            return False, error
+    
+    existing = set(bpy.data.objects)
+    start = time.perf_counter()
+    try:
+        # Execute in Blender's context
+        exec(compile(tree, "<generated>", "exec"), {"__builtins__": __builtins__})
     except Exception as e:
         return False, f"Execution error: {e}"
+    
+    if estimate is not None:
+        created = [obj for obj in bpy.data.objects if obj not in existing]
+        record_cost(estimate, measure_objects(created), "clamped" if estimate['clamped'] else "ran", time.perf_counter() - start)
+    return True, None
 
-def process_response(response):
+def process_response(response, use_cache=False):
     # full pipeline: parse, save, and execute code
     
     result = {
         'success': False,
         'code': None,
         'filepath': None,
-        'error': None
+        'error': None,
+        'cached': False
     }
     
     # parse code
@@ -84,7 +270,22 @@ def process_response(response):
         result['error'] = f"Parse error: {error}"
         return result
     
+    return process_code(code, use_cache=use_cache, result=result)
+
+def process_code(code, use_cache=False, result=None):
+    # save and execute already extracted code
+    if result is None:
+        result = {
+            'success': False,
+            'code': None,
+            'filepath': None,
+            'error': None,
+            'cached': False
+        }
+    
     result['code'] = code
+    result['objects'] = []
+    existing = set(bpy.data.objects)
     
     # save code
     filepath, error = save_code(code)
@@ -94,11 +295,31 @@ def process_response(response):
     
     result['filepath'] = filepath
     
+    # reuse the objects built by an identical script
+    cache = None
+    if use_cache:
+        from .asset_cache import get_asset_cache
+        cache = get_asset_cache()
+        key = cache.lookup(code)
+        if key:
+            loaded, error = cache.load(key)
+            if loaded:
+                result['cached'] = True
+                result['success'] = True
+                result['objects'] = [obj for obj in bpy.data.objects if obj not in existing]
+                return result
+            print(error)
+    
     # execute code
+    start = time.perf_counter()
     success, error = execute_code(code)
     if error:
         result['error'] = f"Execution error: {error}"
         return result
     
+    result['objects'] = [obj for obj in bpy.data.objects if obj not in existing]
+    if cache is not None:
+        cache.store(code, result['objects'], time.perf_counter() - start)
+    
     result['success'] = True
     return result
\ No newline at end of file
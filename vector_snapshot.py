@@ -0,0 +1,187 @@
+import json
+import mmap
+import struct
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"BRVSNP01"
+# header: magic, count, dimension, table offset, codes offset, vectors offset, payloads offset, meta offset, meta length
+HEADER = struct.Struct("<8sIIQQQQQQ")
+# one row per point, sorted by point id so lookups are a binary search
+ENTRY = np.dtype([("point_id", "S16"), ("payload_offset", "<u8"), ("payload_length", "<u4"), ("reserved", "<u4")])
+# numpy views into the map need aligned offsets
+ALIGN = 64
+
+def _align(f) -> int:
+    padding = -f.tell() % ALIGN
+    f.write(b"\0" * padding)
+    return f.tell()
+
+def _uuid_bytes(point_id: str) -> bytes:
+    return uuid.UUID(str(point_id)).bytes
+
+class VectorSnapshot:
+    """Read-only, memory-mapped copy of one collection.
+
+    Layout: header | id/offset table | filter field codes | float32 vectors | json payloads | json meta.
+    Opening reads the header and the meta only, vectors and payloads are paged
+    in by the OS on first use. Vectors are stored normalized, a dot product is
+    the cosine similarity qdrant would report.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            (magic, count, dimension, table_offset, codes_offset,
+             vectors_offset, self._payloads_offset, meta_offset, meta_length) = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Not a vector snapshot: {self.path}")
+            self.meta = json.loads(self._map[meta_offset:meta_offset + meta_length].decode("utf-8"))
+        except Exception:
+            self._file.close()
+            raise
+
+        self.count = count
+        self.dimension = dimension
+        self.fields = self.meta["fields"]
+        self._table = np.frombuffer(self._map, dtype=ENTRY, count=count, offset=table_offset)
+        self._codes = np.frombuffer(
+            self._map, dtype="<u2", count=count * len(self.fields), offset=codes_offset
+        ).reshape(count, len(self.fields))
+        self.vectors = np.frombuffer(
+            self._map, dtype="<f4", count=count * dimension, offset=vectors_offset
+        ).reshape(count, dimension)
+
+    @staticmethod
+    def write(path, points: Iterable[Tuple[str, List[float], Dict[str, Any]]], meta: Dict[str, Any]) -> int:
+        """Write (point id, vector, payload) triples into a new snapshot, replacing any existing one"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        points = sorted(points, key=lambda point: _uuid_bytes(point[0]))
+        dimension = meta["embedding_dimension"]
+        fields = list(meta.get("payload_index_fields") or [])
+
+        # filter fields become small integer codes, filtering never parses a payload
+        vocab = {field: [None] for field in fields}
+        codes = np.zeros((len(points), len(fields)), dtype="<u2")
+        vectors = np.zeros((len(points), dimension), dtype="<f4")
+        for row, (_, vector, payload) in enumerate(points):
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vectors[row] = vector / norm if norm > 0 else vector
+            for column, field in enumerate(fields):
+                value = payload.get(field)
+                if value not in vocab[field]:
+                    vocab[field].append(value)
+                codes[row, column] = vocab[field].index(value)
+
+        meta = dict(meta, fields=fields, vocab=vocab)
+        table = np.zeros(len(points), dtype=ENTRY)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(b"\0" * HEADER.size)
+            table_offset = _align(f)
+            f.write(b"\0" * table.nbytes)
+            codes_offset = _align(f)
+            f.write(codes.tobytes())
+            vectors_offset = _align(f)
+            f.write(vectors.tobytes())
+
+            payloads_offset = f.tell()
+            for row, (point_id, _, payload) in enumerate(points):
+                blob = json.dumps(payload).encode("utf-8")
+                table[row] = (_uuid_bytes(point_id), f.tell() - payloads_offset, len(blob), 0)
+                f.write(blob)
+
+            meta_offset = f.tell()
+            meta_data = json.dumps(meta).encode("utf-8")
+            f.write(meta_data)
+            total_bytes = f.tell()
+
+            f.seek(table_offset)
+            f.write(table.tobytes())
+            f.seek(0)
+            f.write(HEADER.pack(
+                MAGIC, len(points), dimension, table_offset, codes_offset,
+                vectors_offset, payloads_offset, meta_offset, len(meta_data)
+            ))
+
+        tmp_path.replace(path)
+        print(f"Vector snapshot written: {len(points)} points, {total_bytes} bytes")
+        return len(points)
+
+    def point_id(self, row: int) -> str:
+        return str(uuid.UUID(bytes=bytes(self._table[row]["point_id"])))
+
+    def payload(self, row: int) -> Dict[str, Any]:
+        entry = self._table[row]
+        start = self._payloads_offset + int(entry["payload_offset"])
+        return json.loads(self._map[start:start + int(entry["payload_length"])].decode("utf-8"))
+
+    def row_of(self, point_id: str) -> Optional[int]:
+        key = np.array(_uuid_bytes(point_id), dtype="S16")
+        row = int(np.searchsorted(self._table["point_id"], key))
+        if row < self.count and self._table[row]["point_id"] == key:
+            return row
+        return None
+
+    def _mask(self, metadata_filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        mask = None
+        for key, value in (metadata_filter or {}).items():
+            if value is None:
+                continue
+            if key not in self.fields:
+                raise ValueError(f"Snapshot cannot filter on {key}, it is not a payload index field")
+            column = self.fields.index(key)
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            vocab = self.meta["vocab"][key]
+            wanted = [vocab.index(v) for v in values if v in vocab]
+            match = np.isin(self._codes[:, column], wanted)
+            mask = match if mask is None else mask & match
+        return mask
+
+    def search(
+        self,
+        query_vectors,
+        k: int,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        score_threshold: Optional[float] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """(row, cosine score) lists, best first, one list per query vector"""
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms > 0, norms, 1)
+        scores = queries @ self.vectors.T
+
+        mask = self._mask(metadata_filter)
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        k = min(k, self.count)
+
+        results = []
+        for row_scores in scores:
+            if k <= 0:
+                results.append([])
+                continue
+            top = np.argpartition(-row_scores, k - 1)[:k]
+            top = top[np.argsort(-row_scores[top])]
+            hits = [(int(row), float(row_scores[row])) for row in top if np.isfinite(row_scores[row])]
+            if score_threshold is not None:
+                hits = [(row, score) for row, score in hits if score >= score_threshold]
+            results.append(hits)
+        return results
+
+    def close(self):
+        # numpy views hold exports of the map, drop them before closing it
+        self._table = self._codes = self.vectors = None
+        try:
+            self._map.close()
+        except BufferError:
+            # a caller still holds a vector view, the map goes with it
+            pass
+        self._file.close()
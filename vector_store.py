@@ -2,14 +2,18 @@ import os
 import uuid
 import json
 import pickle
+import threading
 from pathlib import Path
 from typing import Any, Optional, Union, List, Dict
 
 from qdrant_client import QdrantClient
+from qdrant_client import models
 from datapizza.vectorstores.qdrant import QdrantVectorstore
 from datapizza.core.vectorstore import Distance, VectorConfig
 from datapizza.type import EmbeddingFormat, Chunk, DenseEmbedding
 
+from .vector_snapshot import VectorSnapshot
+
 class VectorStore:
     def __init__(
         self, 
@@ -22,26 +26,149 @@ class VectorStore:
         self.addon_directory = addon_directory
         self.vectorstore_path = vector_store_directiory 
         self.embeddings_backup_path = embedding_backup_directory
-                
+        
+        # collections served read-only from a memory-mapped snapshot
+        self.snapshots = {}
+        self._vectorstore = None
+        self._client_lock = threading.Lock()
+
+    def _open_vectorstore(self):
         qdrant_client = QdrantClient(
             path=str(self.vectorstore_path),
             force_disable_check_same_thread=True 
         )
 
-        self.vectorstore = QdrantVectorstore.__new__(QdrantVectorstore)
-        self.vectorstore.client = qdrant_client
-        self.vectorstore.host = None
-        self.vectorstore.port = None
-        self.vectorstore.api_key = None
-        self.vectorstore.location = None
-        self.vectorstore.kwargs = {}
+        vectorstore = QdrantVectorstore.__new__(QdrantVectorstore)
+        vectorstore.client = qdrant_client
+        vectorstore.host = None
+        vectorstore.port = None
+        vectorstore.api_key = None
+        vectorstore.location = None
+        vectorstore.kwargs = {}
+        return vectorstore
+
+    @property
+    def vectorstore(self):
+        # local qdrant deserializes every collection on open, so it waits until
+        # a collection that is not served from a snapshot is touched
+        if self._vectorstore is None:
+            with self._client_lock:
+                if self._vectorstore is None:
+                    self._vectorstore = self._open_vectorstore()
+        return self._vectorstore
+
+    @property
+    def client_open(self) -> bool:
+        return self._vectorstore is not None
+
+    def open_in_background(self):
+        threading.Thread(target=lambda: self.vectorstore, name="rag-qdrant-open", daemon=True).start()
+
+    def has_collection(self, collection_name: str) -> bool:
+        # answered from the backup metadata while qdrant is still closed
+        if collection_name in self.snapshots:
+            return True
+        if not self.client_open:
+            return collection_name in self._list_backed_up_collections()
+        try:
+            self.vectorstore.client.get_collection(collection_name)
+            return True
+        except Exception:
+            return False
+
+    def load_collection_metadata(self, collection_name: str) -> Optional[Dict]:
+        metadata_file = Path(self.embeddings_backup_path) / collection_name / "collection_metadata.json"
+        if not metadata_file.exists():
+            return None
+        with open(metadata_file, 'r') as f:
+            return json.load(f)
+
+    def export_snapshot(self, collection_name: str, path, manifest: Optional[Dict[str, str]] = None) -> int:
+        """Write every point of a qdrant collection into a memory-mappable snapshot"""
+        coll_metadata = self.load_collection_metadata(collection_name)
+        if coll_metadata is None:
+            raise ValueError(f"No metadata saved for {collection_name}")
+        vector_name = coll_metadata['vector_name']
+        
+        points = []
+        offset = None
+        while True:
+            batch, offset = self.vectorstore.client.scroll(
+                collection_name=collection_name,
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=[vector_name]
+            )
+            for point in batch:
+                vector = point.vector.get(vector_name) if isinstance(point.vector, dict) else point.vector
+                points.append((str(point.id), vector, point.payload or {}))
+            if offset is None:
+                break
+        
+        return VectorSnapshot.write(path, points, dict(coll_metadata, manifest=manifest or {}))
+
+    def import_snapshot(self, path, collection_name: Optional[str] = None) -> int:
+        """Load a snapshot into qdrant, e.g. before the first write to a collection shipped as a snapshot"""
+        snapshot = VectorSnapshot(path)
+        try:
+            meta = snapshot.meta
+            collection_name = collection_name or meta['collection_name']
+            vector_name = meta['vector_name']
+            self.create_collection(
+                collection_name=collection_name,
+                embedding_dimension=meta['embedding_dimension'],
+                vector_name=vector_name,
+                distance_metric=Distance[meta['distance_metric']],
+                payload_index_fields=meta.get('payload_index_fields')
+            )
+            for start in range(0, snapshot.count, 256):
+                rows = range(start, min(start + 256, snapshot.count))
+                self.vectorstore.client.upsert(
+                    collection_name=collection_name,
+                    points=[
+                        models.PointStruct(
+                            id=snapshot.point_id(row),
+                            vector={vector_name: snapshot.vectors[row].tolist()},
+                            payload=snapshot.payload(row)
+                        )
+                        for row in rows
+                    ]
+                )
+            if meta.get('manifest'):
+                self.save_manifest(collection_name, meta['manifest'])
+            print(f"Imported {snapshot.count} points into {collection_name}")
+            return snapshot.count
+        finally:
+            snapshot.close()
+
+    def attach_snapshot(self, collection_name: str, path) -> VectorSnapshot:
+        snapshot = VectorSnapshot(path)
+        if snapshot.meta.get('collection_name') != collection_name:
+            snapshot.close()
+            raise ValueError(f"Snapshot {path} holds {snapshot.meta.get('collection_name')}, not {collection_name}")
+        self.detach_snapshot(collection_name)
+        self.snapshots[collection_name] = snapshot
+        return snapshot
+
+    def detach_snapshot(self, collection_name: str):
+        snapshot = self.snapshots.pop(collection_name, None)
+        if snapshot is not None:
+            snapshot.close()
+
+    @staticmethod
+    def _snapshot_chunk(snapshot: VectorSnapshot, row: int) -> Chunk:
+        payload = snapshot.payload(row)
+        text = payload.pop('text', "")
+        return Chunk(id=snapshot.point_id(row), text=text, metadata=payload)
 
     def _save_collection_metadata(
         self,
         collection_name: str,
         embedding_dimension: int,
         vector_name: str,
-        distance_metric: Distance
+        distance_metric: Distance,
+        payload_index_fields: Optional[List[str]] = None
     ):
         """ Save collection configuration to disk """
         collection_dir = Path(self.embeddings_backup_path) / collection_name
@@ -51,7 +178,8 @@ class VectorStore:
             "collection_name": collection_name,
             "embedding_dimension": embedding_dimension,
             "vector_name": vector_name,
-            "distance_metric": distance_metric.name
+            "distance_metric": distance_metric.name,
+            "payload_index_fields": payload_index_fields or []
         }
         
         metadata_file = collection_dir / "collection_metadata.json"
@@ -59,20 +187,71 @@ class VectorStore:
             json.dump(metadata, f, indent=2)
 
     def _save_embeddings_to_disk(self, collection_name: str, embeddings_data: List[Dict]):
-        # append embeddings to the backup file
+        # append embeddings to the backup file, one pickle frame per call
         collection_dir = Path(self.embeddings_backup_path) / collection_name
         collection_dir.mkdir(parents=True, exist_ok=True)
         
         embeddings_file = collection_dir / "embeddings.pkl"
+        with open(embeddings_file, 'ab') as f:
+            pickle.dump(embeddings_data, f)
+
+    def _load_embeddings_from_disk(self, embeddings_file: Path) -> List[Dict]:
+        # read every appended frame, older backups hold a single frame
+        saved_data = []
+        with open(embeddings_file, 'rb') as f:
+            while True:
+                try:
+                    saved_data.extend(pickle.load(f))
+                except EOFError:
+                    break
+        return saved_data
+
+    def _remove_embeddings_from_disk(self, collection_name: str, object_ids: List[str]):
+        # drop backed up embeddings whose metadata id is in object_ids
+        embeddings_file = Path(self.embeddings_backup_path) / collection_name / "embeddings.pkl"
+        if not embeddings_file.exists():
+            return
         
-        existing_data = []
-        if embeddings_file.exists():
-            with open(embeddings_file, 'rb') as f:
-                existing_data = pickle.load(f)
+        existing_data = self._load_embeddings_from_disk(embeddings_file)
         
-        existing_data.extend(embeddings_data)
+        to_remove = set(object_ids)
+        kept = [item for item in existing_data if item['metadata'].get('id') not in to_remove]
         with open(embeddings_file, 'wb') as f:
-            pickle.dump(existing_data, f)
+            pickle.dump(kept, f)
+
+    def save_manifest(self, collection_name: str, manifest: Dict[str, str]):
+        """ Save the per-object content hashes next to the collection metadata """
+        collection_dir = Path(self.embeddings_backup_path) / collection_name
+        collection_dir.mkdir(parents=True, exist_ok=True)
+        
+        with open(collection_dir / "manifest.json", 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+    def save_file_stamps(self, collection_name: str, stamps: Dict[str, list]):
+        """ Size/mtime of the dataset files last checked against the manifest """
+        collection_dir = Path(self.embeddings_backup_path) / collection_name
+        collection_dir.mkdir(parents=True, exist_ok=True)
+        
+        with open(collection_dir / "file_stamps.json", 'w') as f:
+            json.dump(stamps, f)
+
+    def load_file_stamps(self, collection_name: str) -> Dict[str, list]:
+        stamps_file = Path(self.embeddings_backup_path) / collection_name / "file_stamps.json"
+        if not stamps_file.exists():
+            return {}
+        try:
+            with open(stamps_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load_manifest(self, collection_name: str) -> Optional[Dict[str, str]]:
+        manifest_file = Path(self.embeddings_backup_path) / collection_name / "manifest.json"
+        if not manifest_file.exists():
+            return None
+        
+        with open(manifest_file, 'r') as f:
+            return json.load(f)
 
     def _list_backed_up_collections(self) -> List[str]:
         # list all collections that have backups
@@ -82,12 +261,41 @@ class VectorStore:
         
         return [d.name for d in backup_path.iterdir() if d.is_dir()]
 
+    def create_payload_indexes(self, collection_name: str, field_names: List[str]):
+        # keyword indexes so filtered searches only scan the matching subset
+        for field_name in field_names:
+            try:
+                self.vectorstore.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=models.PayloadSchemaType.KEYWORD
+                )
+            except Exception as e:
+                print(f"Could not create payload index on {field_name}: {e}")
+
+    def _build_filter(self, metadata_filter: Dict[str, Any]):
+        # exact-match filter on payload fields, lists match any value
+        conditions = []
+        for key, value in metadata_filter.items():
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                match = models.MatchAny(any=list(value))
+            else:
+                match = models.MatchValue(value=value)
+            conditions.append(models.FieldCondition(key=key, match=match))
+
+        if not conditions:
+            return None
+        return models.Filter(must=conditions)
+
     def create_collection(
         self,
         collection_name: str,
         embedding_dimension: int,
         vector_name: str,
-        distance_metric: Distance = Distance.COSINE
+        distance_metric: Distance = Distance.COSINE,
+        payload_index_fields: Optional[List[str]] = None
     ):
         vector_config = [
             VectorConfig(
@@ -103,11 +311,15 @@ class VectorStore:
             vector_config = vector_config
         )
 
+        if payload_index_fields:
+            self.create_payload_indexes(collection_name, payload_index_fields)
+
         self._save_collection_metadata(
             collection_name = collection_name,
             embedding_dimension = embedding_dimension,
             vector_name = vector_name,
-            distance_metric = distance_metric
+            distance_metric = distance_metric,
+            payload_index_fields = payload_index_fields
         )
 
         print(f"Collection {collection_name} created successfully")
@@ -140,7 +352,7 @@ class VectorStore:
         for i in range(num_embeddings):
             embedding = embeddings[i]  # Extract single embedding tensor
             metadata_dict = metadata_list[i]
-            chunk_id = str(uuid.uuid4())
+            chunk_id = self._point_id(metadata_dict)
             
             chunk = Chunk(
                 id=chunk_id,
@@ -175,27 +387,171 @@ class VectorStore:
         
         print(f"Added {len(chunks)} chunks to {collection_name}.")
     
+    @staticmethod
+    def _point_id(metadata_dict: Dict) -> str:
+        # stable point id per object so re-adding an object overwrites it
+        if 'id' in metadata_dict:
+            return str(uuid.uuid5(uuid.NAMESPACE_URL, str(metadata_dict['id'])))
+        return str(uuid.uuid4())
+
+    def delete_data(self, collection_name: str, object_ids: List[str], auto_backup: bool = True):
+        # delete points by payload id, also catches points stored with random ids
+        if not object_ids:
+            return
+        
+        self.vectorstore.client.delete(
+            collection_name=collection_name,
+            points_selector=models.FilterSelector(
+                filter=self._build_filter({"id": list(object_ids)})
+            )
+        )
+        
+        if auto_backup:
+            self._remove_embeddings_from_disk(collection_name, object_ids)
+        
+        print(f"Deleted {len(object_ids)} objects from {collection_name}.")
+
     def search(
         self,
         query_embedding,
         collection_name: str,
         k: int = 10,
         query_filter = None,
-        with_vectors: bool = True,
-        metadata_filter: Optional[Dict[str, Any]] = None
+        with_vectors: bool = False,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        score_threshold: Optional[float] = None
     ):
         # search for similar vectors
+        snapshot = self.snapshots.get(collection_name)
+        if snapshot is not None and query_filter is None:
+            hits = snapshot.search(
+                query_embedding.flatten().cpu().numpy(), k,
+                metadata_filter=metadata_filter, score_threshold=score_threshold
+            )[0]
+            return [self._snapshot_chunk(snapshot, row) for row, _ in hits]
+
         query_vector = query_embedding.flatten().tolist()
 
+        if query_filter is None and metadata_filter:
+            query_filter = self._build_filter(metadata_filter)
+
+        kwargs = {}
+        if score_threshold is not None:
+            kwargs['score_threshold'] = score_threshold
+
         results = self.vectorstore.search(
             collection_name=collection_name,
             query_vector=query_vector,
             k=k,
             with_vectors = with_vectors,
-            query_filter = query_filter
+            query_filter = query_filter,
+            **kwargs
         )
 
         return results
+
+    def search_batch(
+        self,
+        query_embeddings,
+        collection_name: str,
+        vector_name: str,
+        k: int = 10,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Chunk]]:
+        # one request for many query vectors, results come back in query order
+        snapshot = self.snapshots.get(collection_name)
+        if snapshot is not None:
+            hits = snapshot.search(
+                query_embeddings.reshape(len(query_embeddings), -1).cpu().numpy(), k,
+                metadata_filter=metadata_filter
+            )
+            return [[self._snapshot_chunk(snapshot, row) for row, _ in query_hits] for query_hits in hits]
+
+        query_filter = self._build_filter(metadata_filter) if metadata_filter else None
+        requests = [
+            models.QueryRequest(
+                query=embedding.flatten().tolist(),
+                using=vector_name,
+                limit=k,
+                filter=query_filter,
+                with_payload=True
+            )
+            for embedding in query_embeddings
+        ]
+        responses = self.vectorstore.client.query_batch_points(
+            collection_name=collection_name,
+            requests=requests
+        )
+        
+        results = []
+        for response in responses:
+            chunks = []
+            for point in response.points:
+                payload = dict(point.payload or {})
+                text = payload.pop('text', "")
+                chunks.append(Chunk(id=str(point.id), text=text, metadata=payload))
+            results.append(chunks)
+        return results
+
+    def get_vectors(self, collection_names: List[str], vector_name: str, object_ids: List[str]) -> Dict[str, List[float]]:
+        # fetch stored vectors by object id, looking through the collections in order
+        vectors = {}
+        for collection_name in collection_names:
+            missing = [obj_id for obj_id in object_ids if obj_id not in vectors]
+            if not missing:
+                break
+            snapshot = self.snapshots.get(collection_name)
+            if snapshot is not None:
+                for obj_id in missing:
+                    row = snapshot.row_of(self._point_id({'id': obj_id}))
+                    if row is not None:
+                        vectors[obj_id] = snapshot.vectors[row].tolist()
+                continue
+            points = self.vectorstore.client.retrieve(
+                collection_name=collection_name,
+                ids=[self._point_id({'id': obj_id}) for obj_id in missing],
+                with_payload=['id'],
+                with_vectors=[vector_name]
+            )
+            for point in points:
+                vector = point.vector
+                if isinstance(vector, dict):
+                    vector = vector.get(vector_name)
+                if vector is not None and point.payload:
+                    vectors[point.payload['id']] = vector
+        return vectors
+
+    def nearest(
+        self,
+        query_embedding,
+        collection_name: str,
+        vector_name: str,
+        k: int = 1,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[tuple]:
+        # (payload, similarity) pairs, for callers that need the raw score
+        snapshot = self.snapshots.get(collection_name)
+        if snapshot is not None:
+            hits = snapshot.search(query_embedding.flatten().cpu().numpy(), k, metadata_filter=metadata_filter)[0]
+            return [(snapshot.payload(row), score) for row, score in hits]
+
+        response = self.vectorstore.client.query_points(
+            collection_name=collection_name,
+            query=query_embedding.flatten().tolist(),
+            using=vector_name,
+            limit=k,
+            query_filter=self._build_filter(metadata_filter) if metadata_filter else None,
+            with_payload=True,
+            with_vectors=False
+        )
+        return [(point.payload or {}, point.score) for point in response.points]
+
+    def top_score(self, query_embedding, collection_name: str, vector_name: str) -> Optional[float]:
+        # similarity of the nearest point, None for an empty collection
+        hits = self.nearest(query_embedding, collection_name, vector_name, k=1)
+        if not hits:
+            return None
+        return hits[0][1]
     
     def rebuild_from_disk(self):
         # rebuild all collections from backed up embeddings on disk.
@@ -226,14 +582,14 @@ class VectorStore:
                 collection_name=collection_name,
                 embedding_dimension=coll_metadata['embedding_dimension'],
                 vector_name=coll_metadata['vector_name'],
-                distance_metric=Distance[coll_metadata['distance_metric']]
+                distance_metric=Distance[coll_metadata['distance_metric']],
+                payload_index_fields=coll_metadata.get('payload_index_fields')
             )
             
             # load and add all embeddings
             embeddings_file = collection_dir / "embeddings.pkl"
             if embeddings_file.exists():
-                with open(embeddings_file, 'rb') as f:
-                    saved_data = pickle.load(f)
+                saved_data = self._load_embeddings_from_disk(embeddings_file)
                 
                 print(f"Loading {len(saved_data)} embeddings...")
                 
@@ -252,6 +608,11 @@ class VectorStore:
         
         print("rebuild ok.")
     
+    def count_points(self, collection_name: str) -> int:
+        if collection_name in self.snapshots:
+            return self.snapshots[collection_name].count
+        return self.vectorstore.client.count(collection_name, exact=True).count
+
     def get_collection_info(self, collection_name: str):
         """Get information about a collection including vector names"""
         collection_info = self.vectorstore.client.get_collection(collection_name)
@@ -260,5 +621,9 @@ class VectorStore:
         return collection_info
             
     def close(self):
-        if hasattr(self.vectorstore.client, 'close'):
-            self.vectorstore.client.close()
\ No newline at end of file
+        for collection_name in list(self.snapshots):
+            self.detach_snapshot(collection_name)
+        with self._client_lock:
+            vectorstore, self._vectorstore = self._vectorstore, None
+        if vectorstore is not None and hasattr(vectorstore.client, 'close'):
+            vectorstore.client.close()
\ No newline at end of file